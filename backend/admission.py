@@ -0,0 +1,183 @@
+"""Admission control for analysis uploads.
+
+The analysis queue is bounded. Before an upload's body is read, the request
+is checked against a global limit on queued jobs and a per-client limit on
+active (queued or processing) jobs; over either limit it is refused with 429
+and a ``Retry-After`` estimated from recent job durations, so a burst of
+uploads is turned away cheaply instead of filling the disk and the queue.
+
+Keypoint submissions are counted on arrival and never queue, but each one
+stores a landmark series and a job document; they pass the same checks and
+are additionally limited to ``ANALYSIS_MAX_KEYPOINT_SUBMISSIONS`` per client
+per ``ANALYSIS_KEYPOINT_WINDOW_SECONDS``.
+
+Clients are identified by the ``sub`` of a valid bearer token when one is
+sent, otherwise by their IP address. Limits are checked against the shared
+job store, so they hold across API processes; two uploads racing past the
+check can overshoot a limit by one job each, which is acceptable for a
+load-shedding bound.
+
+Queued jobs are also given an expected processing time, from the clip
+duration probed at upload, which the job store uses for shortest-job-first
+ordering and this module for wait estimates.
+"""
+import math
+import os
+import time
+import logging
+from typing import Optional, Tuple
+
+import jwt
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+import job_store
+from auth import JWT_ALG, JWT_SECRET
+from ml.analysis_executor import ANALYSIS_WORKERS
+
+# Queued jobs beyond which new uploads are refused
+ANALYSIS_MAX_QUEUED = int(os.getenv("ANALYSIS_MAX_QUEUED", "100"))
+# Active jobs one client may have at once
+ANALYSIS_MAX_JOBS_PER_CLIENT = int(os.getenv("ANALYSIS_MAX_JOBS_PER_CLIENT", "3"))
+# Jobs processed at once across all dispatchers; used for wait estimates
+ANALYSIS_CAPACITY = int(os.getenv("ANALYSIS_CAPACITY", str(max(1, ANALYSIS_WORKERS))))
+# Assumed job duration until jobs have completed
+ANALYSIS_DEFAULT_JOB_SECONDS = float(os.getenv("ANALYSIS_DEFAULT_JOB_SECONDS", "30"))
+
+# Processing seconds per second of video (one worker, default sampling)
+ANALYSIS_SECONDS_PER_VIDEO_SECOND = float(os.getenv("ANALYSIS_SECONDS_PER_VIDEO_SECOND", "0.25"))
+# Bitrate assumed for clips whose container has no duration (recorder WebM)
+ANALYSIS_VIDEO_BYTES_PER_SECOND = int(os.getenv("ANALYSIS_VIDEO_BYTES_PER_SECOND", "250000"))
+
+# Keypoint submissions one client may make per window
+ANALYSIS_MAX_KEYPOINT_SUBMISSIONS = int(os.getenv("ANALYSIS_MAX_KEYPOINT_SUBMISSIONS", "30"))
+ANALYSIS_KEYPOINT_WINDOW_SECONDS = float(os.getenv("ANALYSIS_KEYPOINT_WINDOW_SECONDS", "60"))
+
+# Endpoints that create analysis jobs
+VIDEO_PATH = "/ml/analyze-video"
+KEYPOINTS_PATH = "/ml/analyze-keypoints"
+ADMISSION_PATHS = {VIDEO_PATH, KEYPOINTS_PATH}
+
+_DURATION_TTL_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+_duration_cache: Tuple[float, float] = (0.0, ANALYSIS_DEFAULT_JOB_SECONDS)
+
+
+def user_key(sub: str) -> str:
+	"""Owner key of an authenticated user (the JWT ``sub``)"""
+	return f"user:{sub}"
+
+
+def client_key(request: Request) -> str:
+	"""Identity admission limits are counted against"""
+	authorization = request.headers.get("authorization", "")
+	if authorization.lower().startswith("bearer "):
+		try:
+			payload = jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALG])
+			if payload.get("sub"):
+				return user_key(payload["sub"])
+		except jwt.InvalidTokenError:
+			pass
+	return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def average_job_seconds() -> float:
+	"""Mean processing time of recent jobs, cached briefly"""
+	global _duration_cache
+	expires_at, value = _duration_cache
+	if time.monotonic() < expires_at:
+		return value
+	durations = await job_store.recent_durations()
+	value = sum(durations) / len(durations) if durations else ANALYSIS_DEFAULT_JOB_SECONDS
+	_duration_cache = (time.monotonic() + _DURATION_TTL_SECONDS, value)
+	return value
+
+
+def estimate_wait(queued_ahead: int, processing: int, job_seconds: float) -> float:
+	"""Seconds until a job behind ``queued_ahead`` others starts running"""
+	waiting = queued_ahead + processing - ANALYSIS_CAPACITY + 1
+	return max(0, waiting) / ANALYSIS_CAPACITY * job_seconds
+
+
+async def check_admission(owner: str, path: str = VIDEO_PATH) -> Optional[Tuple[str, int]]:
+	"""Return ``(reason, retry_after_seconds)`` if a new job must be refused"""
+	overall = await job_store.count_active()
+	if overall[job_store.STATUS_QUEUED] >= ANALYSIS_MAX_QUEUED:
+		excess = overall[job_store.STATUS_QUEUED] - ANALYSIS_MAX_QUEUED + 1
+		retry_after = excess / ANALYSIS_CAPACITY * await average_job_seconds()
+		return "Analysis queue is full", max(1, math.ceil(retry_after))
+
+	own = await job_store.count_active(owner)
+	if own[job_store.STATUS_QUEUED] + own[job_store.STATUS_PROCESSING] >= ANALYSIS_MAX_JOBS_PER_CLIENT:
+		# Roughly when the client's oldest job finishes
+		return (
+			f"At most {ANALYSIS_MAX_JOBS_PER_CLIENT} analyses per client at a time",
+			max(1, math.ceil(await average_job_seconds()))
+		)
+
+	if path == KEYPOINTS_PATH:
+		recent = await job_store.count_recent(owner, ANALYSIS_KEYPOINT_WINDOW_SECONDS)
+		if recent >= ANALYSIS_MAX_KEYPOINT_SUBMISSIONS:
+			return (
+				f"At most {ANALYSIS_MAX_KEYPOINT_SUBMISSIONS} keypoint submissions "
+				f"per {ANALYSIS_KEYPOINT_WINDOW_SECONDS:g} s",
+				max(1, math.ceil(ANALYSIS_KEYPOINT_WINDOW_SECONDS))
+			)
+	return None
+
+
+def _video_seconds(video_path: str) -> Optional[float]:
+	from ml.chunked_analysis import probe_video
+	try:
+		return probe_video(video_path)["duration_s"]
+	except Exception:
+		return None
+
+
+async def expected_job_seconds(video_path: str, size_bytes: int) -> float:
+	"""Expected processing time of a clip, from its probed (or size-estimated) duration"""
+	# Header read only; OpenCV is loaded in a worker thread on first use
+	duration_s = await run_in_threadpool(_video_seconds, video_path)
+	if not duration_s:
+		duration_s = size_bytes / ANALYSIS_VIDEO_BYTES_PER_SECOND
+	return duration_s * ANALYSIS_SECONDS_PER_VIDEO_SECOND
+
+
+async def queue_estimate(rank: float, expected_seconds: Optional[float] = None) -> dict:
+	"""Position and expected timing for a job that was just queued with ``rank``"""
+	counts = await job_store.count_active()
+	queued_ahead = await job_store.count_queued_ahead(rank)
+	job_seconds = await average_job_seconds()
+	wait_s = estimate_wait(queued_ahead, counts[job_store.STATUS_PROCESSING], job_seconds)
+	if expected_seconds:
+		job_seconds = expected_seconds
+	return {
+		"position": queued_ahead + 1,
+		"estimated_wait_s": round(wait_s, 1),
+		"estimated_completion_s": round(wait_s + job_seconds, 1)
+	}
+
+
+async def admit_analysis_uploads(request: Request, call_next):
+	"""HTTP middleware: refuse analysis uploads with 429 while over the limits"""
+	if request.method == "POST" and request.url.path in ADMISSION_PATHS:
+		owner = client_key(request)
+		request.state.owner = owner
+		try:
+			rejection = await check_admission(owner, request.url.path)
+		except Exception as e:
+			# Fail open: without the job store the upload cannot be queued anyway
+			logger.error(f"Admission check failed: {e}")
+			rejection = None
+		if rejection is not None:
+			reason, retry_after = rejection
+			logger.info(f"Refused analysis upload from {owner}: {reason}")
+			return JSONResponse(
+				status_code=429,
+				content={"detail": reason, "retry_after": retry_after},
+				headers={"Retry-After": str(retry_after)}
+			)
+	return await call_next(request)
@@ -0,0 +1,98 @@
+"""Content-addressed cache of completed video analyses.
+
+Entries are keyed by (content hash, analyzer engine, analyzer version) and
+stored in MongoDB so every API process and worker shares them. Each hit
+slides the entry's TTL forward; when the cache grows past
+``ANALYSIS_CACHE_MAX_ENTRIES`` the least recently used entries are evicted.
+Hit/miss counters are kept in a single stats document.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from mongo import get_mongo_db
+
+CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+
+_STATS_ID = "analysis_cache"
+
+logger = logging.getLogger(__name__)
+
+
+def _cache():
+	return get_mongo_db().analysis_cache
+
+
+def cache_key(content_hash: str, engine: str, version: str) -> str:
+	return f"{content_hash}:{engine}:{version}"
+
+
+async def _record(field: str):
+	await get_mongo_db().cache_stats.update_one({"_id": _STATS_ID}, {"$inc": {field: 1}}, upsert=True)
+
+
+async def get_cached(content_hash: str, engine: str, version: str) -> Optional[dict]:
+	"""Return cached results for this content and analyzer, or None on a miss"""
+	now = datetime.utcnow()
+	entry = await _cache().find_one_and_update(
+		{"_id": cache_key(content_hash, engine, version)},
+		{
+			"$set": {"last_used_at": now, "expires_at": now + timedelta(seconds=CACHE_TTL_SECONDS)},
+			"$inc": {"hits": 1}
+		},
+		return_document=ReturnDocument.AFTER
+	)
+	await _record("hits" if entry else "misses")
+	return entry["results"] if entry else None
+
+
+async def put_cached(content_hash: str, engine: str, version: str, results: dict):
+	"""Store results for this content and analyzer, evicting LRU entries over the cap"""
+	now = datetime.utcnow()
+	await _cache().update_one(
+		{"_id": cache_key(content_hash, engine, version)},
+		{
+			"$set": {
+				"content_hash": content_hash,
+				"engine": engine,
+				"engine_version": version,
+				"results": results,
+				"last_used_at": now,
+				"expires_at": now + timedelta(seconds=CACHE_TTL_SECONDS)
+			},
+			"$setOnInsert": {"created_at": now, "hits": 0}
+		},
+		upsert=True
+	)
+	await _evict_lru()
+
+
+async def _evict_lru():
+	excess = await _cache().estimated_document_count() - CACHE_MAX_ENTRIES
+	if excess <= 0:
+		return
+	cursor = _cache().find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess)
+	stale = [doc["_id"] async for doc in cursor]
+	if stale:
+		result = await _cache().delete_many({"_id": {"$in": stale}})
+		await get_mongo_db().cache_stats.update_one(
+			{"_id": _STATS_ID}, {"$inc": {"evictions": result.deleted_count}}, upsert=True
+		)
+		logger.info(f"Evicted {result.deleted_count} analysis cache entries")
+
+
+async def get_cache_stats() -> dict:
+	stats = await get_mongo_db().cache_stats.find_one({"_id": _STATS_ID}) or {}
+	hits = stats.get("hits", 0)
+	misses = stats.get("misses", 0)
+	return {
+		"entries": await _cache().estimated_document_count(),
+		"hits": hits,
+		"misses": misses,
+		"evictions": stats.get("evictions", 0),
+		"hit_rate": hits / (hits + misses) if hits + misses else 0.0
+	}
@@ -0,0 +1,234 @@
+"""Analysis job dispatcher.
+
+Claims jobs from the shared ``analysis_jobs`` store and runs them in the
+analysis process pool. The API starts one dispatcher in-process; additional
+capacity can be added by running this module standalone on any host that
+shares the uploads directory and MongoDB:
+
+	python analysis_worker.py
+"""
+import sys
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from pathlib import Path
+
+# Add the backend directory to Python path for imports
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+	sys.path.insert(0, str(backend_dir))
+
+import job_store
+import analysis_cache
+from ml.analysis_executor import ANALYSIS_WORKERS, start_executor, shutdown_executor, run_analysis, wait_until_warm, warmup_status
+from ml.engines import get_engine
+
+ANALYSIS_POLL_SECONDS = float(os.getenv("ANALYSIS_POLL_SECONDS", "2"))
+# How often a dispatcher fails jobs whose lease expired on their last attempt
+ANALYSIS_REAP_SECONDS = float(os.getenv("ANALYSIS_REAP_SECONDS", "30"))
+# How often a dispatcher deletes landmark series past their retention
+ANALYSIS_LANDMARK_SWEEP_SECONDS = float(os.getenv("ANALYSIS_LANDMARK_SWEEP_SECONDS", "3600"))
+# Minimum seconds between progress writes to a job document
+ANALYSIS_PROGRESS_WRITE_SECONDS = float(os.getenv("ANALYSIS_PROGRESS_WRITE_SECONDS", "1"))
+# Whether API processes run a dispatcher themselves (disable for API-only nodes)
+ANALYSIS_DISPATCHER = os.getenv("ANALYSIS_DISPATCHER", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisDispatcher:
+	"""Claims queued jobs and runs up to ``concurrency`` of them at once"""
+
+	def __init__(self, concurrency: int = ANALYSIS_WORKERS):
+		self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+		self.concurrency = max(1, concurrency)
+		self._slots = asyncio.Semaphore(self.concurrency)
+		self._wake = asyncio.Event()
+		self._task: asyncio.Task | None = None
+		self._running: set[asyncio.Task] = set()
+		self._reaped_at = 0.0
+		self._swept_at = 0.0
+
+	def start(self):
+		if self._task is None:
+			self._task = asyncio.create_task(self._run())
+			logger.info(f"Analysis dispatcher {self.worker_id} started ({self.concurrency} slots)")
+
+	async def stop(self):
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+		for task in list(self._running):
+			task.cancel()
+
+	def wake(self):
+		"""Signal that a job was just enqueued so it is claimed without waiting for the next poll"""
+		self._wake.set()
+
+	async def _run(self):
+		while True:
+			await self._reap()
+			await self._sweep_landmarks()
+			await self._slots.acquire()
+			try:
+				job = await job_store.claim_job(self.worker_id)
+			except Exception as e:
+				logger.error(f"Failed to claim analysis job: {e}")
+				job = None
+
+			if job is None:
+				self._slots.release()
+				self._wake.clear()
+				try:
+					await asyncio.wait_for(self._wake.wait(), timeout=ANALYSIS_POLL_SECONDS)
+				except asyncio.TimeoutError:
+					pass
+				continue
+
+			task = asyncio.create_task(self._process(job))
+			self._running.add(task)
+			task.add_done_callback(self._running.discard)
+
+	async def _reap(self):
+		"""Periodically fail jobs that ran out of attempts while their lease expired"""
+		now = asyncio.get_running_loop().time()
+		if now - self._reaped_at < ANALYSIS_REAP_SECONDS:
+			return
+		self._reaped_at = now
+		try:
+			for job in await job_store.reap_expired_jobs():
+				_remove_upload(job["video_path"])
+		except Exception as e:
+			logger.error(f"Failed to reap expired analysis jobs: {e}")
+
+	async def _sweep_landmarks(self):
+		"""Periodically delete landmark series older than the job retention"""
+		now = asyncio.get_running_loop().time()
+		if now - self._swept_at < ANALYSIS_LANDMARK_SWEEP_SECONDS:
+			return
+		self._swept_at = now
+		from ml.landmark_store import sweep_landmarks
+		try:
+			removed = await asyncio.to_thread(sweep_landmarks)
+			if removed:
+				logger.info(f"Removed {removed} expired landmark series")
+		except Exception as e:
+			logger.error(f"Failed to sweep landmark series: {e}")
+
+	async def _process(self, job: dict):
+		job_id = job["_id"]
+		video_path = job["video_path"]
+		heartbeat = asyncio.create_task(self._heartbeat(job_id))
+		progress = ProgressWriter(job_id, self.worker_id)
+		# Whether this worker put the job in a final state while still holding its lease
+		finished = False
+		try:
+			logger.info(f"Starting analysis for video {job_id} (attempt {job['attempts']})")
+			engine = get_engine(job.get("engine"))
+			results = await run_analysis(video_path, video_id=job_id, on_progress=progress.report, engine=engine.name)
+			finished = await job_store.complete_job(job_id, self.worker_id, results)
+			if finished and job.get("content_hash"):
+				await analysis_cache.put_cached(job["content_hash"], engine.name, engine.version, results)
+			logger.info(f"Analysis completed for video {job_id}")
+		except asyncio.CancelledError:
+			# Shutting down: keep the upload, the job is re-claimed once its lease expires
+			raise
+		except Exception as e:
+			logger.error(f"Analysis failed for video {job_id}: {e}")
+			finished = await job_store.fail_job(job_id, self.worker_id, str(e)) or finished
+		finally:
+			heartbeat.cancel()
+			progress.close()
+			self._slots.release()
+		# After a lost lease another worker may own the job and still need the upload
+		if finished:
+			_remove_upload(video_path)
+
+	async def _heartbeat(self, job_id: str):
+		interval = max(1, job_store.JOB_LEASE_SECONDS / 3)
+		while True:
+			await asyncio.sleep(interval)
+			try:
+				if not await job_store.heartbeat_job(job_id, self.worker_id):
+					logger.warning(f"Lost lease on job {job_id}")
+					return
+			except Exception as e:
+				logger.error(f"Heartbeat failed for job {job_id}: {e}")
+
+
+class ProgressWriter:
+	"""Writes a job's progress to the job store, coalescing bursts of reports.
+
+	At most one write per ``ANALYSIS_PROGRESS_WRITE_SECONDS``; only the latest
+	snapshot is written and unchanged snapshots are skipped.
+	"""
+
+	def __init__(self, job_id: str, worker_id: str):
+		self.job_id = job_id
+		self.worker_id = worker_id
+		self._latest: dict | None = None
+		self._written: dict | None = None
+		self._task: asyncio.Task | None = None
+
+	def report(self, progress: dict):
+		self._latest = progress
+		if self._task is None or self._task.done():
+			self._task = asyncio.create_task(self._flush())
+
+	def close(self):
+		if self._task is not None:
+			self._task.cancel()
+
+	async def _flush(self):
+		while self._latest is not None and self._latest != self._written:
+			progress = self._latest
+			try:
+				await job_store.update_progress(self.job_id, self.worker_id, progress)
+			except Exception as e:
+				logger.error(f"Progress update failed for job {self.job_id}: {e}")
+			self._written = progress
+			await asyncio.sleep(ANALYSIS_PROGRESS_WRITE_SECONDS)
+
+
+def _remove_upload(video_path: str):
+	"""Clean up video file once the job reached a final state"""
+	if Path(video_path).exists():
+		Path(video_path).unlink()
+
+
+_dispatcher: AnalysisDispatcher | None = None
+
+
+def get_dispatcher() -> AnalysisDispatcher:
+	global _dispatcher
+	if _dispatcher is None:
+		_dispatcher = AnalysisDispatcher()
+	return _dispatcher
+
+
+def wake_dispatcher():
+	"""Nudge the in-process dispatcher, if one is running"""
+	if _dispatcher is not None:
+		_dispatcher.wake()
+
+
+async def main():
+	logging.basicConfig(level=logging.INFO)
+	start_executor()
+	# Only claim jobs once the workers are warm, so none waits behind warm-up
+	if not await wait_until_warm():
+		raise SystemExit(f"Analysis workers failed to warm up: {warmup_status()['errors']}")
+	logger.info(f"Analysis workers warm: {warmup_status()['timings']}")
+	dispatcher = get_dispatcher()
+	dispatcher.start()
+	try:
+		await asyncio.Event().wait()
+	finally:
+		await dispatcher.stop()
+		shutdown_executor()
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -0,0 +1,371 @@
+"""MongoDB-backed store for video analysis jobs.
+
+Jobs live in the ``analysis_jobs`` collection so every API process and every
+standalone worker sees the same queue. Workers claim jobs atomically with a
+time-limited lease that they keep alive with heartbeats; a job whose lease
+expires (worker crashed) becomes claimable again, unless it has used up its
+attempts, in which case ``reap_expired_jobs`` marks it failed.
+
+Queued jobs are claimed in ``rank`` order. A job's rank is its enqueue time
+plus a priority-class offset plus a multiple of its expected processing time,
+all in seconds: within a class short jobs go first, and since newer jobs get
+later ranks, a long job is overtaken only by jobs enqueued within a bounded
+window after it, so it cannot starve.
+
+Every status or progress transition bumps the job's ``revision``, so clients
+can wait for the next change (``wait_for_change``) instead of re-reading the
+job on a timer. Writes made by this process wake local waiters at once;
+changes made by other hosts are picked up by one projected poll per watched
+job every ``JOB_WATCH_POLL_SECONDS``, shared by all of this process's waiters
+on that job, which re-read the job only when it changed.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from mongo import get_mongo_db
+
+JOB_TTL_SECONDS = int(os.getenv("ANALYSIS_JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_LEASE_SECONDS = int(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+# Priority classes: seconds added to a job's rank (lower ranks run first)
+JOB_PRIORITY_OFFSETS = {
+	"interactive": float(os.getenv("ANALYSIS_PRIORITY_INTERACTIVE_OFFSET", "0")),
+	"bulk": float(os.getenv("ANALYSIS_PRIORITY_BULK_OFFSET", "900"))
+}
+DEFAULT_PRIORITY = "interactive"
+# Rank seconds per expected second of processing (shortest expected job first)
+JOB_SJF_WEIGHT = float(os.getenv("ANALYSIS_SJF_WEIGHT", "2"))
+
+# How often waiters re-read a job that may be updated by another host
+JOB_WATCH_POLL_SECONDS = float(os.getenv("ANALYSIS_JOB_WATCH_POLL_SECONDS", "1"))
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Fields clients need to follow a job; excludes the (large) results
+STATUS_PROJECTION = {"status": 1, "progress": 1, "revision": 1, "error": 1}
+
+logger = logging.getLogger(__name__)
+
+# Local waiters per job id, woken by writes from this process
+_watchers: dict[str, set[asyncio.Event]] = {}
+# One poll task per watched job, waking its waiters on changes made elsewhere
+_pollers: dict[str, asyncio.Task] = {}
+
+
+def _jobs():
+	return get_mongo_db().analysis_jobs
+
+
+def job_rank(enqueued_at: datetime, priority: str = DEFAULT_PRIORITY, expected_seconds: float = 0.0) -> float:
+	"""Claim order of a job; see the module docstring"""
+	return (
+		(enqueued_at - _EPOCH).total_seconds()
+		+ JOB_PRIORITY_OFFSETS[priority]
+		+ JOB_SJF_WEIGHT * expected_seconds
+	)
+
+
+async def enqueue_job(job_id: str, video_path: str, content_hash: Optional[str] = None,
+					  owner: Optional[str] = None, priority: str = DEFAULT_PRIORITY,
+					  expected_seconds: float = 0.0, engine: Optional[str] = None) -> dict:
+	"""Insert a new queued analysis job, attributed to ``owner`` for admission limits.
+
+	``engine`` names the analysis engine to run (None for the worker's default).
+	"""
+	now = datetime.utcnow()
+	job = {
+		"_id": job_id,
+		"video_id": job_id,
+		"status": STATUS_QUEUED,
+		"engine": engine,
+		"owner": owner,
+		"priority": priority,
+		"expected_seconds": expected_seconds,
+		"rank": job_rank(now, priority, expected_seconds),
+		"video_path": video_path,
+		"content_hash": content_hash,
+		"results": None,
+		"error": None,
+		"progress": None,
+		"revision": 0,
+		"attempts": 0,
+		"lease_owner": None,
+		"lease_expires_at": None,
+		"heartbeat_at": None,
+		"created_at": now,
+		"updated_at": now,
+		"expires_at": now + timedelta(seconds=JOB_TTL_SECONDS)
+	}
+	await _jobs().insert_one(job)
+	return job
+
+
+async def create_completed_job(job_id: str, results: dict, content_hash: Optional[str] = None,
+							   owner: Optional[str] = None) -> dict:
+	"""Insert a job that is already complete (e.g. served from the analysis cache)"""
+	now = datetime.utcnow()
+	job = {
+		"_id": job_id,
+		"video_id": job_id,
+		"owner": owner,
+		"status": STATUS_COMPLETED,
+		"video_path": None,
+		"content_hash": content_hash,
+		"results": results,
+		"error": None,
+		"progress": None,
+		"revision": 0,
+		"attempts": 0,
+		"lease_owner": None,
+		"lease_expires_at": None,
+		"heartbeat_at": None,
+		"created_at": now,
+		"updated_at": now,
+		"expires_at": now + timedelta(seconds=JOB_TTL_SECONDS)
+	}
+	await _jobs().insert_one(job)
+	return job
+
+
+async def claim_job(worker_id: str, job_id: Optional[str] = None) -> Optional[dict]:
+	"""Atomically claim the lowest-ranked runnable job (or a specific one).
+
+	A job is runnable when it is queued, or when it is processing but its lease
+	has expired and it has attempts left.
+	"""
+	now = datetime.utcnow()
+	query = {
+		"attempts": {"$lt": JOB_MAX_ATTEMPTS},
+		"$or": [
+			{"status": STATUS_QUEUED},
+			{"status": STATUS_PROCESSING, "lease_expires_at": {"$lt": now}}
+		]
+	}
+	if job_id is not None:
+		query["_id"] = job_id
+
+	job = await _jobs().find_one_and_update(
+		query,
+		{
+			"$set": {
+				"status": STATUS_PROCESSING,
+				"progress": None,
+				"started_at": now,
+				"lease_owner": worker_id,
+				"lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+				"heartbeat_at": now,
+				"updated_at": now
+			},
+			"$inc": {"attempts": 1, "revision": 1}
+		},
+		sort=[("rank", 1), ("created_at", 1)],
+		return_document=ReturnDocument.AFTER
+	)
+	if job is not None:
+		_notify(job["_id"])
+	return job
+
+
+async def reap_expired_jobs() -> list[dict]:
+	"""Fail processing jobs whose lease expired on their last attempt.
+
+	``claim_job`` no longer picks these up, so without this they would stay
+	``processing`` (and their waiters waiting) until the TTL. Returns the
+	reaped jobs (id and upload path).
+	"""
+	now = datetime.utcnow()
+	query = {
+		"status": STATUS_PROCESSING,
+		"lease_expires_at": {"$lt": now},
+		"attempts": {"$gte": JOB_MAX_ATTEMPTS}
+	}
+	reaped = []
+	async for job in _jobs().find(query, {"video_path": 1, "attempts": 1}):
+		result = await _jobs().update_one(
+			{**query, "_id": job["_id"]},
+			{
+				"$set": {
+					"status": STATUS_FAILED,
+					"results": None,
+					"error": f"Lease expired after {job['attempts']} attempts",
+					"lease_owner": None,
+					"lease_expires_at": None,
+					"finished_at": now,
+					"updated_at": now,
+					"expires_at": now + timedelta(seconds=JOB_TTL_SECONDS)
+				},
+				"$inc": {"revision": 1}
+			}
+		)
+		if result.modified_count == 1:
+			logger.warning(f"Job {job['_id']} failed: lease expired after {job['attempts']} attempts")
+			_notify(job["_id"])
+			reaped.append(job)
+	return reaped
+
+
+async def heartbeat_job(job_id: str, worker_id: str) -> bool:
+	"""Extend the lease of a job this worker owns. Returns False if the lease was lost."""
+	now = datetime.utcnow()
+	result = await _jobs().update_one(
+		{"_id": job_id, "status": STATUS_PROCESSING, "lease_owner": worker_id},
+		{"$set": {
+			"lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+			"heartbeat_at": now,
+			"updated_at": now
+		}}
+	)
+	return result.matched_count == 1
+
+
+async def update_progress(job_id: str, worker_id: str, progress: dict) -> bool:
+	"""Record the progress of a job this worker owns (stage, frames processed / total)"""
+	result = await _jobs().update_one(
+		{"_id": job_id, "status": STATUS_PROCESSING, "lease_owner": worker_id},
+		{
+			"$set": {"progress": progress, "updated_at": datetime.utcnow()},
+			"$inc": {"revision": 1}
+		}
+	)
+	_notify(job_id)
+	return result.matched_count == 1
+
+
+async def complete_job(job_id: str, worker_id: str, results: dict) -> bool:
+	"""Store results for a job owned by this worker"""
+	return await _finish_job(job_id, worker_id, {"status": STATUS_COMPLETED, "results": results, "error": None})
+
+
+async def fail_job(job_id: str, worker_id: str, error: str) -> bool:
+	"""Mark a job owned by this worker as failed"""
+	return await _finish_job(job_id, worker_id, {"status": STATUS_FAILED, "results": None, "error": error})
+
+
+async def _finish_job(job_id: str, worker_id: str, fields: dict) -> bool:
+	now = datetime.utcnow()
+	fields.update({
+		"lease_owner": None,
+		"lease_expires_at": None,
+		"finished_at": now,
+		"updated_at": now,
+		"expires_at": now + timedelta(seconds=JOB_TTL_SECONDS)
+	})
+	result = await _jobs().update_one(
+		{"_id": job_id, "status": STATUS_PROCESSING, "lease_owner": worker_id},
+		{"$set": fields, "$inc": {"revision": 1}}
+	)
+	if result.matched_count == 0:
+		logger.warning(f"Job {job_id} lease lost by {worker_id}, result discarded")
+	_notify(job_id)
+	return result.matched_count == 1
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+	return await _jobs().find_one({"_id": job_id})
+
+
+async def count_active(owner: Optional[str] = None) -> dict:
+	"""Number of queued and processing jobs, overall or for one owner"""
+	match = {"status": {"$in": [STATUS_QUEUED, STATUS_PROCESSING]}}
+	if owner is not None:
+		match["owner"] = owner
+	counts = {STATUS_QUEUED: 0, STATUS_PROCESSING: 0}
+	async for row in _jobs().aggregate([{"$match": match}, {"$group": {"_id": "$status", "n": {"$sum": 1}}}]):
+		counts[row["_id"]] = row["n"]
+	return counts
+
+
+async def count_recent(owner: str, seconds: float) -> int:
+	"""Number of jobs ``owner`` created in the last ``seconds``"""
+	since = datetime.utcnow() - timedelta(seconds=seconds)
+	return await _jobs().count_documents({"owner": owner, "created_at": {"$gte": since}})
+
+
+async def count_queued_ahead(rank: float) -> int:
+	"""Number of queued jobs that will be claimed before a job of ``rank``"""
+	return await _jobs().count_documents({"status": STATUS_QUEUED, "rank": {"$lt": rank}})
+
+
+async def recent_durations(limit: int = 20) -> list[float]:
+	"""Processing time in seconds of the most recently completed jobs"""
+	cursor = _jobs().find(
+		{"status": STATUS_COMPLETED, "started_at": {"$ne": None}, "finished_at": {"$ne": None}},
+		{"started_at": 1, "finished_at": 1}
+	).sort("finished_at", -1).limit(limit)
+	return [(job["finished_at"] - job["started_at"]).total_seconds() async for job in cursor]
+
+
+async def get_job_status(job_id: str) -> Optional[dict]:
+	"""Status, progress and revision of a job, without its results"""
+	return await _jobs().find_one({"_id": job_id}, STATUS_PROJECTION)
+
+
+async def wait_for_change(job_id: str, since: Optional[int], timeout: float) -> Optional[dict]:
+	"""Wait until the job's revision differs from ``since`` or it is final.
+
+	Returns the job's status document (see ``get_job_status``) as of the
+	change, or as of the timeout if nothing changed; None if the job does not
+	exist. The waiter reads the job once, then again only when woken by a
+	local write or by the job's shared poll (``_poll_job``).
+	"""
+	event = asyncio.Event()
+	_watchers.setdefault(job_id, set()).add(event)
+	if job_id not in _pollers:
+		_pollers[job_id] = asyncio.create_task(_poll_job(job_id))
+	deadline = asyncio.get_running_loop().time() + timeout
+	try:
+		while True:
+			event.clear()
+			job = await get_job_status(job_id)
+			if job is None or job["status"] in FINAL_STATUSES or job.get("revision", 0) != since:
+				return job
+			remaining = deadline - asyncio.get_running_loop().time()
+			if remaining <= 0:
+				return job
+			try:
+				await asyncio.wait_for(event.wait(), timeout=remaining)
+			except asyncio.TimeoutError:
+				pass
+	finally:
+		waiters = _watchers.get(job_id)
+		if waiters is not None:
+			waiters.discard(event)
+			if not waiters:
+				del _watchers[job_id]
+
+
+async def _poll_job(job_id: str):
+	"""Poll one job for changes made by other hosts while this process has waiters on it"""
+	first, seen = True, None
+	try:
+		while _watchers.get(job_id):
+			try:
+				job = await _jobs().find_one({"_id": job_id}, {"revision": 1, "status": 1})
+				current = None if job is None else (job.get("revision", 0), job["status"])
+				# The first read also wakes waiters, covering changes before the poll started
+				if first or current != seen:
+					_notify(job_id)
+				first, seen = False, current
+			except Exception as e:
+				logger.error(f"Failed to poll job {job_id}: {e}")
+			await asyncio.sleep(JOB_WATCH_POLL_SECONDS)
+	finally:
+		if _pollers.get(job_id) is asyncio.current_task():
+			del _pollers[job_id]
+
+
+def _notify(job_id: str):
+	for event in _watchers.get(job_id, ()):
+		event.set()
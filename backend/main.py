@@ -7,27 +7,49 @@ if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from mongo import init_mongo_collections
+from ml.analysis_executor import start_executor, shutdown_executor, warmup_status
+from analysis_worker import ANALYSIS_DISPATCHER, get_dispatcher
+from uploads import reject_oversized_uploads
+from admission import admit_analysis_uploads
 from routes import mongo_auth, results, athletes
-from routes import stats, ml_analysis
+from routes import stats, ml_analysis, ml_live
 
 app = FastAPI(title="sai-sports-assess API")
 
+# Registered before CORS so rejections still carry CORS headers; the
+# (cheaper) size check is registered last so it runs first
+app.middleware("http")(admit_analysis_uploads)
+app.middleware("http")(reject_oversized_uploads)
+
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=["*"],
 	allow_credentials=True,
 	allow_methods=["*"],
 	allow_headers=["*"],
+	# Back-off hint of 429 responses from admission control
+	expose_headers=["Retry-After"],
 )
 
 
 @app.on_event("startup")
 async def on_startup():
 	await init_mongo_collections()
+	if ANALYSIS_DISPATCHER:
+		start_executor()
+		get_dispatcher().start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+	if ANALYSIS_DISPATCHER:
+		await get_dispatcher().stop()
+		shutdown_executor()
 
 
 app.include_router(mongo_auth.router)
@@ -36,6 +58,7 @@ app.include_router(results.router)
 app.include_router(athletes.router)
 app.include_router(stats.router)
 app.include_router(ml_analysis.router)
+app.include_router(ml_live.router)
 
 # Serve uploaded files
 UPLOADS_DIR = Path(__file__).parent / "uploads"
@@ -45,3 +68,14 @@ app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
 @app.get("/")
 async def root():
 	return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+	"""Readiness: 503 until this process's analysis workers have warmed up"""
+	if not ANALYSIS_DISPATCHER:
+		return {"status": "ready", "analysis": None}
+	status = warmup_status()
+	if not status["ready"]:
+		return JSONResponse(status_code=503, content={"status": "warming_up", "analysis": status})
+	return {"status": "ready", "analysis": status}
@@ -0,0 +1,390 @@
+"""
+Process-pool executor for video analysis.
+
+Video analysis is CPU bound (MediaPipe, OpenCV decoding), so it runs in a pool
+of worker processes. Each task checks an analyzer out of its worker's
+analyzer pool, so every job starts from fresh counters and tracking state, and
+the API only awaits the returned futures, keeping the event loop free.
+
+Workers report the progress of video analyses over a queue shared with the
+pool at start-up; a drain thread in the parent hands the reports to whoever
+awaits the job (see ``run_analysis``).
+
+All workers are started with the pool and warm their engines before taking
+work (see ``ml.warmup``); they report their warm-up timings over the same
+queue, and ``warmup_status`` says whether every worker is ready.
+
+A worker that dies (out of memory, a crash in native code, a failing warm-up)
+breaks the whole ``ProcessPoolExecutor``. Tasks are therefore submitted through
+``_run_in_pool``, which replaces a broken pool with a fresh one and retries
+the task up to ``ANALYSIS_POOL_RETRIES`` times before failing it.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ml.engines import ANALYSIS_ENGINE, find_engine, get_engine
+
+# Number of worker processes (defaults to one per CPU core)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+
+
+# Smallest image batch worth sending to a separate worker
+IMAGE_CHUNK_MIN = int(os.getenv("ANALYSIS_IMAGE_CHUNK_MIN", "4"))
+
+# Engines every worker preloads and warms at start (default: ANALYSIS_ENGINE)
+ANALYSIS_WARM_ENGINES = [
+    name.strip() for name in os.getenv("ANALYSIS_WARM_ENGINES", ANALYSIS_ENGINE).split(",") if name.strip()
+]
+
+# Times a task is retried on a fresh pool after its pool broke
+ANALYSIS_POOL_RETRIES = int(os.getenv("ANALYSIS_POOL_RETRIES", "1"))
+
+# Minimum seconds between progress reports of one task
+ANALYSIS_PROGRESS_SECONDS = float(os.getenv("ANALYSIS_PROGRESS_SECONDS", "1"))
+
+STAGE_PROBING = "probing"
+STAGE_ANALYZING = "analyzing"
+STAGE_EXTRACTING = "extracting"
+STAGE_COUNTING = "counting"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Progress reports from the workers, and the trackers waiting for them by job id
+_progress_queue = None
+_progress_trackers: Dict[str, "_ProgressTracker"] = {}
+
+# Warm-up reports of the current pool's workers by pid, and failures
+_warmups: Dict[int, Dict] = {}
+_warmup_errors: List[str] = []
+
+# Progress queue of the current worker process, set by the pool initializer
+_worker_progress = None
+
+
+def _init_worker(engines: List[str], progress_queue=None):
+    """Pool initializer: preload and warm the given engines before taking work.
+
+    Other engines are imported the first time a task asks for them.
+    """
+    from ml.warmup import warm_up
+    
+    global _worker_progress
+    _worker_progress = progress_queue
+    try:
+        timings = warm_up(engines)
+    except Exception as e:
+        if progress_queue is not None:
+            progress_queue.put(('warmup_failed', os.getpid(), str(e)))
+        raise
+    if progress_queue is not None:
+        progress_queue.put(('ready', os.getpid(), timings))
+    print(f"Analysis worker {os.getpid()} ready ({', '.join(engines)}) in {timings['total_ms']} ms")
+
+
+def _noop():
+    return None
+
+
+def _progress_reporter(job_id: Optional[str], part: int, stage: str,
+                       total_frames: Optional[int] = None) -> Optional[Callable[[int, int], None]]:
+    """Throttled ``(frames_analyzed, frame_idx)`` callback that reports to the parent"""
+    if job_id is None or _worker_progress is None:
+        return None
+    state = {'first': None, 'sent_at': 0.0}
+    
+    def report(analyzed: int, frame_idx: int):
+        if state['first'] is None:
+            state['first'] = frame_idx
+        now = time.monotonic()
+        if now - state['sent_at'] < ANALYSIS_PROGRESS_SECONDS:
+            return
+        state['sent_at'] = now
+        covered = frame_idx - state['first'] + 1
+        _worker_progress.put_nowait(('progress', job_id, part, stage, analyzed, covered, total_frames))
+    
+    return report
+
+
+def _analyze_in_worker(video_path: str, video_id: Optional[str] = None, engine: Optional[str] = None) -> Dict:
+    """Run a full video analysis inside a worker process"""
+    spec = get_engine(engine, 'video')
+    with spec.load().checkout() as analyzer:
+        if spec.supports('landmarks'):
+            progress = None
+            if video_id and _worker_progress is not None:
+                from ml.chunked_analysis import probe_video
+                progress = _progress_reporter(video_id, 0, STAGE_ANALYZING, probe_video(video_path)['total_frames'])
+            results = analyzer.analyze_video(video_path, landmark_id=video_id, progress=progress)
+            results['landmark_id'] = video_id
+            return results
+        return analyzer.analyze_video(video_path)
+
+
+def _probe_in_worker(video_path: str) -> Dict:
+    from ml.chunked_analysis import probe_video
+    return probe_video(video_path)
+
+
+def _extract_segment_in_worker(video_path: str, start_s: float, end_s: Optional[float],
+                               video_id: Optional[str] = None, part: int = 0,
+                               engine: Optional[str] = None) -> List[Tuple]:
+    """Pose-estimate one time segment of a video inside a worker process"""
+    from ml.chunked_analysis import CHUNK_OVERLAP_S
+    warmup_s = CHUNK_OVERLAP_S if start_s > 0 else 0.0
+    progress = _progress_reporter(video_id, part, STAGE_EXTRACTING)
+    with get_engine(engine, 'chunked').load().checkout() as analyzer:
+        return analyzer.extract_landmarks(video_path, start_s, end_s, warmup_s=warmup_s, progress=progress)
+
+
+def _replay_in_worker(video_path: str, total_frames: int, frames: List[Tuple],
+                      video_id: Optional[str] = None, engine: Optional[str] = None) -> Dict:
+    """Count reps over a merged landmark stream inside a worker process"""
+    if video_id:
+        from ml.landmark_store import save_landmarks
+        save_landmarks(video_id, frames, total_frames)
+    with get_engine(engine, 'chunked').load().checkout() as analyzer:
+        results = analyzer.analyze_landmarks(frames, video_path, total_frames)
+    results['landmark_id'] = video_id
+    return results
+
+
+def _rescore_in_worker(video_id: str, thresholds: Optional[Dict], engine: Optional[str] = None) -> Dict:
+    """Replay counters over stored landmarks inside a worker process"""
+    with get_engine(engine, 'landmarks').load().checkout() as analyzer:
+        return analyzer.rescore(video_id, thresholds)
+
+
+def _analyze_images_in_worker(images: List[bytes]) -> List[Dict]:
+    """Estimate poses for a batch of encoded images inside a worker process"""
+    from ml.real_analyzer import image_pool
+    with image_pool.checkout() as analyzer:
+        return analyzer.analyze_images(images)
+
+
+def _verify_in_worker(video_path: str, landmark_id: str, risk_level: str) -> Dict:
+    """Spot-check submitted keypoints against the video inside a worker process"""
+    from ml.spot_check import verify_keypoints
+    return verify_keypoints(video_path, landmark_id, risk_level)
+
+
+class _ProgressTracker:
+    """Folds per-part worker reports of one job into a single progress snapshot"""
+    
+    def __init__(self, on_progress: Callable[[Dict], None], loop: asyncio.AbstractEventLoop):
+        self.on_progress = on_progress
+        self.loop = loop
+        self.stage: Optional[str] = None
+        self.total_frames = 0
+        self.parts: Dict[int, Tuple[int, int]] = {}
+    
+    def set_stage(self, stage: str, total_frames: Optional[int] = None):
+        self.stage = stage
+        if total_frames is not None:
+            self.total_frames = total_frames
+        self.emit()
+    
+    def update(self, part: int, stage: str, analyzed: int, covered: int, total_frames: Optional[int] = None):
+        self.stage = stage
+        self.parts[part] = (analyzed, covered)
+        if total_frames:
+            self.total_frames = total_frames
+        self.emit()
+    
+    def emit(self):
+        covered = sum(c for _, c in self.parts.values())
+        self.on_progress({
+            'stage': self.stage,
+            'frames_analyzed': sum(a for a, _ in self.parts.values()),
+            'frames_processed': covered,
+            'total_frames': self.total_frames,
+            'fraction': round(min(1.0, covered / self.total_frames), 3) if self.total_frames else None
+        })
+
+
+def _drain_progress(queue):
+    """Parent-side thread: route worker progress reports to their job's tracker
+    and record warm-up reports"""
+    while True:
+        message = queue.get()
+        if message is None:
+            return
+        kind = message[0]
+        if kind == 'progress':
+            tracker = _progress_trackers.get(message[1])
+            if tracker is not None:
+                tracker.loop.call_soon_threadsafe(tracker.update, *message[2:])
+        elif kind == 'ready':
+            _warmups[message[1]] = message[2]
+        elif kind == 'warmup_failed':
+            _warmup_errors.append(f"worker {message[1]}: {message[2]}")
+
+
+def start_executor() -> ProcessPoolExecutor:
+    """Create the analysis process pool if it is not running yet (or replace a broken one)"""
+    global _executor, _progress_queue
+    if _executor is not None and getattr(_executor, '_broken', False):
+        print("Analysis executor is broken; starting a new one")
+        shutdown_executor()
+    if _executor is None:
+        # Spawn instead of fork: the API process runs threads (event loop,
+        # MongoDB driver) that must not be duplicated into the workers
+        context = multiprocessing.get_context("spawn")
+        # Queues can only reach workers at start-up, so it is passed to the initializer
+        _progress_queue = context.Queue()
+        threading.Thread(target=_drain_progress, args=(_progress_queue,), daemon=True).start()
+        _warmups.clear()
+        _warmup_errors.clear()
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, ANALYSIS_WORKERS),
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(ANALYSIS_WARM_ENGINES, _progress_queue)
+        )
+        # Workers are spawned on demand; one task each starts (and warms) all of them now
+        for _ in range(max(1, ANALYSIS_WORKERS)):
+            _executor.submit(_noop)
+        print(f"Started analysis executor with {ANALYSIS_WORKERS} workers ({ANALYSIS_ENGINE})")
+    return _executor
+
+
+def shutdown_executor():
+    """Stop the analysis process pool"""
+    global _executor, _progress_queue
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _progress_queue.put(None)
+        _progress_queue = None
+
+
+async def _run_in_pool(fn: Callable, *args):
+    """Run ``fn(*args)`` in the process pool, on a fresh pool if a worker died"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(ANALYSIS_POOL_RETRIES + 1):
+        executor = start_executor()
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # Tasks failing together on the same pool replace it only once
+            if _executor is executor:
+                shutdown_executor()
+            if attempt >= ANALYSIS_POOL_RETRIES:
+                raise
+            print(f"Analysis worker died during {fn.__name__}; retrying on a new pool")
+
+
+def warmup_status() -> Dict:
+    """Whether every worker of the pool has finished warming up, with their timings"""
+    workers = max(1, ANALYSIS_WORKERS)
+    warmups = list(_warmups.values())
+    return {
+        'ready': _executor is not None and len(warmups) >= workers and not _warmup_errors,
+        'workers': workers,
+        'warm': len(warmups),
+        'engines': ANALYSIS_WARM_ENGINES,
+        'errors': list(_warmup_errors),
+        'timings': warmups
+    }
+
+
+async def wait_until_warm(timeout: Optional[float] = None, interval: float = 0.2) -> bool:
+    """Wait until ``warmup_status()['ready']``; False on timeout or warm-up failure"""
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while not warmup_status()['ready']:
+        if _warmup_errors or (deadline is not None and loop.time() >= deadline):
+            return False
+        await asyncio.sleep(interval)
+    return True
+
+
+async def run_analysis(video_path: str, video_id: Optional[str] = None,
+                       on_progress: Optional[Callable[[Dict], None]] = None,
+                       engine: Optional[str] = None) -> Dict:
+    """Analyze a video in the process pool without blocking the event loop.
+
+    ``engine`` names a registered engine (default ``ANALYSIS_ENGINE``). With
+    ``video_id``, engines that store landmarks keep the time series in the
+    landmark store for re-scoring. ``on_progress`` is called on the event loop
+    with a snapshot (stage, frames processed / total) whenever the analysis
+    reports progress; it needs ``video_id``.
+    """
+    from ml.chunked_analysis import CHUNKED_ANALYSIS
+    
+    spec = get_engine(engine, 'video')
+    tracker = None
+    if on_progress and video_id:
+        tracker = _ProgressTracker(on_progress, asyncio.get_running_loop())
+        _progress_trackers[video_id] = tracker
+    try:
+        if CHUNKED_ANALYSIS and spec.supports('chunked') and ANALYSIS_WORKERS > 1:
+            return await _run_chunked_analysis(video_path, video_id, tracker, spec.name)
+        
+        if tracker:
+            tracker.set_stage(STAGE_ANALYZING)
+        return await _run_in_pool(_analyze_in_worker, video_path, video_id, spec.name)
+    finally:
+        if tracker:
+            _progress_trackers.pop(video_id, None)
+
+
+async def run_rescore(video_id: str, thresholds: Optional[Dict] = None, engine: Optional[str] = None) -> Dict:
+    """Re-count a previously analyzed video from its stored landmarks"""
+    spec = get_engine(engine, 'landmarks') if engine else find_engine('landmarks')
+    return await _run_in_pool(_rescore_in_worker, video_id, thresholds, spec.name)
+
+
+async def run_image_analysis(images: List[bytes]) -> List[Dict]:
+    """Estimate poses for encoded images, spread over the workers in order-preserving chunks"""
+    if not images:
+        return []
+    size = max(IMAGE_CHUNK_MIN, math.ceil(len(images) / max(1, ANALYSIS_WORKERS)))
+    chunks = [images[i:i + size] for i in range(0, len(images), size)]
+    parts = await asyncio.gather(*[
+        _run_in_pool(_analyze_images_in_worker, chunk) for chunk in chunks
+    ])
+    return [result for part in parts for result in part]
+
+
+async def run_verification(video_path: str, landmark_id: str, risk_level: str = 'medium') -> Dict:
+    """Spot-check a keypoint submission against its video in the process pool"""
+    return await _run_in_pool(_verify_in_worker, video_path, landmark_id, risk_level)
+
+
+async def _run_chunked_analysis(video_path: str, video_id: Optional[str] = None,
+                                tracker: Optional[_ProgressTracker] = None,
+                                engine: Optional[str] = None) -> Dict:
+    """Spread a long video over several workers, then stitch the counts"""
+    from ml.chunked_analysis import plan_segments, merge_segments
+    
+    if tracker:
+        tracker.set_stage(STAGE_PROBING)
+    info = await _run_in_pool(_probe_in_worker, video_path)
+    segments = plan_segments(info['duration_s'], ANALYSIS_WORKERS)
+    if len(segments) == 1:
+        if tracker:
+            tracker.set_stage(STAGE_ANALYZING, info['total_frames'])
+        return await _run_in_pool(_analyze_in_worker, video_path, video_id, engine)
+    
+    print(f"Analyzing {video_path} in {len(segments)} parallel segments")
+    if tracker:
+        tracker.set_stage(STAGE_EXTRACTING, info['total_frames'])
+    parts = await asyncio.gather(*[
+        _run_in_pool(_extract_segment_in_worker, video_path, start_s, end_s, video_id, part, engine)
+        for part, (start_s, end_s) in enumerate(segments)
+    ])
+    frames = merge_segments(parts)
+    
+    if tracker:
+        tracker.set_stage(STAGE_COUNTING)
+    results = await _run_in_pool(_replay_in_worker, video_path, info['total_frames'], frames, video_id, engine)
+    results['segments'] = len(segments)
+    return results
@@ -0,0 +1,109 @@
+"""
+Checkout/return pool of independent analyzer instances.
+
+Analyzers keep per-video state (counters, pose history, MediaPipe tracking),
+so one instance must never serve two jobs at once. A pool hands each job its
+own instance for the duration of the job and resets it before the next one.
+Instances are built lazily, on first demand, up to ``size``; when all are
+checked out, callers wait or are turned away.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+# Upper bound on instances per pool (each real analyzer owns a MediaPipe graph)
+ANALYZER_POOL_SIZE = int(os.getenv("ANALYZER_POOL_SIZE", str(os.cpu_count() or 1)))
+
+T = TypeVar('T')
+
+
+class PoolExhausted(Exception):
+    """Raised when no analyzer becomes free within the requested timeout"""
+
+
+def _reset_counters(analyzer):
+    analyzer.reset_counters()
+
+
+class AnalyzerPool(Generic[T]):
+    """Thread-safe pool of analyzers built by ``factory``"""
+
+    def __init__(self, factory: Callable[[], T], size: Optional[int] = None,
+                 reset: Callable[[T], None] = _reset_counters):
+        self._factory = factory
+        self._reset = reset
+        self.size = max(1, size or ANALYZER_POOL_SIZE)
+        self._idle: List[T] = []
+        self._created = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> T:
+        """Check out an analyzer with fresh per-job state.
+
+        Blocks until one is free; with ``timeout`` (seconds, 0 for no wait)
+        raises ``PoolExhausted`` instead of waiting longer.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolExhausted(f"All {self.size} analyzers are busy")
+                self._cond.wait(remaining)
+
+            if self._idle:
+                analyzer = self._idle.pop()
+            else:
+                # Reserve the slot before building outside the lock
+                self._created += 1
+                analyzer = None
+            self._in_use += 1
+
+        if analyzer is None:
+            try:
+                analyzer = self._factory()
+            except BaseException:
+                with self._cond:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        self._reset(analyzer)
+        return analyzer
+
+    def release(self, analyzer: T):
+        """Return a checked-out analyzer to the pool"""
+        with self._cond:
+            self._idle.append(analyzer)
+            self._in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        """``with pool.checkout() as analyzer:`` - returned on exit"""
+        analyzer = self.acquire(timeout)
+        try:
+            yield analyzer
+        finally:
+            self.release(analyzer)
+
+    def reset_idle(self) -> int:
+        """Reset the analyzers not currently checked out; running jobs are untouched"""
+        # Held under the lock so an instance cannot be checked out mid-reset
+        with self._cond:
+            for analyzer in self._idle:
+                self._reset(analyzer)
+            return len(self._idle)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle)
+            }
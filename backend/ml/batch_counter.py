@@ -0,0 +1,266 @@
+"""
+Vectorized whole-sequence exercise detection and rep counting.
+
+Offline counterpart of ``RealExerciseAnalyzer._update_from_landmarks`` /
+``ExerciseCounter``: given an ``(N, 33, 3)`` landmark array (NaN rows for
+frames without a pose) it computes every joint angle in one pass, detects the
+exercise per frame, routes frames to the counter of the current exercise and
+runs the up/down hysteresis with array operations. Counts, states and
+feedback match the streaming state machine frame for frame; feedback strings
+are only formatted for the frames that are actually reported.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+EXERCISES = ['pushup', 'situp', 'jump']
+
+# Exercise codes used in the per-frame arrays (0 = none)
+_CODES = {name: i + 1 for i, name in enumerate(EXERCISES)}
+
+# Counter thresholds: joint angles in degrees, jump height in normalized units
+DEFAULT_THRESHOLDS = {
+    'pushup': {'up_threshold': 150, 'down_threshold': 90},
+    'situp': {'up_threshold': 45, 'down_threshold': 15},
+    'jump': {'height_threshold': 0.05}
+}
+
+
+def joint_angles(landmarks: np.ndarray, a: int, b: int, c: int) -> np.ndarray:
+    """Angle (degrees) at landmark ``b`` between ``a`` and ``c`` for every frame, from x/y only"""
+    ba = landmarks[:, a, :2] - landmarks[:, b, :2]
+    bc = landmarks[:, c, :2] - landmarks[:, b, :2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine = (ba * bc).sum(axis=1) / (np.sqrt((ba * ba).sum(axis=1)) * np.sqrt((bc * bc).sum(axis=1)))
+        return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def _trailing_mean(values: np.ndarray, window: int, include_current: bool) -> np.ndarray:
+    """Mean of the last ``window`` values up to (or before) each position; NaN where not full"""
+    csum = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    n = len(values)
+    end = np.arange(n) + (1 if include_current else 0)
+    start = end - window
+    means = np.full(n, np.nan)
+    full = start >= 0
+    means[full] = (csum[end[full]] - csum[start[full]]) / window
+    return means
+
+
+def _forward_fill(codes: np.ndarray) -> np.ndarray:
+    """Carry the last non-zero code forward"""
+    idx = np.where(codes > 0, np.arange(len(codes)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    # Positions before the first non-zero code map to index 0 and keep its value
+    return codes[idx]
+
+
+def hysteresis(to_a: np.ndarray, to_b: np.ndarray, start_in_a: bool):
+    """Two-state machine over event masks.
+
+    ``to_a[i]`` moves the state to A if it is in B, ``to_b[i]`` moves it to B
+    if it is in A. Returns ``(in_a, entered_a, entered_b)`` per frame.
+    """
+    n = len(to_a)
+    events = np.zeros(n, dtype=np.int8)
+    events[to_a] = 1
+    events[to_b] = -1
+
+    pos = np.flatnonzero(events)
+    ev = events[pos]
+    # Only an event that differs from the previous one changes the state
+    prev = np.concatenate([[1 if start_in_a else -1], ev[:-1]])
+    changed = ev != prev
+
+    entered_a = np.zeros(n, dtype=bool)
+    entered_b = np.zeros(n, dtype=bool)
+    entered_a[pos[changed & (ev == 1)]] = True
+    entered_b[pos[changed & (ev == -1)]] = True
+
+    state = np.zeros(n, dtype=np.int8)
+    state[pos] = ev
+    last = np.where(state != 0, np.arange(n), -1)
+    np.maximum.accumulate(last, out=last)
+    in_a = np.where(last >= 0, state[np.maximum(last, 0)] == 1, start_in_a)
+    return in_a, entered_a, entered_b
+
+
+def detect_exercises(landmarks: np.ndarray, detected: np.ndarray) -> np.ndarray:
+    """Per-frame exercise code, mirroring ``RealExerciseAnalyzer._detect_exercise_type``"""
+    shoulder_hip = joint_angles(landmarks, 11, 23, 25)
+    hip_knee = joint_angles(landmarks, 23, 25, 27)
+    elbow_left = joint_angles(landmarks, 11, 13, 15)
+    elbow_right = joint_angles(landmarks, 12, 14, 16)
+
+    pushup = (shoulder_hip < 30) & ((elbow_left < 120) | (elbow_right < 120))
+    situp = (shoulder_hip > 60) & (hip_knee < 90)
+
+    # Hip rising above the mean of the last 5 detected poses (history must hold more than 5)
+    jump = np.zeros(len(landmarks), dtype=bool)
+    det_idx = np.flatnonzero(detected)
+    hip_y = landmarks[det_idx, 23, 1].astype(np.float64)
+    hip_mean = _trailing_mean(hip_y, 5, include_current=True)
+    seen = np.arange(1, len(det_idx) + 1)
+    with np.errstate(invalid='ignore'):
+        rising = (seen > 5) & (hip_y < hip_mean - 0.05)
+    jump[det_idx] = rising
+    jump |= (landmarks[:, 27, 1] < landmarks[:, 25, 1]) & (landmarks[:, 28, 1] < landmarks[:, 26, 1])
+
+    codes = np.select([pushup, situp, jump], [_CODES['pushup'], _CODES['situp'], _CODES['jump']], 0)
+    codes[~detected] = 0
+    return codes.astype(np.int8)
+
+
+def _count_exercise(name: str, landmarks: np.ndarray, thresholds: Dict, initial_state: str) -> Dict:
+    """Run one counter over the frames routed to it"""
+    n = len(landmarks)
+    result = {
+        'count': np.zeros(n, dtype=np.int32),
+        'completed': np.zeros(n, dtype=bool),
+        'state': np.full(n, initial_state, dtype=object),
+        'analyzing': np.zeros(n, dtype=bool),
+        'final_state': initial_state
+    }
+    if n == 0:
+        return result
+
+    if name == 'pushup':
+        angle = joint_angles(landmarks, 11, 13, 15)
+        t = thresholds['pushup']
+        # A = "up"; a rep completes on the way back up
+        in_up, entered_up, _ = hysteresis(angle > t['up_threshold'], angle < t['down_threshold'],
+                                          initial_state == 'up')
+        completed = entered_up
+        states = np.where(in_up, 'up', 'down')
+    elif name == 'situp':
+        angle = joint_angles(landmarks, 11, 23, 25)
+        t = thresholds['situp']
+        # A = "up"; a rep completes on the way down
+        in_up, _, entered_down = hysteresis(angle > t['up_threshold'], angle < t['down_threshold'],
+                                            initial_state == 'up')
+        completed = entered_down
+        states = np.where(in_up, 'up', 'down')
+    else:
+        # Baseline: mean hip height of the 4 frames before, needs 5 frames of history
+        hip_y = landmarks[:, 23, 1].astype(np.float64)
+        change = np.abs(hip_y - _trailing_mean(hip_y, 4, include_current=False))
+        analyzing = np.arange(n) < 4
+        threshold = thresholds['jump']['height_threshold']
+        if initial_state in ('ground', 'air'):
+            with np.errstate(invalid='ignore'):
+                to_air = ~analyzing & (change > threshold)
+                to_ground = ~analyzing & (change < threshold)
+            in_ground, entered_ground, _ = hysteresis(to_ground, to_air, initial_state == 'ground')
+            completed = entered_ground
+            states = np.where(in_ground, 'ground', 'air')
+        else:
+            # The streaming counter only reacts to "ground"/"air", so any other
+            # start state never changes and never counts
+            completed = np.zeros(n, dtype=bool)
+            states = np.full(n, initial_state, dtype=object)
+        result['analyzing'] = analyzing
+
+    result['completed'] = completed
+    result['count'] = np.cumsum(completed).astype(np.int32)
+    result['state'] = states
+    result['final_state'] = str(states[-1])
+    return result
+
+
+_LABELS = {'pushup': 'Push-up', 'situp': 'Sit-up', 'jump': 'Jump'}
+
+
+def _feedback(name: str, count: int, state: str, completed: bool, analyzing: bool) -> str:
+    if analyzing:
+        return "Analyzing..."
+    if completed:
+        return f"{_LABELS[name]} {count} completed!"
+    return f"{_LABELS[name]} {count} - {state}"
+
+
+def count_sequence(landmarks: np.ndarray, thresholds: Dict, frame_numbers: Optional[np.ndarray] = None,
+                   timestamps: Optional[np.ndarray] = None, initial_states: Optional[Dict] = None,
+                   report_last: int = 10) -> Dict:
+    """Detect and count over a full ``(N, 33, 3)`` landmark array.
+
+    Returns final counts and states, per-frame exercise/count arrays, and
+    streaming-style ``frame_results`` for the last ``report_last`` frames.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    n = len(landmarks)
+    frame_numbers = np.arange(n) if frame_numbers is None else np.asarray(frame_numbers)
+    initial_states = initial_states or {name: 'up' for name in EXERCISES}
+
+    # A frame has a pose unless its whole row is NaN (adapters may leave single landmarks NaN)
+    detected = ~np.isnan(landmarks).all(axis=(1, 2))
+    current = _forward_fill(detect_exercises(landmarks, detected))
+
+    frame_count = np.zeros(n, dtype=np.int32)
+    final_counts = {}
+    final_states = {}
+    per_exercise = {}
+    for name in EXERCISES:
+        routed = np.flatnonzero(detected & (current == _CODES[name]))
+        counted = _count_exercise(name, landmarks[routed], thresholds, initial_states.get(name, 'up'))
+        frame_count[routed] = counted['count']
+        final_counts[name] = int(counted['count'][-1]) if len(routed) else 0
+        final_states[name] = counted['final_state']
+        per_exercise[name] = (routed, counted)
+
+    frame_results = []
+    for i in range(max(0, n - report_last), n):
+        code = int(current[i])
+        name = EXERCISES[code - 1] if code else None
+        feedback = "No exercise detected"
+        if name and detected[i]:
+            routed, counted = per_exercise[name]
+            j = int(np.searchsorted(routed, i))
+            feedback = _feedback(name, int(counted['count'][j]), str(counted['state'][j]),
+                                 bool(counted['completed'][j]), bool(counted['analyzing'][j]))
+        frame_results.append({
+            'frame_number': int(frame_numbers[i]),
+            'timestamp': float(timestamps[i]) if timestamps is not None else None,
+            'exercise': name,
+            'count': int(frame_count[i]) if name and detected[i] else 0,
+            'feedback': feedback,
+            'pose_detected': bool(detected[i])
+        })
+
+    return {
+        'final_counts': final_counts,
+        'final_states': final_states,
+        # Per-frame arrays (exercise code, pose present, current count)
+        'current': current,
+        'detected': detected,
+        'frame_count': frame_count,
+        'frame_results': frame_results,
+        'most_detected': _most_detected(current),
+        'pose_detection_rate': float(detected.mean() * 100) if n else 0.0
+    }
+
+
+def _most_detected(current: np.ndarray) -> Optional[str]:
+    """Most frequent exercise; ties go to the exercise seen first, like the streaming analyzer"""
+    codes = current[current > 0]
+    if len(codes) == 0:
+        return None
+    unique, first_seen, totals = np.unique(codes, return_index=True, return_counts=True)
+    # Stable sort by first appearance, then pick the first maximum
+    order = np.argsort(first_seen, kind='stable')
+    best = order[np.argmax(totals[order])]
+    return EXERCISES[int(unique[best]) - 1]
+
+
+def summarize(batch: Dict) -> Dict:
+    """Result fields shared by every analysis built on ``count_sequence``"""
+    detected = batch['detected']
+    frames = len(detected)
+    return {
+        'frames_analyzed': frames,
+        'final_counts': batch['final_counts'],
+        'frame_results': batch['frame_results'],
+        'detected_exercise': batch['most_detected'],
+        'form_score': int(int(detected.sum()) / frames * 100) if frames else 0,
+        'pose_detection_rate': batch['pose_detection_rate']
+    }
@@ -0,0 +1,81 @@
+"""
+Parallel analysis of long videos in overlapping time segments.
+
+A long video is cut into consecutive segments that are pose-estimated in
+parallel worker processes. Each segment starts decoding ``overlap`` seconds
+early so MediaPipe tracking has locked on by the segment start; those warm-up
+frames are discarded. Every timestamp is therefore owned by exactly one
+segment.
+
+Counter state is stitched by replaying the merged landmark stream through a
+single analyzer in order. Pose estimation is the expensive, parallel part;
+replaying detection and counting costs microseconds per frame and gives exactly
+the counts a sequential run would give, without double-counting or dropping
+reps at segment boundaries.
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Whether long videos are split into parallel segments
+CHUNKED_ANALYSIS = os.getenv("ANALYSIS_CHUNKED", "1") == "1"
+
+# Videos shorter than this are analyzed in one piece
+CHUNK_MIN_DURATION_S = float(os.getenv("ANALYSIS_CHUNK_MIN_DURATION", "30"))
+
+# Shortest segment worth a separate task
+CHUNK_MIN_SEGMENT_S = float(os.getenv("ANALYSIS_CHUNK_MIN_SEGMENT", "10"))
+
+# Tracking warm-up decoded before each segment start
+CHUNK_OVERLAP_S = float(os.getenv("ANALYSIS_CHUNK_OVERLAP", "1.0"))
+
+
+def probe_video(video_path: str) -> Dict:
+    """Read frame count, FPS and duration from the container headers"""
+    # Imported here so the API process can plan segments without loading OpenCV
+    import cv2
+    from ml.frame_sampler import get_fps
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Could not open video file: {video_path}")
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = get_fps(cap)
+    finally:
+        cap.release()
+
+    # Recorder WebM files often carry no frame count; duration is then unknown
+    duration_s = total_frames / fps if total_frames > 0 else None
+    return {'total_frames': max(total_frames, 0), 'fps': fps, 'duration_s': duration_s}
+
+
+def plan_segments(duration_s: Optional[float], max_segments: int) -> List[Tuple[float, Optional[float]]]:
+    """Split ``[0, duration_s)`` into up to ``max_segments`` equal ``(start, end)`` segments.
+
+    Returns a single open-ended segment when the video is short, its duration is
+    unknown, or there is only one worker.
+    """
+    if not duration_s or duration_s < CHUNK_MIN_DURATION_S or max_segments <= 1:
+        return [(0.0, None)]
+
+    count = max(1, min(max_segments, math.floor(duration_s / CHUNK_MIN_SEGMENT_S)))
+    length = duration_s / count
+    segments = [(i * length, (i + 1) * length) for i in range(count)]
+    # The last segment runs to the end of the stream in case the header duration is short
+    segments[-1] = (segments[-1][0], None)
+    return segments
+
+
+def merge_segments(parts: List[List[Tuple]]) -> List[Tuple]:
+    """Concatenate per-segment ``(frame_idx, timestamp, landmarks)`` lists in time order"""
+    merged = []
+    last_t = -1.0
+    for part in parts:
+        for item in part:
+            # Guard against a frame that landed in two segments after an imprecise seek
+            if item[1] > last_t:
+                merged.append(item)
+                last_t = item[1]
+    return merged
@@ -0,0 +1,162 @@
+"""
+Sparse exercise classification.
+
+Deciding *which* exercise is being performed (YOLO detection, or the pose
+heuristics of the MediaPipe analyzer) is far more expensive than counting
+reps, yet the answer almost never changes within a clip. A
+``ClassificationScheduler`` runs the classifier only:
+
+- until a first decision has been made (clip or session start),
+- every ``interval_s`` seconds afterwards,
+- when the posture drifts: the smoothed torso and leg angles have moved more
+  than ``drift_degrees`` since the last classification (e.g. getting up from
+  push-ups to do jumps), or a pose appears after none was seen.
+
+In between, the last decision is carried forward. A decision only changes
+after ``confirm`` consecutive classifications agree on a new exercise (the
+scheduler re-classifies on every frame while a change is pending, and a
+disagreeing or empty answer drops it); frames where the classifier finds
+nothing keep the current decision.
+"""
+
+import math
+import os
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# Whether ExerciseInference / OnnxExerciseInference classify sparsely by default
+CLASSIFY_SPARSE = os.getenv("CLASSIFY_SPARSE", "1") == "1"
+# Same for RealExerciseAnalyzer (opt-in: its heuristics are cheap and replays assume per-frame detection)
+CLASSIFY_SPARSE_REAL = os.getenv("CLASSIFY_SPARSE_REAL", "0") == "1"
+
+# Seconds between scheduled classifications once a decision is made
+CLASSIFY_INTERVAL_S = float(os.getenv("CLASSIFY_INTERVAL_S", "2.0"))
+# Change of the smoothed posture angles that forces a classification
+CLASSIFY_DRIFT_DEGREES = float(os.getenv("CLASSIFY_DRIFT_DEGREES", "30"))
+# Consecutive agreeing classifications needed to switch exercise
+CLASSIFY_CONFIRM = int(os.getenv("CLASSIFY_CONFIRM", "2"))
+# Half-life of the posture smoothing, so single reps do not read as drift
+CLASSIFY_DRIFT_HALF_LIFE_S = float(os.getenv("CLASSIFY_DRIFT_HALF_LIFE_S", "0.5"))
+
+# MediaPipe landmark indices
+_SHOULDERS = (11, 12)
+_HIPS = (23, 24)
+_ANKLES = (27, 28)
+
+
+def posture_angles(pose_landmarks: Optional[Sequence]) -> Optional[np.ndarray]:
+    """Torso and leg elevation in degrees (0 = horizontal, 90 = upright)"""
+    if not pose_landmarks or len(pose_landmarks) < 33:
+        return None
+
+    def midpoint(indices):
+        return np.mean([pose_landmarks[i][:2] for i in indices], axis=0)
+
+    shoulders, hips, ankles = midpoint(_SHOULDERS), midpoint(_HIPS), midpoint(_ANKLES)
+    angles = []
+    for upper, lower in ((shoulders, hips), (hips, ankles)):
+        dx, dy = lower - upper
+        angles.append(math.degrees(math.atan2(abs(dy), abs(dx))))
+    return np.array(angles)
+
+
+class ClassificationScheduler:
+    """Decide when to run the exercise classifier and smooth its decisions"""
+
+    def __init__(self, interval_s: float = CLASSIFY_INTERVAL_S, drift_degrees: float = CLASSIFY_DRIFT_DEGREES,
+                 confirm: int = CLASSIFY_CONFIRM, half_life_s: float = CLASSIFY_DRIFT_HALF_LIFE_S):
+        self.interval_s = interval_s
+        self.drift_degrees = drift_degrees
+        self.confirm = max(1, confirm)
+        self.half_life_s = half_life_s
+        self.reset()
+
+    def reset(self):
+        self.current: Optional[str] = None
+        self.pending: Optional[str] = None
+        self.pending_hits = 0
+
+        self.posture: Optional[np.ndarray] = None
+        self.reference: Optional[np.ndarray] = None
+        self.last_t: Optional[float] = None
+        self.last_classified_t: Optional[float] = None
+
+        self.frames_seen = 0
+        self.reasons: Dict[str, int] = {}
+        self.switches = 0
+
+    def should_classify(self, pose_landmarks: Optional[Sequence], timestamp: Optional[float] = None) -> bool:
+        """Return True if the classifier should run on this frame; call ``update`` with its answer"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self.frames_seen += 1
+        self._track_posture(pose_landmarks, timestamp)
+
+        if self.current is None:
+            reason = 'start'
+        elif self.pending is not None:
+            reason = 'confirm'
+        elif timestamp - self.last_classified_t >= self.interval_s:
+            reason = 'interval'
+        elif self._drifted():
+            reason = 'drift'
+        else:
+            return False
+
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        self.last_classified_t = timestamp
+        self.reference = self.posture
+        return True
+
+    def update(self, label: Optional[str]) -> Optional[str]:
+        """Feed the classifier's answer; returns the decision to use from now on"""
+        if label is None or label == self.current:
+            # Nothing detected, or the current decision confirmed: a pending change lapses
+            self.pending, self.pending_hits = None, 0
+            return self.current
+
+        if self.current is None:
+            self.current = label
+            return self.current
+
+        if label == self.pending:
+            self.pending_hits += 1
+        else:
+            self.pending, self.pending_hits = label, 1
+        if self.pending_hits >= self.confirm:
+            self.current = label
+            self.pending, self.pending_hits = None, 0
+            self.switches += 1
+        return self.current
+
+    def _track_posture(self, pose_landmarks, timestamp: float):
+        """Exponentially smoothed posture angles; frames without a pose leave them unchanged"""
+        angles = posture_angles(pose_landmarks)
+        if angles is None:
+            return
+        if self.posture is None or self.last_t is None:
+            self.posture = angles
+        else:
+            dt = max(0.0, timestamp - self.last_t)
+            alpha = 1 - 0.5 ** (dt / self.half_life_s) if self.half_life_s > 0 else 1.0
+            self.posture = self.posture + alpha * (angles - self.posture)
+        self.last_t = timestamp
+
+    def _drifted(self) -> bool:
+        if self.posture is None:
+            return False
+        if self.reference is None:
+            # A pose appeared since the last classification
+            return True
+        return float(np.abs(self.posture - self.reference).max()) >= self.drift_degrees
+
+    def stats(self) -> dict:
+        classifications = sum(self.reasons.values())
+        return {
+            'frames': self.frames_seen,
+            'classifications': classifications,
+            'reasons': dict(self.reasons),
+            'switches': self.switches,
+            'classification_reduction': round(1 - classifications / max(self.frames_seen, 1), 3)
+        }
@@ -0,0 +1,140 @@
+"""
+Registry of analysis engines.
+
+Engines are declared here by name with the module that implements them, the
+packages they need, a version and a set of capabilities. Nothing is imported
+until an engine is first used, so an API process or worker only loads the ML
+libraries of the engines it actually runs (the YOLO engine alone pulls in
+torch and ultralytics; the ONNX engine runs the same detector without them).
+
+The deployment default comes from ``ANALYSIS_ENGINE``; ``ANALYSIS_ENGINES``
+(comma separated) restricts which engines may be selected per request.
+
+Capabilities:
+
+- ``video``: analyzes uploaded video files
+- ``landmarks``: stores landmark time series for re-scoring and spot checks
+- ``chunked``: can split a video over several workers
+- ``progress``: reports progress while analyzing a video
+- ``images``: static pose estimation of independent images
+- ``frames``: stateful frame-by-frame analysis (live sessions)
+"""
+
+import importlib
+import importlib.util
+import os
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Engine used when a request does not name one
+ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "real")
+
+
+class EngineUnavailable(ValueError):
+    """Raised for unknown, disabled or not installed engines"""
+
+
+class Engine:
+    """Declaration of one analysis engine; the implementation is imported on first use"""
+
+    def __init__(self, name: str, module: str, pool: str, version: str, capabilities: Tuple[str, ...],
+                 requires: Tuple[str, ...], description: str):
+        self.name = name
+        self.module = module
+        # Module attribute holding the AnalyzerPool, or a function returning it
+        self.pool_attr = pool
+        # Bump whenever the engine's output for the same video changes;
+        # cached analyses are keyed by it
+        self.version = version
+        self.capabilities: FrozenSet[str] = frozenset(capabilities)
+        self.requires = requires
+        self.description = description
+        self._installed: Optional[bool] = None
+        self._pool = None
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    def is_installed(self) -> bool:
+        """Whether the required packages are importable, checked without importing them"""
+        if self._installed is None:
+            self._installed = all(importlib.util.find_spec(package) is not None for package in self.requires)
+        return self._installed
+
+    @property
+    def loaded(self) -> bool:
+        return self._pool is not None
+
+    def load(self):
+        """Import the implementation and return its analyzer pool"""
+        if self._pool is None:
+            module = importlib.import_module(self.module)
+            pool = getattr(module, self.pool_attr)
+            self._pool = pool() if callable(pool) else pool
+            print(f"Loaded analysis engine {self.name} {self.version}")
+        return self._pool
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'version': self.version,
+            'capabilities': sorted(self.capabilities),
+            'description': self.description,
+            'installed': self.is_installed(),
+            'loaded': self.loaded
+        }
+
+
+ENGINES: Dict[str, Engine] = {
+    engine.name: engine for engine in [
+        Engine('real', 'ml.real_analyzer', 'analyzer_pool', '1.0',
+               ('video', 'landmarks', 'chunked', 'progress', 'images', 'frames'),
+               ('cv2', 'mediapipe', 'numpy'),
+               "MediaPipe pose estimation with angle-based rep counting"),
+        Engine('hybrid', 'ml.hybrid_analyzer', 'analyzer_pool', '1.0',
+               ('video',), (),
+               "Duration-based estimate without pose estimation (demo)"),
+        Engine('simple', 'ml.simple_inference', 'analyzer_pool', '1.0',
+               ('video',), ('cv2', 'mediapipe', 'numpy'),
+               "MediaPipe pose estimation analyzing every frame"),
+        Engine('yolo', 'ml.exercise_analyzer', 'inference_pool', '1.1',
+               ('video', 'frames'), ('torch', 'ultralytics', 'cv2', 'mediapipe'),
+               "YOLO exercise detection with MediaPipe rep counting"),
+        Engine('onnx', 'ml.onnx_inference', 'analyzer_pool', '1.1',
+               ('video', 'frames'), ('onnxruntime', 'cv2', 'mediapipe', 'numpy'),
+               "Exported YOLO detector on ONNX Runtime (CPU) with MediaPipe rep counting")
+    ]
+}
+
+# Engines requests may select (defaults to all declared)
+ENABLED_ENGINES = [
+    name.strip() for name in os.getenv("ANALYSIS_ENGINES", ",".join(ENGINES)).split(",") if name.strip()
+]
+
+
+def get_engine(name: Optional[str] = None, capability: Optional[str] = None) -> Engine:
+    """Look up an enabled engine (the default when ``name`` is None) without loading it"""
+    name = name or ANALYSIS_ENGINE
+    engine = ENGINES.get(name)
+    if engine is None or (name not in ENABLED_ENGINES and name != ANALYSIS_ENGINE):
+        raise EngineUnavailable(f"Unknown analysis engine: {name}")
+    if capability and not engine.supports(capability):
+        raise EngineUnavailable(f"Engine '{name}' does not support {capability}")
+    if not engine.is_installed():
+        raise EngineUnavailable(f"Engine '{name}' is not installed")
+    return engine
+
+
+def find_engine(capability: str) -> Engine:
+    """The default engine if it has ``capability``, else the first enabled engine that does"""
+    for name in [ANALYSIS_ENGINE] + ENABLED_ENGINES:
+        engine = ENGINES.get(name)
+        if engine is not None and engine.supports(capability) and engine.is_installed():
+            return engine
+    raise EngineUnavailable(f"No installed engine supports {capability}")
+
+
+def list_engines() -> List[Dict]:
+    return [
+        {**ENGINES[name].describe(), 'default': name == ANALYSIS_ENGINE}
+        for name in ENGINES if name in ENABLED_ENGINES or name == ANALYSIS_ENGINE
+    ]
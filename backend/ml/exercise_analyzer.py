@@ -13,6 +13,7 @@ from albumentations.pytorch import ToTensorV2
 import yaml
 from ultralytics import YOLO
 import math
+import time
 
 class ExerciseDataset(Dataset):
     """Custom dataset for exercise pose detection"""
@@ -501,7 +502,7 @@ def train_exercise_model():
     metrics = model.val()
     
     # Export model
-    model.export(format='onnx')  # Export to ONNX for web deployment
+    model.export(format='onnx')  # Export to ONNX for web deployment and ml.onnx_inference
     
     print(f"Training completed! Best model saved.")
     print(f"mAP50: {metrics.box.map50}")
@@ -512,8 +513,11 @@ def train_exercise_model():
 def create_inference_pipeline():
     """Create inference pipeline for real-time exercise counting"""
     
+    from ml.classification_scheduler import CLASSIFY_SPARSE, ClassificationScheduler
+    from ml.frame_batcher import FrameBatcher
+    
     class ExerciseInference:
-        def __init__(self, model_path):
+        def __init__(self, model_path, batch_size=None, max_latency_ms=None, sparse_classification=None):
             self.model = YOLO(model_path)
             self.mp_pose = mp.solutions.pose
             self.pose = self.mp_pose.Pose(
@@ -531,28 +535,90 @@ def create_inference_pipeline():
             }
             
             self.current_exercise = None
+            
+            # Batched detection for offline analysis (see submit_frame)
+            self.batcher = FrameBatcher(self._detect_batch, batch_size, max_latency_ms)
+            
+            # Run YOLO only when the exercise may have changed (see process_frame)
+            sparse = CLASSIFY_SPARSE if sparse_classification is None else sparse_classification
+            self.scheduler = ClassificationScheduler() if sparse else None
+        
+        def reset_counters(self):
+            """Start a new session: zero the counters and forget the exercise"""
+            self.counters = {name: ExerciseCounter(name) for name in self.counters}
+            self.current_exercise = None
+            self.batcher.discard()
+            if self.scheduler is not None:
+                self.scheduler.reset()
         
-        def process_frame(self, frame):
-            """Process video frame and return results"""
-            # YOLO detection
-            results = self.model(frame)
+        def process_frame(self, frame, timestamp=None):
+            """Process video frame and return results.
+            
+            With a classification scheduler, YOLO only runs when the scheduler
+            asks for it (session start, every few seconds, posture drift) and
+            ``yolo_results`` is None on the other frames; ``timestamp`` is the
+            frame time in seconds (wall clock when omitted).
+            """
+            pose_landmarks = self._estimate_pose(frame)
+            results = None
+            if self.scheduler is None or self.scheduler.should_classify(pose_landmarks, timestamp):
+                # YOLO detection
+                results = self.model(frame)
+            return self._update(frame, pose_landmarks, results)
+        
+        def process_frames(self, frames):
+            """Process several frames with one batched YOLO pass; results in frame order"""
+            detections = self._detect_batch(frames)
+            return [self._process_detections(frame, [result]) for frame, result in zip(frames, detections)]
+        
+        def submit_frame(self, frame, context=None):
+            """Queue a frame for batched detection.
             
+            Returns ``(context, result)`` for every frame of a batch this
+            submission completed (batch full or oldest frame overdue), in
+            submission order; call ``flush`` after the last frame.
+            """
+            return self._route(self.batcher.submit(frame, (frame, context)))
+        
+        def flush(self):
+            """Process the frames still waiting for a batch"""
+            return self._route(self.batcher.flush())
+        
+        def _route(self, batch):
+            # Pose and counters stay per frame and in order; only detection is batched
+            return [(context, self._process_detections(frame, [result])) for (frame, context), result in batch]
+        
+        def _detect_batch(self, frames):
+            """One YOLO forward pass over a list of frames; one result per frame"""
+            return list(self.model(list(frames), verbose=False))
+        
+        def _process_detections(self, frame, results):
+            """Pose, exercise selection and counting for one frame with its YOLO results"""
+            return self._update(frame, self._estimate_pose(frame), results)
+        
+        def _estimate_pose(self, frame):
+            """MediaPipe pose landmarks of a BGR frame, or None"""
             # Pose detection
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             pose_results = self.pose.process(rgb_frame)
             
             # Extract pose landmarks
-            pose_landmarks = None
             if pose_results.pose_landmarks:
                 landmarks = pose_results.pose_landmarks.landmark
-                pose_landmarks = [(lm.x, lm.y, lm.z) for lm in landmarks]
-            
-            # Determine exercise type from YOLO results
-            detected_exercise = self._get_exercise_type(results)
-            
-            if detected_exercise and detected_exercise != self.current_exercise:
-                self.current_exercise = detected_exercise
-                print(f"Exercise changed to: {detected_exercise}")
+                return [(lm.x, lm.y, lm.z) for lm in landmarks]
+            return None
+        
+        def _update(self, frame, pose_landmarks, results):
+            """Exercise selection and counting; ``results`` is None when YOLO was skipped"""
+            if results is not None:
+                # Determine exercise type from YOLO results
+                detected_exercise = self._get_exercise_type(results)
+                if self.scheduler is not None:
+                    detected_exercise = self.scheduler.update(detected_exercise)
+                
+                if detected_exercise and detected_exercise != self.current_exercise:
+                    self.current_exercise = detected_exercise
+                    print(f"Exercise changed to: {detected_exercise}")
             
             # Count reps if exercise detected
             count, feedback = 0, "No exercise detected"
@@ -569,6 +635,65 @@ def create_inference_pipeline():
                 'yolo_results': results
             }
         
+        def analyze_video(self, video_path, sample_hz=None):
+            """Analyze a video file and return the final counts.
+            
+            With sparse classification (the default) YOLO runs on a few frames
+            only, so frames go through ``process_frame`` one by one. Batched
+            detection of every frame is opt-in: ``sparse_classification=False``
+            or ``CLASSIFY_SPARSE=0``.
+            """
+            from ml.frame_sampler import iter_sampled_frames
+            
+            self.reset_counters()
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                raise Exception(f"Could not open video file: {video_path}")
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            
+            frame_results = []
+            
+            def collect(processed):
+                for (frame_idx, timestamp), result in processed:
+                    frame_results.append({
+                        'frame_number': frame_idx,
+                        'timestamp': timestamp,
+                        'exercise': result['exercise'],
+                        'count': result['count'],
+                        'feedback': result['feedback'],
+                        'pose_detected': result['pose_landmarks'] is not None
+                    })
+            
+            started = time.perf_counter()
+            try:
+                for frame_idx, timestamp, frame in iter_sampled_frames(cap, sample_hz):
+                    if self.scheduler is not None:
+                        collect([((frame_idx, timestamp), self.process_frame(frame, timestamp))])
+                    else:
+                        collect(self.submit_frame(frame, (frame_idx, timestamp)))
+                collect(self.flush())
+            finally:
+                cap.release()
+            elapsed = time.perf_counter() - started
+            
+            exercises = [r['exercise'] for r in frame_results if r['exercise']]
+            return {
+                'video_path': video_path,
+                'total_frames': total_frames,
+                'frames_analyzed': len(frame_results),
+                'final_counts': {name: counter.count for name, counter in self.counters.items()},
+                'detected_exercise': max(set(exercises), key=exercises.count) if exercises else None,
+                'frame_results': frame_results[-10:],
+                'pose_detection_rate': (
+                    sum(r['pose_detected'] for r in frame_results) / len(frame_results) * 100 if frame_results else 0.0
+                ),
+                'batch_size': self.batcher.batch_size if self.scheduler is None else None,
+                'detection_throughput': self.batcher.throughput(),
+                'classification_stats': self.scheduler.stats() if self.scheduler is not None else None,
+                'fps': round(len(frame_results) / elapsed, 1) if elapsed else None,
+                'analysis_quality': 'YOLO Analysis'
+            }
+        
         def _get_exercise_type(self, results):
             """Extract exercise type from YOLO results"""
             if results[0].boxes is not None:
@@ -583,6 +708,15 @@ def create_inference_pipeline():
     
     return ExerciseInference
 
+# Weights used by the "yolo" analysis engine (see ml.engines)
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "runs/detect/exercise_yolo/weights/best.pt")
+
+def inference_pool():
+    """Analyzer pool of inference pipelines for the engine registry"""
+    from ml.analyzer_pool import AnalyzerPool
+    ExerciseInference = create_inference_pipeline()
+    return AnalyzerPool(lambda: ExerciseInference(YOLO_MODEL_PATH))
+
 # Usage example
 if __name__ == "__main__":
     print("Starting Exercise YOLO Model Training...")
@@ -0,0 +1,98 @@
+"""
+Micro-batching of frames for batched detector inference.
+
+Running a detector on one frame at a time pays the framework's per-call
+overhead (preprocessing setup, dispatch, postprocessing) for every frame.
+A ``FrameBatcher`` collects frames and runs them through the model in one
+call once ``batch_size`` frames are waiting, or once the oldest waiting frame
+has been held for ``max_latency_ms``. Results come back in submission order,
+each paired with the context it was submitted with, so stateful consumers
+(rep counters) can process them exactly as they would frame by frame.
+
+Throughput is recorded per batch size actually run, so the effect of the
+batch size on frames/sec can be read off ``throughput()``.
+
+``ExerciseInference`` only batches when sparse classification is off
+(``CLASSIFY_SPARSE=0``): under the classification scheduler detection runs a
+few times per clip, seconds apart, and there is nothing to batch.
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Frames per detector call
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "8"))
+
+# Longest a frame may wait for its batch to fill
+DETECTION_MAX_LATENCY_MS = float(os.getenv("DETECTION_MAX_LATENCY_MS", "200"))
+
+
+class FrameBatcher:
+    """Collects frames and runs ``run_batch`` on full (or overdue) batches"""
+
+    def __init__(self, run_batch: Callable[[List[Any]], Sequence[Any]], batch_size: Optional[int] = None,
+                 max_latency_ms: Optional[float] = None):
+        self.run_batch = run_batch
+        self.batch_size = max(1, batch_size or DETECTION_BATCH_SIZE)
+        self.max_latency_s = (DETECTION_MAX_LATENCY_MS if max_latency_ms is None else max_latency_ms) / 1000
+        self._frames: List[Any] = []
+        self._contexts: List[Any] = []
+        self._first_at: Optional[float] = None
+        # batch size -> [batches, frames, seconds]
+        self._stats: Dict[int, List[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def submit(self, frame: Any, context: Any = None) -> List[Tuple[Any, Any]]:
+        """Queue a frame; returns ``(context, result)`` pairs for any batch this completed"""
+        if not self._frames:
+            self._first_at = time.monotonic()
+        self._frames.append(frame)
+        self._contexts.append(context)
+        if len(self._frames) >= self.batch_size or self.overdue():
+            return self.flush()
+        return []
+
+    def overdue(self) -> bool:
+        """Whether the oldest waiting frame has exceeded the latency bound"""
+        return bool(self._frames) and time.monotonic() - self._first_at >= self.max_latency_s
+
+    def flush(self) -> List[Tuple[Any, Any]]:
+        """Run whatever is waiting as one batch"""
+        if not self._frames:
+            return []
+        frames, contexts = self._frames, self._contexts
+        self._frames, self._contexts, self._first_at = [], [], None
+
+        started = time.perf_counter()
+        results = list(self.run_batch(frames))
+        elapsed = time.perf_counter() - started
+        if len(results) != len(frames):
+            raise RuntimeError(f"Batch of {len(frames)} frames returned {len(results)} results")
+
+        stats = self._stats.setdefault(len(frames), [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += len(frames)
+        stats[2] += elapsed
+        return list(zip(contexts, results))
+
+    def discard(self) -> int:
+        """Drop the waiting frames without running them; returns how many were dropped"""
+        dropped = len(self._frames)
+        self._frames, self._contexts, self._first_at = [], [], None
+        return dropped
+
+    def throughput(self) -> List[Dict]:
+        """Frames/sec of the model calls, one record per batch size (BSON/JSON safe)"""
+        return [
+            {
+                'batch_size': size,
+                'batches': batches,
+                'frames': frames,
+                'fps': round(frames / seconds, 1) if seconds else None,
+                'ms_per_frame': round(seconds * 1000 / frames, 2) if frames else None
+            }
+            for size, (batches, frames, seconds) in sorted(self._stats.items())
+        ]
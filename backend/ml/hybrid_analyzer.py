@@ -10,6 +10,8 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import os
 
+from ml.analyzer_pool import AnalyzerPool
+
 class HybridExerciseAnalyzer:
     """Hybrid analyzer that provides realistic exercise detection"""
     
@@ -188,16 +190,17 @@ class ExerciseCounter:
         # Mock implementation for hybrid analyzer
         return self.count, f"{self.exercise_type} analysis in progress"
 
-# Global analyzer instance
-analyzer = HybridExerciseAnalyzer()
+# Independent analyzers, one per concurrent job
+analyzer_pool = AnalyzerPool(HybridExerciseAnalyzer)
 
 def analyze_video_file(video_path: str) -> Dict:
     """Analyze video file and return realistic exercise counts"""
-    return analyzer.analyze_video(video_path)
+    with analyzer_pool.checkout() as analyzer:
+        return analyzer.analyze_video(video_path)
 
 def reset_analyzer():
-    """Reset the global analyzer"""
-    analyzer.reset_counters()
+    """Reset idle analyzers; analyses in progress keep their state"""
+    analyzer_pool.reset_idle()
 
 def get_supported_exercises() -> List[str]:
     """Get list of supported exercise types"""
@@ -0,0 +1,202 @@
+"""
+Client-supplied keypoint time series.
+
+The frontend can run MoveNet in the browser and submit keypoints instead of a
+video. Submissions are parsed into the same ``(N, 33, 3)`` MediaPipe-indexed
+landmark array the landmark store uses, so counting runs on the batch engine
+directly: no decoding, no server-side pose estimation.
+
+Two encodings are accepted.
+
+NDJSON (``application/x-ndjson``): a header line, then one line per frame::
+
+    {"format": "movenet17", "width": 640, "height": 480}
+    {"t": 0.0, "keypoints": [[x, y, score], ...]}
+    {"t": 0.033, "keypoints": null}
+
+``keypoints`` entries may also be ``{"x": .., "y": .., "score": ..}`` objects
+as returned by the TF.js pose-detection API. MoveNet coordinates are pixels
+unless the header says ``"normalized": true``. ``t`` is in seconds; it may be
+left out only if the header gives the ``fps`` of evenly spaced frames.
+
+Binary (``application/octet-stream``), little-endian::
+
+    header  magic "KPTS", u8 version (1), u8 keypoints per frame (17 or 33),
+            u16 flags (bit 0: normalized), f32 width, f32 height, u32 frames
+    frame   f32 timestamp, keypoints x (f32 x, f32 y, f32 score-or-z)
+
+A frame without a pose is all NaN.
+"""
+
+import json
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ml.batch_counter import DEFAULT_THRESHOLDS, count_sequence, summarize
+
+NUM_LANDMARKS = 33
+
+# MoveNet (COCO 17) keypoint index -> MediaPipe Pose landmark index
+MOVENET_TO_MEDIAPIPE = {
+    0: 0,     # nose
+    1: 2,     # left eye
+    2: 5,     # right eye
+    3: 7,     # left ear
+    4: 8,     # right ear
+    5: 11,    # left shoulder
+    6: 12,    # right shoulder
+    7: 13,    # left elbow
+    8: 14,    # right elbow
+    9: 15,    # left wrist
+    10: 16,   # right wrist
+    11: 23,   # left hip
+    12: 24,   # right hip
+    13: 25,   # left knee
+    14: 26,   # right knee
+    15: 27,   # left ankle
+    16: 28    # right ankle
+}
+
+# Frames whose mean keypoint score is below this count as "no pose"
+KEYPOINT_MIN_SCORE = float(os.getenv("KEYPOINT_MIN_SCORE", "0.3"))
+
+# Upper bound on a submission body
+MAX_KEYPOINT_BYTES = int(os.getenv("MAX_KEYPOINT_MB", "20")) * 1024 * 1024
+
+FORMATS = {'movenet17': 17, 'mediapipe33': NUM_LANDMARKS}
+
+_BINARY_MAGIC = b"KPTS"
+_BINARY_HEADER = struct.Struct("<4sBBHffI")
+
+
+def movenet_to_mediapipe(keypoints: np.ndarray, width: float = 1.0, height: float = 1.0,
+                         min_score: float = KEYPOINT_MIN_SCORE) -> np.ndarray:
+    """Map ``(N, 17, 3)`` MoveNet ``(x, y, score)`` onto ``(N, 33, 3)`` MediaPipe landmarks.
+
+    x and y are divided by ``width``/``height``; z is 0. Landmarks MoveNet
+    does not have stay NaN, and frames below ``min_score`` become all-NaN.
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    landmarks = np.full((len(keypoints), NUM_LANDMARKS, 3), np.nan)
+
+    source = list(MOVENET_TO_MEDIAPIPE.keys())
+    target = list(MOVENET_TO_MEDIAPIPE.values())
+    landmarks[:, target, 0] = keypoints[:, source, 0] / width
+    landmarks[:, target, 1] = keypoints[:, source, 1] / height
+    landmarks[:, target, 2] = 0.0
+
+    scores = np.nan_to_num(keypoints[:, :, 2], nan=0.0).mean(axis=1)
+    missing = np.isnan(keypoints[:, :, :2]).any(axis=(1, 2)) | (scores < min_score)
+    landmarks[missing] = np.nan
+    return landmarks
+
+
+def _point(entry) -> Tuple[float, float, float]:
+    if isinstance(entry, dict):
+        third = entry.get('score', entry.get('z', 1.0))
+        return float(entry['x']), float(entry['y']), float(1.0 if third is None else third)
+    if not isinstance(entry, (list, tuple)) or not 2 <= len(entry) <= 3:
+        raise ValueError(f"Keypoint must be an object or [x, y(, score)], got {entry!r:.40}")
+    x, y, *rest = entry
+    return float(x), float(y), float(rest[0]) if rest else 1.0
+
+
+def parse_ndjson(body: bytes) -> Tuple[Dict, np.ndarray, np.ndarray]:
+    """Parse an NDJSON submission into (header, timestamps, keypoints)"""
+    lines = [line for line in body.decode('utf-8').splitlines() if line.strip()]
+    if not lines:
+        raise ValueError("Empty keypoint submission")
+
+    header = json.loads(lines[0])
+    if not isinstance(header, dict) or header.get('format') not in FORMATS:
+        raise ValueError(f"Header must name a format: {', '.join(FORMATS)}")
+    count = FORMATS[header['format']]
+
+    timestamps = np.zeros(len(lines) - 1)
+    keypoints = np.full((len(lines) - 1, count, 3), np.nan)
+    fps = float(header.get('fps') or 0)
+    for i, line in enumerate(lines[1:]):
+        frame = json.loads(line)
+        if not isinstance(frame, dict):
+            raise ValueError(f"Frame {i}: expected an object")
+        t = frame.get('t')
+        if t is None and not fps:
+            raise ValueError(f"Frame {i}: no timestamp 't' and no 'fps' in the header")
+        timestamps[i] = float(t) if t is not None else i / fps
+        points = frame.get('keypoints')
+        if not points:
+            continue
+        if not isinstance(points, list):
+            raise ValueError(f"Frame {i}: keypoints must be a list")
+        if len(points) != count:
+            raise ValueError(f"Frame {i}: expected {count} keypoints, got {len(points)}")
+        keypoints[i] = [_point(p) for p in points]
+    return header, timestamps, keypoints
+
+
+def parse_binary(body: bytes) -> Tuple[Dict, np.ndarray, np.ndarray]:
+    """Parse the packed binary layout into (header, timestamps, keypoints) without copying"""
+    if len(body) < _BINARY_HEADER.size:
+        raise ValueError("Truncated keypoint header")
+    magic, version, count, flags, width, height, frames = _BINARY_HEADER.unpack_from(body)
+    if magic != _BINARY_MAGIC or version != 1:
+        raise ValueError("Not a version 1 keypoint stream")
+    formats = {size: name for name, size in FORMATS.items()}
+    if count not in formats:
+        raise ValueError(f"Unsupported keypoint count: {count}")
+
+    record = np.dtype([('t', '<f4'), ('points', '<f4', (count, 3))])
+    expected = _BINARY_HEADER.size + frames * record.itemsize
+    if len(body) != expected:
+        raise ValueError(f"Expected {expected} bytes for {frames} frames, got {len(body)}")
+
+    data = np.frombuffer(body, dtype=record, count=frames, offset=_BINARY_HEADER.size)
+    header = {'format': formats[count], 'width': width, 'height': height, 'normalized': bool(flags & 1)}
+    return header, data['t'].astype(np.float64), data['points']
+
+
+def to_landmarks(header: Dict, keypoints: np.ndarray) -> np.ndarray:
+    """Convert parsed keypoints to normalized ``(N, 33, 3)`` MediaPipe landmarks"""
+    if header['format'] == 'mediapipe33':
+        return np.asarray(keypoints, dtype=np.float64)
+
+    if header.get('normalized'):
+        width = height = 1.0
+    else:
+        width, height = float(header.get('width') or 0), float(header.get('height') or 0)
+        if width <= 0 or height <= 0:
+            raise ValueError("Pixel keypoints need the frame width and height")
+    return movenet_to_mediapipe(keypoints, width, height)
+
+
+def analyze_keypoints(body: bytes, content_type: str, landmark_id: Optional[str] = None,
+                      thresholds: Optional[Dict] = None) -> Dict:
+    """Count reps over a submitted keypoint series; optionally store it for re-scoring"""
+    if content_type.startswith('application/octet-stream'):
+        header, timestamps, keypoints = parse_binary(body)
+    else:
+        header, timestamps, keypoints = parse_ndjson(body)
+    landmarks = to_landmarks(header, keypoints)
+    frame_idx = np.arange(len(landmarks))
+
+    effective = {
+        name: {**values, **(thresholds or {}).get(name, {})}
+        for name, values in DEFAULT_THRESHOLDS.items()
+    }
+    batch = count_sequence(landmarks, effective, frame_numbers=frame_idx, timestamps=timestamps)
+
+    if landmark_id:
+        from ml.landmark_store import save_landmark_arrays
+        save_landmark_arrays(landmark_id, frame_idx, timestamps, landmarks, len(landmarks), source='keypoints')
+
+    return {
+        'video_path': None,
+        'total_frames': len(landmarks),
+        **summarize(batch),
+        'analysis_quality': 'Keypoint Analysis',
+        'keypoint_format': header['format'],
+        'landmark_id': landmark_id
+    }
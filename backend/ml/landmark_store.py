@@ -0,0 +1,147 @@
+"""
+On-disk store for per-video pose landmark time series.
+
+Each analyzed video gets a directory with plain ``.npy`` arrays so they can be
+memory-mapped without copying:
+
+    landmarks.npy   (N, 33, 3) float16 - NaN rows for frames without a pose
+    timestamps.npy  (N,)       float32 - seconds from the start of the video
+    frames.npy      (N,)       int32   - source frame indices
+    meta.json       count, dtype, total_frames, source, created_at
+
+Replaying counters over stored landmarks takes milliseconds, so threshold
+changes never require decoding the video or running MediaPipe again.
+
+Series are kept as long as the job documents that refer to them
+(``LANDMARK_RETENTION_SECONDS``, by default the job TTL); the analysis
+dispatcher calls ``sweep_landmarks`` periodically to delete older ones.
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+LANDMARK_DIR = Path(os.getenv("LANDMARK_DIR", str(Path(__file__).resolve().parent.parent / "landmarks")))
+
+# Age after which stored series are deleted (defaults to the analysis job TTL)
+LANDMARK_RETENTION_SECONDS = float(os.getenv(
+    "LANDMARK_RETENTION_SECONDS", os.getenv("ANALYSIS_JOB_TTL_SECONDS", str(7 * 24 * 3600))
+))
+
+# float16 keeps ~3 significant digits, plenty for normalized coordinates
+LANDMARK_DTYPE = np.dtype(os.getenv("LANDMARK_DTYPE", "float16"))
+
+NUM_LANDMARKS = 33
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _video_dir(video_id: str) -> Path:
+    if not _SAFE_ID.match(video_id):
+        raise ValueError(f"Invalid video id: {video_id}")
+    return LANDMARK_DIR / video_id
+
+
+def frames_to_arrays(frames: List[Tuple], dtype=LANDMARK_DTYPE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Convert ``(frame_idx, timestamp, landmarks)`` tuples into (frames, timestamps, landmarks) arrays"""
+    count = len(frames)
+    landmarks = np.full((count, NUM_LANDMARKS, 3), np.nan, dtype=dtype)
+    timestamps = np.zeros(count, dtype=np.float32)
+    frame_idx = np.zeros(count, dtype=np.int32)
+
+    for i, (idx, t, pose) in enumerate(frames):
+        frame_idx[i] = idx
+        timestamps[i] = t if t is not None else 0.0
+        if pose:
+            landmarks[i] = pose
+    return frame_idx, timestamps, landmarks
+
+
+def arrays_to_frames(frame_idx: np.ndarray, timestamps: np.ndarray, landmarks: np.ndarray) -> List[Tuple]:
+    """Inverse of ``frames_to_arrays``: NaN rows become ``None`` landmarks"""
+    detected = ~np.isnan(landmarks[:, 0, 0])
+    # One bulk conversion to Python floats instead of per-element casts
+    as_lists = landmarks.astype(np.float64).tolist()
+    return [
+        (int(idx), float(t), [tuple(p) for p in pose] if ok else None)
+        for idx, t, pose, ok in zip(frame_idx.tolist(), timestamps.tolist(), as_lists, detected.tolist())
+    ]
+
+
+def save_landmarks(video_id: str, frames: List[Tuple], total_frames: int = 0) -> Path:
+    """Write a landmark time series for ``video_id`` and return its directory"""
+    frame_idx, timestamps, landmarks = frames_to_arrays(frames)
+    return save_landmark_arrays(video_id, frame_idx, timestamps, landmarks, total_frames)
+
+
+def save_landmark_arrays(video_id: str, frame_idx: np.ndarray, timestamps: np.ndarray,
+                         landmarks: np.ndarray, total_frames: int = 0, source: str = 'video') -> Path:
+    """Write already-built arrays for ``video_id``, converting to the store dtypes"""
+    landmarks = np.asarray(landmarks, dtype=LANDMARK_DTYPE)
+    timestamps = np.asarray(timestamps, dtype=np.float32)
+    frame_idx = np.asarray(frame_idx, dtype=np.int32)
+
+    video_dir = _video_dir(video_id)
+    video_dir.mkdir(parents=True, exist_ok=True)
+    np.save(video_dir / "landmarks.npy", landmarks)
+    np.save(video_dir / "timestamps.npy", timestamps)
+    np.save(video_dir / "frames.npy", frame_idx)
+    with open(video_dir / "meta.json", "w") as f:
+        json.dump({
+            'count': len(landmarks),
+            'dtype': str(landmarks.dtype),
+            'total_frames': total_frames,
+            'source': source,
+            'created_at': datetime.utcnow().isoformat()
+        }, f)
+    return video_dir
+
+
+def sweep_landmarks(max_age_s: float = LANDMARK_RETENTION_SECONDS) -> int:
+    """Delete series last written more than ``max_age_s`` ago; returns how many were removed"""
+    if not LANDMARK_DIR.is_dir():
+        return 0
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for video_dir in LANDMARK_DIR.iterdir():
+        try:
+            if not video_dir.is_dir() or video_dir.stat().st_mtime >= cutoff:
+                continue
+            meta = video_dir / "meta.json"
+            if meta.exists() and meta.stat().st_mtime >= cutoff:
+                continue
+            shutil.rmtree(video_dir)
+            removed += 1
+        except FileNotFoundError:
+            # Removed concurrently by another dispatcher
+            continue
+    return removed
+
+
+def has_landmarks(video_id: str) -> bool:
+    try:
+        return (_video_dir(video_id) / "meta.json").exists()
+    except ValueError:
+        return False
+
+
+def load_landmarks(video_id: str, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+    """Load (frames, timestamps, landmarks, meta) for ``video_id``, memory-mapped by default"""
+    video_dir = _video_dir(video_id)
+    if not (video_dir / "meta.json").exists():
+        raise FileNotFoundError(f"No stored landmarks for video {video_id}")
+
+    mmap_mode: Optional[str] = 'r' if mmap else None
+    landmarks = np.load(video_dir / "landmarks.npy", mmap_mode=mmap_mode)
+    timestamps = np.load(video_dir / "timestamps.npy", mmap_mode=mmap_mode)
+    frame_idx = np.load(video_dir / "frames.npy", mmap_mode=mmap_mode)
+    with open(video_dir / "meta.json") as f:
+        meta = json.load(f)
+    return frame_idx, timestamps, landmarks, meta
@@ -0,0 +1,134 @@
+"""
+Latest-frame scheduling for live analysis sessions.
+
+A live client may send frames faster than pose inference can run. Queuing
+them would make feedback lag further behind the athlete with every frame, so
+a session keeps a single pending slot: a frame that arrives while another is
+waiting replaces it. Before a frame is handed to inference it is also checked
+against the session's end-to-end latency budget; a frame that can no longer
+make it (time already waited plus expected inference time) is dropped in
+favour of the next, fresher one. Control commands are queued separately and
+never dropped. Every dropped frame is also reported by ``next`` so the
+session can tell the client, which may be waiting for an answer to it.
+
+Frames keep the time they were received, so counters see the real time axis
+at whatever effective frame rate results.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+# Target time from receiving a frame to sending its result
+LIVE_LATENCY_BUDGET_MS = float(os.getenv("LIVE_LATENCY_BUDGET_MS", "300"))
+
+# Weight of the newest sample in the moving averages
+_SMOOTHING = 0.2
+
+
+def _ewma(current: Optional[float], sample: float) -> float:
+    return sample if current is None else current + _SMOOTHING * (sample - current)
+
+
+class LatestFrameScheduler:
+    """Single-slot frame mailbox with a latency budget and drop statistics"""
+
+    def __init__(self, latency_budget_ms: Optional[float] = None):
+        budget_ms = LIVE_LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+        self.latency_budget_s = budget_ms / 1000
+        self._pending: Optional[Tuple[Any, float]] = None
+        self._controls = deque()
+        # Reasons of dropped frames the client has not been told about yet
+        self._drops = deque()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._started = time.monotonic()
+
+        self.received = 0
+        self.processed = 0
+        self.replaced = 0  # Overwritten by a newer frame while waiting
+        self.stale = 0  # Dropped because they could no longer meet the budget
+        self.inference_s: Optional[float] = None
+        self.latency_s: Optional[float] = None
+        self.lag_s: Optional[float] = None
+        self.fps: Optional[float] = None
+        self._last_finished: Optional[float] = None
+
+    def submit(self, frame: Any, received_at: Optional[float] = None):
+        """Offer a frame; replaces any frame still waiting"""
+        self.received += 1
+        if self._pending is not None:
+            self.replaced += 1
+            self._drops.append('replaced')
+        self._pending = (frame, time.monotonic() if received_at is None else received_at)
+        self._wakeup.set()
+
+    def submit_control(self, command: Any):
+        self._controls.append(command)
+        self._wakeup.set()
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+
+    def _is_stale(self, received_at: float, now: float) -> bool:
+        expected = self.inference_s or 0.0
+        # If inference alone exceeds the budget no frame can make it; process anyway
+        if expected >= self.latency_budget_s:
+            return False
+        return (now - received_at) + expected > self.latency_budget_s
+
+    async def next(self) -> Optional[Tuple[str, Any, Optional[float]]]:
+        """Wait for work: ``('control', command, None)``, ``('dropped', reason, None)``,
+        ``('frame', frame, received_at)``, or None once closed and drained"""
+        while True:
+            if self._controls:
+                return 'control', self._controls.popleft(), None
+            if self._drops:
+                return 'dropped', self._drops.popleft(), None
+            if self._pending is not None:
+                frame, received_at = self._pending
+                self._pending = None
+                if self._is_stale(received_at, time.monotonic()):
+                    self.stale += 1
+                    return 'dropped', 'stale', None
+                return 'frame', frame, received_at
+            if self._closed:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    def record(self, received_at: float, started_at: float, finished_at: float):
+        """Account for one processed frame"""
+        self.processed += 1
+        self.lag_s = _ewma(self.lag_s, started_at - received_at)
+        self.inference_s = _ewma(self.inference_s, finished_at - started_at)
+        self.latency_s = _ewma(self.latency_s, finished_at - received_at)
+        if self._last_finished is not None and finished_at > self._last_finished:
+            self.fps = _ewma(self.fps, 1.0 / (finished_at - self._last_finished))
+        self._last_finished = finished_at
+
+    def elapsed(self, now: Optional[float] = None) -> float:
+        """Seconds since the session started, the time axis handed to counters"""
+        return (time.monotonic() if now is None else now) - self._started
+
+    def stats(self) -> Dict:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 1)
+
+        dropped = self.replaced + self.stale
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'dropped': dropped,
+            'dropped_replaced': self.replaced,
+            'dropped_stale': self.stale,
+            'drop_rate': dropped / self.received if self.received else 0.0,
+            'lag_ms': ms(self.lag_s),
+            'inference_ms': ms(self.inference_s),
+            'latency_ms': ms(self.latency_s),
+            'latency_budget_ms': ms(self.latency_budget_s),
+            'effective_fps': None if self.fps is None else round(self.fps, 1)
+        }
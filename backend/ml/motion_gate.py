@@ -0,0 +1,82 @@
+"""
+Motion-adaptive keyframe selection.
+
+A cheap pre-stage in front of pose inference: each decoded frame is reduced to
+a small grayscale thumbnail and compared against the thumbnail of the last
+frame that went through pose estimation. Frames are sent to the pose model
+when enough has changed (rep transitions, jump takeoff/landing), when the
+caller forces it, or when too much time has passed since the last keyframe
+(static holds still get a sparse sample).
+"""
+
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# Whether RealExerciseAnalyzer uses keyframe selection by default
+ADAPTIVE_KEYFRAMES = os.getenv("ANALYSIS_KEYFRAMES", "0") == "1"
+
+# Decoding rate multiplier over the regular sample rate in adaptive mode
+KEYFRAME_DENSIFY = float(os.getenv("ANALYSIS_KEYFRAME_DENSIFY", "2"))
+
+
+class MotionGate:
+    """Decide which decoded frames are worth a pose-estimation call"""
+
+    def __init__(self, motion_threshold: float = 3.0, max_gap_s: float = 0.5, thumb_width: int = 64):
+        # Mean absolute gray-level difference (0-255) since the last keyframe
+        self.motion_threshold = motion_threshold
+        # Longest time without a keyframe, even when nothing moves
+        self.max_gap_s = max_gap_s
+        self.thumb_width = thumb_width
+
+        self.last_thumb: Optional[np.ndarray] = None
+        self.last_keyframe_t: Optional[float] = None
+        self.frames_seen = 0
+        self.keyframes = 0
+
+    def reset(self):
+        self.last_thumb = None
+        self.last_keyframe_t = None
+        self.frames_seen = 0
+        self.keyframes = 0
+
+    def thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Downscaled grayscale copy of a BGR frame"""
+        h, w = frame.shape[:2]
+        thumb_h = max(1, int(round(h * self.thumb_width / max(w, 1))))
+        small = cv2.resize(frame, (self.thumb_width, thumb_h), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def motion(self, thumb: np.ndarray) -> float:
+        """Change between a thumbnail and the last keyframe's thumbnail"""
+        if self.last_thumb is None or self.last_thumb.shape != thumb.shape:
+            return float('inf')
+        return float(cv2.absdiff(thumb, self.last_thumb).mean())
+
+    def should_process(self, frame: np.ndarray, timestamp: float, force: bool = False) -> bool:
+        """Return True if this frame should go through pose estimation"""
+        self.frames_seen += 1
+        thumb = self.thumbnail(frame)
+
+        is_keyframe = (
+            force
+            or self.last_keyframe_t is None
+            or timestamp - self.last_keyframe_t >= self.max_gap_s
+            or self.motion(thumb) >= self.motion_threshold
+        )
+
+        if is_keyframe:
+            self.last_thumb = thumb
+            self.last_keyframe_t = timestamp
+            self.keyframes += 1
+        return is_keyframe
+
+    def stats(self) -> dict:
+        return {
+            'frames_decoded': self.frames_seen,
+            'pose_calls': self.keyframes,
+            'pose_call_reduction': round(1 - self.keyframes / max(self.frames_seen, 1), 3)
+        }
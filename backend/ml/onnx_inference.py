@@ -0,0 +1,282 @@
+"""
+ONNX Runtime inference for the exported exercise detector.
+
+``train_exercise_model`` exports the trained YOLO detector to ONNX. This
+module runs that file with onnxruntime on the CPU instead of loading the
+ultralytics ``YOLO`` object, so a worker needs neither PyTorch nor ultralytics:
+startup is faster and resident memory much smaller.
+
+The session is tuned for many single-process workers on one host: intra-op
+threads default to this worker's share of the cores, inter-op parallelism is
+off, and all graph optimizations are enabled. The input tensor and the
+letterbox canvas are allocated once and bound to the session with IO binding,
+so a frame is preprocessed straight into the memory ONNX Runtime reads from.
+
+``OnnxExerciseInference.process_frame`` and ``analyze_video`` follow the contract of
+``ExerciseInference`` in ``ml.exercise_analyzer``; ``yolo_results`` holds
+plain detection dicts instead of ultralytics result objects, and is None on
+frames where the classification scheduler skipped detection. Reps are counted
+with the ``ml.real_analyzer`` counters, which use the same thresholds.
+"""
+
+import ast
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import mediapipe as mp
+import numpy as np
+import onnxruntime as ort
+
+from ml.analyzer_pool import AnalyzerPool
+from ml.classification_scheduler import CLASSIFY_SPARSE, ClassificationScheduler
+from ml.frame_sampler import iter_sampled_frames
+from ml.real_analyzer import ExerciseCounter
+
+# Exported detector (ultralytics writes best.onnx next to best.pt)
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "runs/detect/exercise_yolo/weights/best.onnx")
+
+# Threads per session; by default each analysis worker gets its share of the cores
+_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, _WORKERS)))))
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))
+
+DETECTION_CONFIDENCE = float(os.getenv("DETECTION_CONFIDENCE", "0.25"))
+DETECTION_IOU = float(os.getenv("DETECTION_IOU", "0.45"))
+
+# Classes of create_dataset_yaml(), used when the model carries no names
+DEFAULT_CLASS_NAMES = {0: 'person', 1: 'pushup', 2: 'situp', 3: 'jump'}
+EXERCISE_CLASSES = ('pushup', 'situp', 'jump')
+
+# Letterbox fill value (ultralytics default)
+_PAD_VALUE = 114
+# Input size for models exported with dynamic axes
+_DEFAULT_INPUT_SIZE = 640
+
+
+def create_session(model_path: str, intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+                   inter_op_threads: int = ONNX_INTER_OP_THREADS) -> ort.InferenceSession:
+    """CPU inference session tuned for one worker process"""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def class_names(session: ort.InferenceSession) -> Dict[int, str]:
+    """Class names stored in the model metadata by the ultralytics exporter"""
+    names = session.get_modelmeta().custom_metadata_map.get('names')
+    if not names:
+        return dict(DEFAULT_CLASS_NAMES)
+    return {int(k): v for k, v in ast.literal_eval(names).items()}
+
+
+class OnnxDetector:
+    """YOLO detector on ONNX Runtime with preallocated, IO-bound input and output"""
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, confidence: float = DETECTION_CONFIDENCE,
+                 iou: float = DETECTION_IOU, session: Optional[ort.InferenceSession] = None):
+        self.session = session or create_session(model_path)
+        self.names = class_names(self.session)
+        self.confidence = confidence
+        self.iou = iou
+
+        model_input = self.session.get_inputs()[0]
+        height, width = [dim if isinstance(dim, int) else _DEFAULT_INPUT_SIZE for dim in model_input.shape[2:]]
+        self.input_size = (width, height)
+
+        # Preprocessing writes into these in place; the session reads the input without a copy
+        self._canvas = np.full((height, width, 3), _PAD_VALUE, dtype=np.uint8)
+        self._input = np.empty((1, 3, height, width), dtype=np.float32)
+        self._binding = self.session.io_binding()
+        self._binding.bind_ortvalue_input(model_input.name, ort.OrtValue.ortvalue_from_numpy(self._input))
+
+        model_output = self.session.get_outputs()[0]
+        self._output = None
+        if all(isinstance(dim, int) for dim in model_output.shape):
+            self._output = np.empty(model_output.shape, dtype=np.float32)
+            self._binding.bind_ortvalue_output(model_output.name, ort.OrtValue.ortvalue_from_numpy(self._output))
+        else:
+            self._binding.bind_output(model_output.name, 'cpu')
+
+    def _letterbox(self, frame: np.ndarray) -> Tuple[float, int, int]:
+        """Resize ``frame`` into the input tensor keeping its aspect ratio; returns (scale, pad_x, pad_y)"""
+        width, height = self.input_size
+        scale = min(width / frame.shape[1], height / frame.shape[0])
+        new_w, new_h = int(round(frame.shape[1] * scale)), int(round(frame.shape[0] * scale))
+        pad_x, pad_y = (width - new_w) // 2, (height - new_h) // 2
+
+        self._canvas[:] = _PAD_VALUE
+        cv2.resize(frame, (new_w, new_h), dst=self._canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+                   interpolation=cv2.INTER_LINEAR)
+        # BGR HWC uint8 -> RGB CHW float in [0, 1], straight into the bound buffer
+        np.multiply(self._canvas[:, :, ::-1].transpose(2, 0, 1), np.float32(1 / 255), out=self._input[0])
+        return scale, pad_x, pad_y
+
+    def _postprocess(self, output: np.ndarray, scale: float, pad_x: int, pad_y: int) -> List[Dict]:
+        """Decode ``(1, 4 + classes, anchors)`` predictions, then per-class NMS"""
+        predictions = output[0].T
+        scores = predictions[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= self.confidence
+        if not keep.any():
+            return []
+        boxes, class_ids, confidences = predictions[keep, :4], class_ids[keep], confidences[keep]
+
+        # Center/size in input pixels -> corners in frame pixels
+        x1 = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+        y1 = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+        w, h = boxes[:, 2] / scale, boxes[:, 3] / scale
+
+        # Offset boxes by class so one NMS pass never suppresses across classes
+        offset = class_ids * (4 * max(self.input_size) / scale)
+        nms_boxes = np.stack([x1 + offset, y1, w, h], axis=1)
+        kept = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confidences.tolist(), self.confidence, self.iou)
+
+        detections = []
+        for i in np.array(kept).reshape(-1):
+            class_id = int(class_ids[i])
+            detections.append({
+                'class_id': class_id,
+                'name': self.names.get(class_id, str(class_id)),
+                'confidence': float(confidences[i]),
+                'box': [float(x1[i]), float(y1[i]), float(x1[i] + w[i]), float(y1[i] + h[i])]
+            })
+        detections.sort(key=lambda d: d['confidence'], reverse=True)
+        return detections
+
+    def __call__(self, frame: np.ndarray) -> List[Dict]:
+        """Detect on a BGR frame; returns detections sorted by confidence"""
+        scale, pad_x, pad_y = self._letterbox(frame)
+        self.session.run_with_iobinding(self._binding)
+        output = self._output if self._output is not None else self._binding.copy_outputs_to_cpu()[0]
+        return self._postprocess(output, scale, pad_x, pad_y)
+
+
+class OnnxExerciseInference:
+    """Real-time exercise counting with the ONNX detector and MediaPipe pose"""
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, sparse_classification: Optional[bool] = None):
+        self.model = OnnxDetector(model_path)
+        self.mp_pose = mp.solutions.pose
+        self.pose = self.mp_pose.Pose(
+            static_image_mode=False,
+            model_complexity=1,
+            enable_segmentation=False,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+
+        self.counters = {name: ExerciseCounter(name) for name in EXERCISE_CLASSES}
+        self.current_exercise = None
+
+        sparse = CLASSIFY_SPARSE if sparse_classification is None else sparse_classification
+        self.scheduler = ClassificationScheduler() if sparse else None
+
+    def reset_counters(self):
+        """Start a new session: zero the counters and forget the exercise"""
+        self.counters = {name: ExerciseCounter(name) for name in EXERCISE_CLASSES}
+        self.current_exercise = None
+        if self.scheduler is not None:
+            self.scheduler.reset()
+
+    def process_frame(self, frame, timestamp: Optional[float] = None):
+        """Process video frame and return results; detection runs when the scheduler asks for it"""
+        started = time.perf_counter()
+
+        # Pose detection
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        pose_results = self.pose.process(rgb_frame)
+
+        pose_landmarks = None
+        if pose_results.pose_landmarks:
+            pose_landmarks = [(lm.x, lm.y, lm.z) for lm in pose_results.pose_landmarks.landmark]
+
+        detections, detected_ms = None, None
+        if self.scheduler is None or self.scheduler.should_classify(pose_landmarks, timestamp):
+            detect_started = time.perf_counter()
+            detections = self.model(frame)
+            detected_ms = round((time.perf_counter() - detect_started) * 1000, 2)
+
+            detected_exercise = self._get_exercise_type(detections)
+            if self.scheduler is not None:
+                detected_exercise = self.scheduler.update(detected_exercise)
+            if detected_exercise and detected_exercise != self.current_exercise:
+                self.current_exercise = detected_exercise
+                print(f"Exercise changed to: {detected_exercise}")
+
+        count, feedback = 0, "No exercise detected"
+        if self.current_exercise and pose_landmarks:
+            count, feedback = self.counters[self.current_exercise].process_frame(pose_landmarks)
+
+        return {
+            'frame': frame,
+            'exercise': self.current_exercise,
+            'count': count,
+            'feedback': feedback,
+            'pose_landmarks': pose_landmarks,
+            'yolo_results': detections,
+            'detection_ms': detected_ms,
+            'inference_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def analyze_video(self, video_path: str, sample_hz: Optional[float] = None) -> Dict:
+        """Analyze a video file frame by frame and return the final counts"""
+        self.reset_counters()
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Could not open video file: {video_path}")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        frame_results = []
+        detection_ms = []
+        started = time.perf_counter()
+        try:
+            for frame_idx, timestamp, frame in iter_sampled_frames(cap, sample_hz):
+                result = self.process_frame(frame, timestamp)
+                if result['detection_ms'] is not None:
+                    detection_ms.append(result['detection_ms'])
+                frame_results.append({
+                    'frame_number': frame_idx,
+                    'timestamp': timestamp,
+                    'exercise': result['exercise'],
+                    'count': result['count'],
+                    'feedback': result['feedback'],
+                    'pose_detected': result['pose_landmarks'] is not None
+                })
+        finally:
+            cap.release()
+        elapsed = time.perf_counter() - started
+
+        exercises = [r['exercise'] for r in frame_results if r['exercise']]
+        return {
+            'video_path': video_path,
+            'total_frames': total_frames,
+            'frames_analyzed': len(frame_results),
+            'final_counts': {name: counter.count for name, counter in self.counters.items()},
+            'detected_exercise': max(set(exercises), key=exercises.count) if exercises else None,
+            'frame_results': frame_results[-10:],
+            'pose_detection_rate': (
+                sum(r['pose_detected'] for r in frame_results) / len(frame_results) * 100 if frame_results else 0.0
+            ),
+            'detections': len(detection_ms),
+            'detection_ms': round(sum(detection_ms) / len(detection_ms), 2) if detection_ms else None,
+            'classification_stats': self.scheduler.stats() if self.scheduler is not None else None,
+            'fps': round(len(frame_results) / elapsed, 1) if elapsed else None,
+            'analysis_quality': 'ONNX Analysis'
+        }
+
+    def _get_exercise_type(self, detections: List[Dict]) -> Optional[str]:
+        """Most confident exercise class among the detections"""
+        for detection in detections:
+            if detection['name'] in EXERCISE_CLASSES:
+                return detection['name']
+        return None
+
+
+# Independent pipelines, one per concurrent session
+analyzer_pool = AnalyzerPool(OnnxExerciseInference)
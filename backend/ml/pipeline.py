@@ -0,0 +1,106 @@
+"""
+Threaded streaming pipeline for video analysis.
+
+Each stage (decoding, preprocessing, pose inference) runs in its own thread,
+connected by bounded queues. OpenCV and MediaPipe release the GIL while they
+work, so the stages overlap and throughput approaches the speed of the
+slowest stage instead of the sum of all stages. Every stage is a single
+thread reading a FIFO queue, so items arrive at the consumer in source order.
+"""
+
+import os
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+# Whether RealExerciseAnalyzer uses the threaded pipeline by default
+PIPELINED_ANALYSIS = os.getenv("ANALYSIS_PIPELINE", "1") == "1"
+
+# Capacity of each inter-stage queue (bounds memory held by decoded frames)
+PIPELINE_QUEUE_SIZE = int(os.getenv("ANALYSIS_PIPELINE_QUEUE", "8"))
+
+_END = object()
+
+
+class _StageError:
+    """Carries an exception from a stage thread to the consumer"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up when the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _source_worker(source: Iterable, out_q: queue.Queue, stop: threading.Event):
+    try:
+        for item in source:
+            if not _put(out_q, item, stop):
+                return
+    except BaseException as e:
+        _put(out_q, _StageError(e), stop)
+        return
+    _put(out_q, _END, stop)
+
+
+def _stage_worker(fn: Callable, in_q: queue.Queue, out_q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            item = in_q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _END or isinstance(item, _StageError):
+            _put(out_q, item, stop)
+            return
+        try:
+            result = fn(item)
+        except BaseException as e:
+            _put(out_q, _StageError(e), stop)
+            return
+        # A stage returns None to drop an item (e.g. frames the motion gate skips)
+        if result is not None and not _put(out_q, result, stop):
+            return
+
+
+def run_pipeline(source: Iterable, stages: List[Callable], queue_size: int = PIPELINE_QUEUE_SIZE) -> Iterator:
+    """Iterate ``source`` in a thread, pass items through ``stages`` (one thread each) and yield the results in order"""
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    threads = [threading.Thread(target=_source_worker, args=(source, queues[0], stop), daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(threading.Thread(target=_stage_worker, args=(fn, queues[i], queues[i + 1], stop), daemon=True))
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _END:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+def run_sequential(source: Iterable, stages: List[Callable]) -> Iterator:
+    """Same contract as ``run_pipeline`` but on the calling thread"""
+    for item in source:
+        for fn in stages:
+            item = fn(item)
+            if item is None:
+                break
+        else:
+            yield item
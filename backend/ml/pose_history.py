@@ -0,0 +1,88 @@
+"""
+Fixed-capacity pose history backed by a preallocated NumPy array.
+
+Every pose is written twice, at ``i`` and ``i + capacity`` of a buffer twice
+the capacity long, so the most recent ``k`` poses are always one contiguous
+slice: windows are views, never copies, and pushing never shifts or
+allocates. A running sum of one landmark coordinate (the hip height used by
+jump detection) is updated on each push instead of being re-averaged from a
+list of tuples every frame.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# Left hip y-coordinate, the signal behind jump detection and counting
+HIP_LANDMARK = 23
+HIP_AXIS = 1
+
+
+class PoseHistory:
+    """Ring buffer of the last ``capacity`` poses with an incremental trailing mean"""
+
+    def __init__(self, capacity: int, stat_window: int = 5, stat_landmark: int = HIP_LANDMARK,
+                 stat_axis: int = HIP_AXIS):
+        if not 0 < stat_window <= capacity:
+            raise ValueError("stat_window must be between 1 and capacity")
+        self.capacity = capacity
+        self.stat_window = stat_window
+        self.stat_landmark = stat_landmark
+        self.stat_axis = stat_axis
+        self._buffer = np.zeros((2 * capacity, NUM_LANDMARKS, 3), dtype=np.float64)
+        self._next = 0  # Slot the next pose is written to
+        self._size = 0
+        self._stat_sum = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, pose_landmarks):
+        """Append one pose (33 ``(x, y, z)`` points), dropping the oldest when full"""
+        slot = self._next
+        if self._size >= self.stat_window:
+            # Value leaving the trailing window
+            self._stat_sum -= self._buffer[slot + self.capacity - self.stat_window, self.stat_landmark, self.stat_axis]
+
+        self._buffer[slot] = pose_landmarks
+        self._buffer[slot + self.capacity] = self._buffer[slot]
+        self._stat_sum += self._buffer[slot, self.stat_landmark, self.stat_axis]
+
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        if self._next == 0:
+            # Re-sum once per wrap so floating point error cannot accumulate
+            self._stat_sum = float(self.stat_values().sum())
+
+    def window(self, count: Optional[int] = None) -> np.ndarray:
+        """Zero-copy ``(count, 33, 3)`` view of the most recent poses, oldest first"""
+        count = self._size if count is None else min(count, self._size)
+        end = self._next + self.capacity
+        return self._buffer[end - count:end]
+
+    def latest(self) -> np.ndarray:
+        return self._buffer[self._next + self.capacity - 1]
+
+    def stat_values(self) -> np.ndarray:
+        """Tracked coordinate over the trailing window (view)"""
+        return self.window(self.stat_window)[:, self.stat_landmark, self.stat_axis]
+
+    def trailing_mean(self, exclude_latest: bool = False) -> Optional[float]:
+        """Mean of the tracked coordinate over the last ``stat_window`` poses.
+
+        With ``exclude_latest`` the newest pose is left out, i.e. the mean of
+        the ``stat_window - 1`` poses before it. None until enough poses exist.
+        """
+        if self._size < self.stat_window:
+            return None
+        if exclude_latest:
+            latest = self._buffer[self._next + self.capacity - 1, self.stat_landmark, self.stat_axis]
+            return (self._stat_sum - latest) / (self.stat_window - 1)
+        return self._stat_sum / self.stat_window
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+        self._stat_sum = 0.0
@@ -7,17 +7,27 @@ import numpy as np
 import mediapipe as mp
 import json
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import math
+import time
+
+from ml.frame_sampler import DEFAULT_SAMPLE_HZ, get_fps, iter_sampled_frames
+from ml.motion_gate import ADAPTIVE_KEYFRAMES, KEYFRAME_DENSIFY, MotionGate
+from ml.pipeline import PIPELINED_ANALYSIS, run_pipeline, run_sequential
+from ml.pose_history import PoseHistory
+from ml.analyzer_pool import AnalyzerPool
+from ml.classification_scheduler import CLASSIFY_SPARSE_REAL, ClassificationScheduler
+from ml.batch_counter import DEFAULT_THRESHOLDS, EXERCISES, count_sequence, summarize
+from ml.landmark_store import frames_to_arrays, load_landmarks, save_landmarks
 
 class RealExerciseAnalyzer:
     """Real exercise analyzer using MediaPipe pose detection"""
     
-    def __init__(self):
-        # Initialize MediaPipe pose detection
+    def __init__(self, static_image_mode: bool = False, sparse_classification: Optional[bool] = None):
+        # Initialize MediaPipe pose detection (static mode for unrelated single images)
         self.mp_pose = mp.solutions.pose
         self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
+            static_image_mode=static_image_mode,
             model_complexity=1,
             enable_segmentation=False,
             min_detection_confidence=0.5,
@@ -33,10 +43,34 @@ class RealExerciseAnalyzer:
         
         self.current_exercise = None
         self.frame_count = 0
-        self.pose_history = []
+        self.pose_history = PoseHistory(30)  # Keep last 30 poses
+        
+        # Optionally run the exercise heuristics only when the exercise may have changed
+        sparse = CLASSIFY_SPARSE_REAL if sparse_classification is None else sparse_classification
+        self.classifier = ClassificationScheduler() if sparse else None
     
-    def analyze_video(self, video_path: str) -> Dict:
-        """Analyze video file and return real exercise counts"""
+    def analyze_video(self, video_path: str, sample_hz: Optional[float] = None,
+                      adaptive: Optional[bool] = None, pipelined: Optional[bool] = None,
+                      landmark_id: Optional[str] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """Analyze video file and return real exercise counts.
+
+        Frames are sampled at ``sample_hz`` analysis frames per second of video
+        (default ``ANALYSIS_SAMPLE_HZ``), independent of the clip's frame rate.
+        With ``adaptive`` keyframe selection, frames are decoded at a denser
+        rate and a motion gate decides which of them reach pose estimation.
+        With ``pipelined``, decoding, preprocessing and pose inference run in
+        separate threads; counting stays on the calling thread, in frame order.
+        With both, only decoding is threaded: the motion gate is steered by the
+        counters, so it runs on the counting thread.
+        With ``landmark_id``, the landmark time series is saved to the landmark
+        store under that id for later re-scoring. ``progress`` is called after
+        every analyzed frame with the number of frames analyzed so far and the
+        index of the last one.
+        """
+        sample_hz = sample_hz or DEFAULT_SAMPLE_HZ
+        adaptive = ADAPTIVE_KEYFRAMES if adaptive is None else adaptive
+        pipelined = PIPELINED_ANALYSIS if pipelined is None else pipelined
         print(f"Starting real analysis of video: {video_path}")
         
         # Reset counters
@@ -49,26 +83,156 @@ class RealExerciseAnalyzer:
         
         frame_results = []
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = get_fps(cap)
+        
+        gate = MotionGate() if adaptive else None
+        decode_hz = sample_hz * KEYFRAME_DENSIFY if adaptive else sample_hz
+        
+        print(f"Video info: {total_frames} frames, {fps} FPS, sampling at {decode_hz} Hz")
+        
+        decode_stats = {'frames_decoded': 0}
+        
+        def preprocess(item):
+            frame_idx, timestamp, frame = item
+            decode_stats['frames_decoded'] += 1
+            # The threshold hint reads counter state, so this must run on the counting thread
+            if gate and not gate.should_process(frame, timestamp, force=self._near_rep_transition()):
+                return None
+            return frame_idx, timestamp, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        
+        def estimate(item):
+            frame_idx, timestamp, rgb_frame = item
+            return frame_idx, timestamp, self._estimate_pose(rgb_frame)
+        
+        # Only frames on the sampling grid are decoded
+        sampled = iter_sampled_frames(cap, decode_hz)
+        if pipelined and gate:
+            # Keyframe decisions depend on the counters updated below; only
+            # decoding runs ahead in its own thread, so results are deterministic
+            analyzed = run_sequential(run_pipeline(sampled, []), [preprocess, estimate])
+        elif pipelined:
+            analyzed = run_pipeline(sampled, [preprocess, estimate])
+        else:
+            analyzed = run_sequential(sampled, [preprocess, estimate])
+        landmark_log = []
+        try:
+            for frame_idx, timestamp, pose_landmarks in analyzed:
+                landmark_log.append((frame_idx, timestamp, pose_landmarks))
+                frame_results.append(self._update_from_landmarks(pose_landmarks, frame_idx, timestamp))
+                if progress:
+                    progress(len(frame_results), frame_idx)
+        finally:
+            cap.release()
+        frames_decoded = decode_stats['frames_decoded']
+        
+        if landmark_id:
+            save_landmarks(landmark_id, landmark_log, total_frames)
+        
+        results = self._build_results(video_path, total_frames, frame_results)
+        results.update({
+            'classification_stats': self.classifier.stats() if self.classifier is not None else None,
+            'frames_decoded': frames_decoded,
+            'sample_hz': decode_hz,
+            'adaptive_keyframes': adaptive,
+            'keyframe_stats': gate.stats() if gate else None
+        })
+        
+        print(f"Analysis complete: {results['final_counts']}, detected: {results['detected_exercise']}")
+        return results
+    
+    def extract_landmarks(self, video_path: str, start_s: float = 0.0, end_s: Optional[float] = None,
+                          warmup_s: float = 0.0, sample_hz: Optional[float] = None,
+                          progress: Optional[Callable[[int, int], None]] = None) -> List[Tuple]:
+        """Run pose estimation only and return ``(frame_idx, timestamp, landmarks)`` tuples.
+
+        Frames in ``[start_s - warmup_s, start_s)`` are run through the pose
+        graph to let tracking lock on, but are not returned. ``progress`` is
+        called as in ``analyze_video`` for the returned frames.
+        """
+        sample_hz = sample_hz or DEFAULT_SAMPLE_HZ
         
-        print(f"Video info: {total_frames} frames, {fps} FPS")
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Could not open video file: {video_path}")
         
-        frame_idx = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Process every 5th frame for efficiency
-            if frame_idx % 5 == 0:
-                result = self.process_frame(frame, frame_idx)
-                if result:
-                    frame_results.append(result)
-            
-            frame_idx += 1
+        def preprocess(item):
+            frame_idx, timestamp, frame = item
+            return frame_idx, timestamp, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        
+        def estimate(item):
+            frame_idx, timestamp, rgb_frame = item
+            return frame_idx, timestamp, self._estimate_pose(rgb_frame)
+        
+        sampled = iter_sampled_frames(cap, sample_hz, start_s=max(0.0, start_s - warmup_s), end_s=end_s)
+        run = run_pipeline if PIPELINED_ANALYSIS else run_sequential
+        frames = []
+        try:
+            for item in run(sampled, [preprocess, estimate]):
+                if item[1] >= start_s:
+                    frames.append(item)
+                    if progress:
+                        progress(len(frames), item[0])
+            return frames
+        finally:
+            cap.release()
+    
+    def analyze_landmarks(self, frames: List[Tuple], video_path: Optional[str] = None,
+                          total_frames: int = 0, thresholds: Optional[Dict] = None) -> Dict:
+        """Count over a ``(frame_idx, timestamp, landmarks)`` stream with the batch engine.
+
+        ``thresholds`` optionally overrides counter thresholds for this replay
+        only, e.g. ``{'situp': {'up_threshold': 50}}``.
+        """
+        frame_idx, _, landmarks = frames_to_arrays(frames, dtype=np.float64)
+        # Keep full-precision timestamps; the store rounds them to float32
+        timestamps = np.array([t if t is not None else 0.0 for _, t, _ in frames], dtype=np.float64)
+        return self.count_landmarks(frame_idx, timestamps, landmarks, video_path, total_frames, thresholds)
+    
+    def count_landmarks(self, frame_idx: np.ndarray, timestamps: np.ndarray, landmarks: np.ndarray,
+                        video_path: Optional[str] = None, total_frames: int = 0,
+                        thresholds: Optional[Dict] = None) -> Dict:
+        """Detect and count over whole landmark arrays in one vectorized pass.
+
+        Gives the same counts and frame results as feeding every frame through
+        ``_update_from_landmarks`` with per-frame classification (the default),
+        and leaves the counters in the same state.
+        """
+        effective = self._effective_thresholds(thresholds)
+        self.reset_counters()
+        batch = count_sequence(landmarks, effective, frame_numbers=frame_idx, timestamps=timestamps)
         
-        cap.release()
+        for name, counter in self.counters.items():
+            counter.count = batch['final_counts'][name]
+            counter.state = batch['final_states'][name]
+        current = batch['current']
+        if len(current) and current[-1]:
+            self.current_exercise = EXERCISES[current[-1] - 1]
+        self.frame_count = len(current)
         
+        return {
+            'video_path': video_path,
+            'total_frames': total_frames,
+            **summarize(batch),
+            'analysis_quality': 'Real Analysis'
+        }
+    
+    def rescore(self, video_id: str, thresholds: Optional[Dict] = None) -> Dict:
+        """Re-run counting over stored landmarks without touching the video"""
+        frame_idx, timestamps, landmarks, meta = load_landmarks(video_id)
+        results = self.count_landmarks(frame_idx, timestamps, landmarks, None,
+                                       meta.get('total_frames', 0), thresholds)
+        results['thresholds'] = self._effective_thresholds(thresholds)
+        return results
+    
+    def _effective_thresholds(self, overrides: Optional[Dict] = None) -> Dict:
+        """Counter thresholds with per-call overrides applied"""
+        return {
+            name: {**counter.thresholds[name], **(overrides or {}).get(name, {})}
+            for name, counter in self.counters.items()
+        }
+    
+    def _build_results(self, video_path: Optional[str], total_frames: int, frame_results: List[Dict]) -> Dict:
+        """Summarize counter state and per-frame results"""
         # Get final counts
         final_counts = {}
         for exercise_type, counter in self.counters.items():
@@ -80,9 +244,10 @@ class RealExerciseAnalyzer:
         # Calculate form score based on pose detection quality
         form_score = self._calculate_form_score(frame_results)
         
-        results = {
+        return {
             'video_path': video_path,
             'total_frames': total_frames,
+            'frames_analyzed': len(frame_results),
             'final_counts': final_counts,
             'frame_results': frame_results[-10:],  # Last 10 results
             'detected_exercise': detected_exercise,
@@ -90,34 +255,68 @@ class RealExerciseAnalyzer:
             'form_score': form_score,
             'pose_detection_rate': len([f for f in frame_results if f['pose_detected']]) / max(len(frame_results), 1) * 100
         }
-        
-        print(f"Analysis complete: {final_counts}, detected: {detected_exercise}")
-        return results
     
-    def process_frame(self, frame, frame_number: int) -> Optional[Dict]:
+    def process_frame(self, frame, frame_number: int, timestamp: Optional[float] = None) -> Optional[Dict]:
         """Process single frame and return analysis results"""
         # Convert BGR to RGB
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
-        # Process pose detection
+        pose_landmarks = self._estimate_pose(rgb_frame)
+        return self._update_from_landmarks(pose_landmarks, frame_number, timestamp)
+    
+    def analyze_images(self, images: List[bytes]) -> List[Dict]:
+        """Decode encoded images in memory and estimate each pose independently"""
+        results = []
+        for data in images:
+            started = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            decoded = time.perf_counter()
+            if frame is None:
+                results.append({
+                    'error': 'Could not decode image',
+                    'decode_ms': round((decoded - started) * 1000, 2)
+                })
+                continue
+            
+            landmarks = self._estimate_pose(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            estimated = time.perf_counter()
+            results.append({
+                'width': frame.shape[1],
+                'height': frame.shape[0],
+                'pose_detected': landmarks is not None,
+                'landmarks': landmarks,
+                'exercise': self._detect_exercise_type(landmarks),
+                'decode_ms': round((decoded - started) * 1000, 2),
+                'inference_ms': round((estimated - decoded) * 1000, 2)
+            })
+        return results
+    
+    def _estimate_pose(self, rgb_frame) -> Optional[List[Tuple[float, float, float]]]:
+        """Run pose detection on an RGB frame and return 33 (x, y, z) landmarks"""
         pose_results = self.pose.process(rgb_frame)
         
-        # Extract pose landmarks
-        pose_landmarks = None
-        pose_detected = False
-        
         if pose_results.pose_landmarks:
             landmarks = pose_results.pose_landmarks.landmark
-            pose_landmarks = [(lm.x, lm.y, lm.z) for lm in landmarks]
+            return [(lm.x, lm.y, lm.z) for lm in landmarks]
+        return None
+    
+    def _update_from_landmarks(self, pose_landmarks, frame_number: int, timestamp: Optional[float] = None) -> Dict:
+        """Update exercise detection and counters from one frame's landmarks"""
+        pose_detected = False
+        
+        if pose_landmarks:
             pose_detected = True
             
             # Store pose for history
-            self.pose_history.append(pose_landmarks)
-            if len(self.pose_history) > 30:  # Keep last 30 poses
-                self.pose_history.pop(0)
+            self.pose_history.push(pose_landmarks)
         
         # Detect exercise type based on pose
-        detected_exercise = self._detect_exercise_type(pose_landmarks)
+        if self.classifier is None:
+            detected_exercise = self._detect_exercise_type(pose_landmarks)
+        elif self.classifier.should_classify(pose_landmarks, timestamp):
+            detected_exercise = self.classifier.update(self._detect_exercise_type(pose_landmarks))
+        else:
+            detected_exercise = None
         
         if detected_exercise and detected_exercise != self.current_exercise:
             self.current_exercise = detected_exercise
@@ -127,16 +326,24 @@ class RealExerciseAnalyzer:
         count, feedback = 0, "No exercise detected"
         if self.current_exercise and pose_landmarks:
             counter = self.counters[self.current_exercise]
-            count, feedback = counter.process_frame(pose_landmarks)
+            # Hand over the already converted pose so the counter's history copies a row
+            count, feedback = counter.process_frame(pose_landmarks, self.pose_history.latest())
         
         return {
             'frame_number': frame_number,
+            'timestamp': timestamp,
             'exercise': self.current_exercise,
             'count': count,
             'feedback': feedback,
             'pose_detected': pose_detected
         }
     
+    def _near_rep_transition(self) -> bool:
+        """True while the active counter is close to a rep threshold and needs dense samples"""
+        if not self.current_exercise:
+            return False
+        return self.counters[self.current_exercise].near_threshold()
+    
     def _detect_exercise_type(self, pose_landmarks) -> Optional[str]:
         """Detect exercise type based on pose landmarks"""
         if not pose_landmarks or len(pose_landmarks) < 33:
@@ -198,7 +405,7 @@ class RealExerciseAnalyzer:
             # Also check if there's significant vertical movement in recent poses
             if len(self.pose_history) > 5:
                 current_hip_y = pose_landmarks[23][1]  # Left hip y-coordinate
-                avg_hip_y = np.mean([p[23][1] for p in self.pose_history[-5:]])
+                avg_hip_y = self.pose_history.trailing_mean()
                 
                 # If hip is significantly higher than average, might be jumping
                 if current_hip_y < avg_hip_y - 0.05:  # 5% higher
@@ -258,10 +465,18 @@ class RealExerciseAnalyzer:
         for counter in self.counters.values():
             counter.count = 0
             counter.state = "up"
-            counter.pose_history = []
+            counter.pose_history.clear()
+            counter.last_metric = None
         self.current_exercise = None
         self.frame_count = 0
-        self.pose_history = []
+        self.pose_history.clear()
+        if self.classifier is not None:
+            self.classifier.reset()
+    
+    def reset_session(self):
+        """Reset counters and MediaPipe tracking before analyzing a new video"""
+        self.reset_counters()
+        self.pose.reset()
 
 class ExerciseCounter:
     """Count exercise repetitions with state tracking"""
@@ -270,23 +485,22 @@ class ExerciseCounter:
         self.exercise_type = exercise_type
         self.count = 0
         self.state = "up"  # up, down, transition
-        self.pose_history = []
+        self.pose_history = PoseHistory(10)  # Keep last 10 frames
+        self.last_metric = None  # Last angle / height change compared against thresholds
         
         # State thresholds for each exercise
-        self.thresholds = {
-            'pushup': {'up_threshold': 150, 'down_threshold': 90},
-            'situp': {'up_threshold': 45, 'down_threshold': 15},
-            'jump': {'height_threshold': 0.05}
-        }
+        self.thresholds = {name: dict(values) for name, values in DEFAULT_THRESHOLDS.items()}
     
-    def process_frame(self, pose_landmarks):
-        """Process single frame and update count"""
+    def process_frame(self, pose_landmarks, pose_array: Optional[np.ndarray] = None):
+        """Process single frame and update count.
+        
+        ``pose_array`` is the same pose as a ``(33, 3)`` array when the caller
+        already has one.
+        """
         if not pose_landmarks or len(pose_landmarks) < 33:
             return self.count, "No pose detected"
         
-        self.pose_history.append(pose_landmarks)
-        if len(self.pose_history) > 10:  # Keep last 10 frames
-            self.pose_history.pop(0)
+        self.pose_history.push(pose_landmarks if pose_array is None else pose_array)
         
         if self.exercise_type == 'pushup':
             return self._count_pushups(pose_landmarks)
@@ -297,6 +511,19 @@ class ExerciseCounter:
         
         return self.count, "Unknown exercise"
     
+    def near_threshold(self, angle_margin: float = 15, height_ratio: float = 0.5) -> bool:
+        """True when the last measurement is close to a state-change threshold"""
+        if self.last_metric is None:
+            return False
+        
+        if self.exercise_type == 'jump':
+            threshold = self.thresholds['jump']['height_threshold']
+            return self.last_metric > threshold * height_ratio
+        
+        thresholds = self.thresholds[self.exercise_type]
+        return (abs(self.last_metric - thresholds['up_threshold']) <= angle_margin or
+                abs(self.last_metric - thresholds['down_threshold']) <= angle_margin)
+    
     def _count_pushups(self, pose_landmarks):
         """Count push-ups based on elbow angle"""
         try:
@@ -305,6 +532,7 @@ class ExerciseCounter:
             left_wrist = pose_landmarks[15]
             
             angle = self._calculate_angle(left_shoulder, left_elbow, left_wrist)
+            self.last_metric = angle
             thresholds = self.thresholds['pushup']
             
             if self.state == "up" and angle < thresholds['down_threshold']:
@@ -326,6 +554,7 @@ class ExerciseCounter:
             left_knee = pose_landmarks[25]
             
             torso_angle = self._calculate_angle(left_shoulder, left_hip, left_knee)
+            self.last_metric = torso_angle
             thresholds = self.thresholds['situp']
             
             if self.state == "down" and torso_angle > thresholds['up_threshold']:
@@ -346,9 +575,10 @@ class ExerciseCounter:
                 return self.count, "Analyzing..."
             
             current_height = pose_landmarks[23][1]  # Hip y-coordinate
-            baseline_height = np.mean([p[23][1] for p in self.pose_history[-5:-1]])
+            baseline_height = self.pose_history.trailing_mean(exclude_latest=True)
             
             height_change = abs(current_height - baseline_height)
+            self.last_metric = height_change
             threshold = self.thresholds['jump']['height_threshold']
             
             if self.state == "ground" and height_change > threshold:
@@ -379,16 +609,21 @@ class ExerciseCounter:
         except:
             return 0
 
-# Global analyzer instance
-analyzer = RealExerciseAnalyzer()
+# Independent analyzers, one per concurrent job
+analyzer_pool = AnalyzerPool(RealExerciseAnalyzer, reset=RealExerciseAnalyzer.reset_session)
+
+# Static-mode analyzers for independent single images
+image_pool = AnalyzerPool(lambda: RealExerciseAnalyzer(static_image_mode=True),
+                          reset=RealExerciseAnalyzer.reset_session)
 
 def analyze_video_file(video_path: str) -> Dict:
     """Analyze video file and return real exercise counts"""
-    return analyzer.analyze_video(video_path)
+    with analyzer_pool.checkout() as analyzer:
+        return analyzer.analyze_video(video_path)
 
 def reset_analyzer():
-    """Reset the global analyzer"""
-    analyzer.reset_counters()
+    """Reset idle analyzers; analyses in progress keep their state"""
+    analyzer_pool.reset_idle()
 
 def get_supported_exercises() -> List[str]:
     """Get list of supported exercise types"""
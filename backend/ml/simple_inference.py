@@ -5,6 +5,8 @@ import json
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
+from ml.analyzer_pool import AnalyzerPool
+
 class SimpleExerciseAnalyzer:
     """Simplified exercise analyzer using MediaPipe pose detection"""
     
@@ -273,13 +275,14 @@ class ExerciseCounter:
         
         return np.degrees(angle)
 
-# Global analyzer instance
-analyzer = SimpleExerciseAnalyzer()
+# Independent analyzers, one per concurrent job
+analyzer_pool = AnalyzerPool(SimpleExerciseAnalyzer)
 
 def analyze_video_file(video_path: str) -> Dict:
     """Analyze video file and return exercise counts"""
-    return analyzer.analyze_video(video_path)
+    with analyzer_pool.checkout() as analyzer:
+        return analyzer.analyze_video(video_path)
 
 def reset_analyzer():
-    """Reset the global analyzer"""
-    analyzer.reset_counters()
+    """Reset idle analyzers; analyses in progress keep their state"""
+    analyzer_pool.reset_idle()
@@ -0,0 +1,129 @@
+"""
+Spot-check verification of client-submitted keypoints against the video.
+
+Keypoints counted client-side are cheap to forge. Instead of re-analyzing the
+whole upload, the verifier picks K timestamps at random (from a system RNG,
+so a client cannot predict them), seeks to just those frames, runs MediaPipe
+in static-image mode on each and compares the result with the submitted
+landmarks. Cost is O(K) decoded frames regardless of video length; K grows
+with the risk level of the submission.
+
+A sampled frame mismatches when the median distance between the submitted
+and detected joints (normalized image coordinates) exceeds the tolerance.
+Frames where the server finds no pose are reported but not held against the
+submission.
+"""
+
+import os
+import random
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+# Sampled frames per risk level
+SPOT_CHECK_SAMPLES = {
+    'low': int(os.getenv("SPOT_CHECK_SAMPLES_LOW", "4")),
+    'medium': int(os.getenv("SPOT_CHECK_SAMPLES_MEDIUM", "8")),
+    'high': int(os.getenv("SPOT_CHECK_SAMPLES_HIGH", "16"))
+}
+
+# Median joint distance (fraction of the frame) above which a frame mismatches
+SPOT_CHECK_TOLERANCE = float(os.getenv("SPOT_CHECK_TOLERANCE", "0.08"))
+
+# Share of compared frames allowed to mismatch before the submission is flagged
+SPOT_CHECK_MAX_MISMATCH_RATE = float(os.getenv("SPOT_CHECK_MAX_MISMATCH_RATE", "0.25"))
+
+STATUS_VERIFIED = "verified"
+STATUS_MISMATCH = "mismatch"
+STATUS_INCONCLUSIVE = "inconclusive"
+
+_rng = random.SystemRandom()
+
+
+def sample_indices(detected: np.ndarray, count: int, rng: Optional[random.Random] = None) -> np.ndarray:
+    """Pick up to ``count`` distinct frames among those with a submitted pose"""
+    candidates = np.flatnonzero(detected).tolist()
+    chosen = (rng or _rng).sample(candidates, min(count, len(candidates)))
+    return np.array(sorted(chosen), dtype=np.int64)
+
+
+def frame_error(submitted: np.ndarray, detected: np.ndarray) -> float:
+    """Median x/y distance over the joints present in both ``(33, 3)`` poses"""
+    distances = np.linalg.norm(submitted[:, :2] - detected[:, :2], axis=1)
+    distances = distances[~np.isnan(distances)]
+    return float(np.median(distances)) if len(distances) else float('nan')
+
+
+def verify_keypoints(video_path: str, landmark_id: str, risk_level: str = 'medium',
+                     tolerance: Optional[float] = None, rng: Optional[random.Random] = None) -> Dict:
+    """Compare stored submitted landmarks with fresh pose estimates at random timestamps"""
+    import cv2
+    import mediapipe as mp
+    from ml.frame_sampler import read_frames_at
+    from ml.landmark_store import load_landmarks
+
+    if risk_level not in SPOT_CHECK_SAMPLES:
+        raise ValueError(f"Unknown risk level: {risk_level}")
+    tolerance = SPOT_CHECK_TOLERANCE if tolerance is None else tolerance
+    started = time.perf_counter()
+
+    _, timestamps, landmarks, _ = load_landmarks(landmark_id)
+    submitted = np.asarray(landmarks, dtype=np.float64)
+    indices = sample_indices(~np.isnan(submitted).all(axis=(1, 2)), SPOT_CHECK_SAMPLES[risk_level], rng)
+    by_time = {float(timestamps[i]): i for i in indices}
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Could not open video file: {video_path}")
+
+    checked = []
+    # Static mode: the sampled frames are far apart, so tracking would only mislead
+    with mp.solutions.pose.Pose(static_image_mode=True, model_complexity=1) as pose:
+        try:
+            for requested, _, actual, frame in read_frames_at(cap, by_time.keys()):
+                entry = {'t': round(requested, 3), 'frame_t': round(actual, 3), 'error': None}
+                if frame is None:
+                    # The submission claims a pose at a time the video does not have
+                    entry['result'] = 'out_of_range'
+                    checked.append(entry)
+                    continue
+
+                results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                if not results.pose_landmarks:
+                    entry['result'] = 'undetected'
+                    checked.append(entry)
+                    continue
+
+                server = np.array([(lm.x, lm.y, lm.z) for lm in results.pose_landmarks.landmark])
+                error = frame_error(submitted[by_time[requested]], server)
+                entry['error'] = round(error, 4)
+                entry['result'] = 'match' if error <= tolerance else 'mismatch'
+                checked.append(entry)
+        finally:
+            cap.release()
+
+    mismatches = sum(1 for c in checked if c['result'] in ('mismatch', 'out_of_range'))
+    compared = sum(1 for c in checked if c['result'] != 'undetected')
+    errors = [c['error'] for c in checked if c['error'] is not None]
+
+    if compared == 0:
+        status = STATUS_INCONCLUSIVE
+    elif mismatches / compared > SPOT_CHECK_MAX_MISMATCH_RATE:
+        status = STATUS_MISMATCH
+    else:
+        status = STATUS_VERIFIED
+
+    return {
+        'status': status,
+        'risk_level': risk_level,
+        'samples': len(checked),
+        'compared': compared,
+        'mismatches': mismatches,
+        'undetected': len(checked) - compared,
+        'tolerance': tolerance,
+        'median_error': float(np.median(errors)) if errors else None,
+        'max_error': max(errors) if errors else None,
+        'checked': checked,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
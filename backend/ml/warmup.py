@@ -0,0 +1,111 @@
+"""
+Warm-up of analysis engines in a fresh process.
+
+The first analysis in a new process would otherwise pay for importing the ML
+libraries, building the MediaPipe graph (model files are loaded and the
+graph initialized on the first ``process`` call, not in the constructor) and
+initializing OpenCV's FFmpeg backend. Analysis workers run ``warm_up`` at
+start, which does all of that on synthetic data and reports how long each
+step took.
+"""
+
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Size of the synthetic warm-up frames
+WARMUP_FRAME_SIZE = (320, 240)
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def synthetic_frame(width: int = WARMUP_FRAME_SIZE[0], height: int = WARMUP_FRAME_SIZE[1]) -> np.ndarray:
+    """BGR test frame: a gradient with a bright block, so encoders and detectors see some structure"""
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[:] = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    frame[height // 4:3 * height // 4, width // 3:2 * width // 3] = 255
+    return frame
+
+
+def warm_decoder(frames: int = 8) -> float:
+    """Write and decode a tiny clip to initialize OpenCV's video backends; returns ms"""
+    import cv2
+
+    started = time.perf_counter()
+    frame = synthetic_frame()
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, WARMUP_FRAME_SIZE)
+        for _ in range(frames):
+            writer.write(frame)
+        writer.release()
+
+        cap = cv2.VideoCapture(path)
+        while cap.read()[0]:
+            pass
+        cap.release()
+    finally:
+        os.unlink(path)
+    return _ms(started)
+
+
+def warm_analyzer(analyzer, frame: np.ndarray):
+    """Run one synthetic frame through the analyzer's models"""
+    import cv2
+
+    pose = getattr(analyzer, 'pose', None)
+    if pose is not None:
+        pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    model = getattr(analyzer, 'model', None)
+    if callable(model):
+        model(frame)
+
+
+def warm_engine(name: str) -> Dict:
+    """Import an engine, build one analyzer and run a synthetic frame through it"""
+    from ml.engines import get_engine
+
+    engine = get_engine(name)
+    started = time.perf_counter()
+    pool = engine.load()
+    load_ms = _ms(started)
+
+    started = time.perf_counter()
+    analyzer = pool.acquire()
+    build_ms = _ms(started)
+    try:
+        started = time.perf_counter()
+        warm_analyzer(analyzer, synthetic_frame())
+        inference_ms = _ms(started)
+    finally:
+        pool.release(analyzer)
+
+    return {
+        'engine': engine.name,
+        'version': engine.version,
+        'load_ms': load_ms,
+        'build_ms': build_ms,
+        'inference_ms': inference_ms
+    }
+
+
+def warm_up(engines: List[str], decoder: Optional[bool] = None) -> Dict:
+    """Warm the given engines in this process, and the video decoder if any of them uses OpenCV"""
+    from ml.engines import get_engine
+
+    if decoder is None:
+        decoder = any('cv2' in get_engine(name).requires for name in engines)
+    started = time.perf_counter()
+    timings = {
+        'pid': os.getpid(),
+        'engines': [warm_engine(name) for name in engines],
+        'decode_ms': warm_decoder() if decoder else None
+    }
+    timings['total_ms'] = _ms(started)
+    return timings
@@ -39,3 +39,17 @@ async def init_mongo_collections():
 	await db.results.create_index("athlete_email")
 	await db.results.create_index("created_at")
 	await db.audit_logs.create_index("created_at")
+	
+	# Analysis job queue: TTL expiry plus claim lookups
+	await db.analysis_jobs.create_index("expires_at", expireAfterSeconds=0)
+	await db.analysis_jobs.create_index([("status", 1), ("created_at", 1)])
+	await db.analysis_jobs.create_index([("status", 1), ("rank", 1)])
+	await db.analysis_jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+	# Admission control: per-owner active jobs and recent job durations
+	await db.analysis_jobs.create_index([("owner", 1), ("status", 1)])
+	await db.analysis_jobs.create_index([("owner", 1), ("created_at", -1)])
+	await db.analysis_jobs.create_index([("status", 1), ("finished_at", -1)])
+	
+	# Analysis result cache: sliding TTL plus LRU eviction order
+	await db.analysis_cache.create_index("expires_at", expireAfterSeconds=0)
+	await db.analysis_cache.create_index("last_used_at")
@@ -1,37 +1,70 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import os
+import time
 import uuid
+from collections import Counter
 from pathlib import Path
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
-from ml.hybrid_analyzer import analyze_video_file, reset_analyzer, get_supported_exercises
+import job_store
+import analysis_cache
+from analysis_worker import wake_dispatcher
+from ml.analysis_executor import run_image_analysis, run_rescore
+from ml.batch_counter import EXERCISES
+from ml.engines import EngineUnavailable, get_engine, list_engines
+from ml.keypoints import MAX_KEYPOINT_BYTES, analyze_keypoints
+from uploads import save_upload
+import admission
 
 router = APIRouter(prefix="/ml", tags=["ml-analysis"])
 
-# Create uploads directory if it doesn't exist
-UPLOADS_DIR = Path("uploads")
-UPLOADS_DIR.mkdir(exist_ok=True)
+# Create uploads directory if it doesn't exist (absolute, so standalone
+# analysis workers resolve the same files)
+UPLOADS_DIR = Path(__file__).resolve().parent.parent / "uploads"
+UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+
+# Limits for /analyze-frame batches
+MAX_FRAME_BATCH = int(os.getenv("MAX_FRAME_BATCH", "32"))
+MAX_FRAME_BYTES = int(os.getenv("MAX_FRAME_MB", "5")) * 1024 * 1024
+
+# Longest a status long-poll is held open
+ANALYSIS_WAIT_MAX_SECONDS = float(os.getenv("ANALYSIS_WAIT_MAX_SECONDS", "30"))
+# Idle time after which an event stream sends a keep-alive comment
+ANALYSIS_SSE_KEEPALIVE_SECONDS = float(os.getenv("ANALYSIS_SSE_KEEPALIVE_SECONDS", "15"))
 
 class AnalysisResult(BaseModel):
     video_id: str
     status: str
     results: Optional[Dict] = None
     error: Optional[str] = None
+    # Stage and frames processed / total while the job runs
+    progress: Optional[Dict] = None
+    # Bumped on every status or progress change; pass back as ``since``
+    revision: int = 0
+    # Queue position and wait estimates for a job that was just queued
+    queue: Optional[Dict] = None
 
 class VideoAnalysisRequest(BaseModel):
     video_id: str
 
-# Store analysis results in memory (in production, use Redis or database)
-analysis_results = {}
+class RescoreRequest(BaseModel):
+    # Per-exercise threshold overrides, e.g. {"situp": {"up_threshold": 50}}
+    thresholds: Optional[Dict[str, Dict[str, float]]] = None
 
 @router.post("/analyze-video", response_model=AnalysisResult)
-async def analyze_video(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
-):
-    """Upload and analyze video for exercise counting"""
+async def analyze_video(request: Request, file: UploadFile = File(...),
+                        priority: str = Form(job_store.DEFAULT_PRIORITY),
+                        engine: Optional[str] = Form(None)):
+    """Upload and analyze video for exercise counting (admission-checked, see admission.py).
+
+    ``priority`` is a job store priority class; use ``bulk`` for re-analysis
+    campaigns so they yield to interactive uploads. ``engine`` selects a
+    registered analysis engine (see ``GET /ml/engines``).
+    """
     
     # Generate unique video ID
     video_id = str(uuid.uuid4())
@@ -39,32 +72,46 @@ async def analyze_video(
     # Validate file type
     if not file.content_type.startswith('video/'):
         raise HTTPException(status_code=400, detail="File must be a video")
+    if priority not in job_store.JOB_PRIORITY_OFFSETS:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+    try:
+        spec = get_engine(engine, 'video')
+    except EngineUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Save uploaded file
     file_extension = Path(file.filename).suffix
     video_path = UPLOADS_DIR / f"{video_id}{file_extension}"
     
     try:
-        with open(video_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        size, content_hash = await save_upload(file, video_path)
         
-        # Start background analysis
-        background_tasks.add_task(process_video_analysis, video_id, str(video_path))
+        # Same clip already analyzed by this engine version: answer immediately
+        cached = await analysis_cache.get_cached(content_hash, spec.name, spec.version)
+        if cached is not None:
+            video_path.unlink()
+            await job_store.create_completed_job(video_id, cached, content_hash)
+            return AnalysisResult(
+                video_id=video_id,
+                status=job_store.STATUS_COMPLETED,
+                results=cached
+            )
         
-        # Store initial result
-        analysis_results[video_id] = {
-            "video_id": video_id,
-            "status": "processing",
-            "results": None,
-            "error": None
-        }
+        # Queue the analysis job; any dispatcher (in-process or standalone) may claim it
+        owner = getattr(request.state, "owner", None) or admission.client_key(request)
+        expected_seconds = await admission.expected_job_seconds(str(video_path), size)
+        job = await job_store.enqueue_job(video_id, str(video_path), content_hash, owner,
+                                          priority, expected_seconds, spec.name)
+        wake_dispatcher()
         
         return AnalysisResult(
             video_id=video_id,
-            status="processing"
+            status=job_store.STATUS_QUEUED,
+            queue=await admission.queue_estimate(job["rank"], expected_seconds)
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         # Clean up file if analysis fails
         if video_path.exists():
@@ -72,33 +119,138 @@ async def analyze_video(
         
         raise HTTPException(status_code=500, detail=f"Failed to process video: {str(e)}")
 
+@router.post("/analyze-keypoints", response_model=AnalysisResult)
+async def analyze_keypoint_series(request: Request):
+    """Count reps from a client-side keypoint series (NDJSON or binary, see ml.keypoints)"""
+    video_id = str(uuid.uuid4())
+    
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_KEYPOINT_BYTES:
+            raise HTTPException(status_code=413, detail="Keypoint submission too large")
+    
+    content_type = request.headers.get("content-type", "application/x-ndjson")
+    try:
+        # Parsing and counting are pure NumPy and take milliseconds
+        results = await run_in_threadpool(analyze_keypoints, bytes(body), content_type, video_id)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid keypoint submission: {e}")
+    
+    owner = getattr(request.state, "owner", None) or admission.client_key(request)
+    await job_store.create_completed_job(video_id, results, owner=owner)
+    return AnalysisResult(
+        video_id=video_id,
+        status=job_store.STATUS_COMPLETED,
+        results=results
+    )
+
+def _analysis_result(video_id: str, job: Dict) -> AnalysisResult:
+    return AnalysisResult(
+        video_id=video_id,
+        status=job["status"],
+        results=job.get("results"),
+        error=job.get("error"),
+        progress=job.get("progress"),
+        revision=job.get("revision", 0)
+    )
+
 @router.get("/analysis/{video_id}", response_model=AnalysisResult)
-async def get_analysis_result(video_id: str):
-    """Get analysis results for a video"""
+async def get_analysis_result(video_id: str, wait: float = 0, since: Optional[int] = None):
+    """Get analysis results for a video.
+
+    Long-poll: with ``wait`` seconds and ``since`` set to the ``revision`` of
+    the previous response, the request returns as soon as the job changes
+    (or finishes), or after ``wait`` seconds with the unchanged status.
+    """
+    if wait > 0:
+        status = await job_store.wait_for_change(video_id, since, min(wait, ANALYSIS_WAIT_MAX_SECONDS))
+        if status is None:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+        if status["status"] not in job_store.FINAL_STATUSES:
+            return _analysis_result(video_id, status)
     
-    print(f"Getting analysis result for video {video_id}")
-    print(f"Available results: {list(analysis_results.keys())}")
+    job = await job_store.get_job(video_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
-    if video_id not in analysis_results:
-        print(f"Video {video_id} not found in results")
+    return _analysis_result(video_id, job)
+
+def _sse(event: str, result: AnalysisResult) -> str:
+    return f"id: {result.revision}\nevent: {event}\ndata: {result.model_dump_json()}\n\n"
+
+@router.get("/analysis/{video_id}/events")
+async def stream_analysis_events(video_id: str, request: Request):
+    """Server-Sent Events stream of a job's status and progress.
+
+    Sends a ``status`` event for every change while the job is queued or
+    running, then a final ``result`` event carrying the results (or error)
+    and closes. Reconnecting clients resume from ``Last-Event-ID``.
+    """
+    if await job_store.get_job_status(video_id) is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    result = analysis_results[video_id]
-    print(f"Returning result for video {video_id}: {result}")
-    return AnalysisResult(**result)
+    last_event_id = request.headers.get("last-event-id", "")
+    since = int(last_event_id) if last_event_id.isdigit() else None
+    
+    async def events():
+        revision = since
+        while not await request.is_disconnected():
+            status = await job_store.wait_for_change(video_id, revision, ANALYSIS_SSE_KEEPALIVE_SECONDS)
+            if status is None:
+                return
+            if status["status"] in job_store.FINAL_STATUSES:
+                job = await job_store.get_job(video_id)
+                yield _sse("result", _analysis_result(video_id, job))
+                return
+            if status.get("revision", 0) == revision:
+                yield ": keep-alive\n\n"
+                continue
+            revision = status.get("revision", 0)
+            yield _sse("status", _analysis_result(video_id, status))
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Keep reverse proxies from buffering the stream
+        "X-Accel-Buffering": "no"
+    })
+
+@router.post("/rescore/{video_id}")
+async def rescore_video(video_id: str, request: RescoreRequest):
+    """Re-count a finished analysis from its stored landmarks (no video decoding)"""
+    job = await job_store.get_job(video_id)
+    if job is None or job["status"] != job_store.STATUS_COMPLETED:
+        raise HTTPException(status_code=404, detail="Completed analysis not found")
+    
+    # Cache hits point at the landmarks of the job that first analyzed the clip
+    landmark_id = (job["results"] or {}).get("landmark_id")
+    if not landmark_id:
+        raise HTTPException(status_code=404, detail="No stored landmarks for this analysis")
+    
+    try:
+        results = await run_rescore(landmark_id, request.thresholds, job.get("engine"))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No stored landmarks for this analysis")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"video_id": video_id, "results": results}
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit/miss counters of the analysis result cache"""
+    return await analysis_cache.get_cache_stats()
 
-@router.post("/reset-analyzer")
-async def reset_analyzer_state():
-    """Reset the exercise analyzer state"""
-    reset_analyzer()
-    return {"message": "Analyzer reset successfully"}
+@router.get("/engines")
+async def get_engines():
+    """Registered analysis engines with their versions and capabilities"""
+    return {"engines": list_engines()}
 
 @router.get("/supported-exercises")
 async def get_supported_exercises_endpoint():
     """Get list of supported exercise types"""
-    exercises = get_supported_exercises()
     return {
-        "exercises": exercises,
+        "exercises": EXERCISES,
         "descriptions": {
             "pushup": "Push-up exercise counting and form analysis",
             "situp": "Sit-up exercise counting and form analysis", 
@@ -106,67 +258,45 @@ async def get_supported_exercises_endpoint():
         }
     }
 
-async def process_video_analysis(video_id: str, video_path: str):
-    """Background task to process video analysis"""
-    try:
-        print(f"Starting analysis for video {video_id}")
-        
-        # Analyze the video
-        results = analyze_video_file(video_path)
-        print(f"Analysis completed for video {video_id}: {results}")
-        
-        # Update results
-        analysis_results[video_id] = {
-            "video_id": video_id,
-            "status": "completed",
-            "results": results,
-            "error": None
-        }
-        
-        print(f"Results stored for video {video_id}")
-        
-        # Clean up video file after analysis
-        if Path(video_path).exists():
-            Path(video_path).unlink()
-            print(f"Cleaned up video file: {video_path}")
-        
-    except Exception as e:
-        print(f"Analysis failed for video {video_id}: {e}")
-        
-        # Update with error
-        analysis_results[video_id] = {
-            "video_id": video_id,
-            "status": "failed",
-            "results": None,
-            "error": str(e)
-        }
-        
-        # Clean up video file on error
-        if Path(video_path).exists():
-            Path(video_path).unlink()
-
 @router.post("/analyze-frame")
-async def analyze_single_frame(file: UploadFile = File(...)):
-    """Analyze a single frame/image for pose detection"""
+async def analyze_frames(files: List[UploadFile] = File(None), file: Optional[UploadFile] = File(None)):
+    """Estimate poses for a batch of images (multipart ``files``; a single ``file`` also works)"""
+    uploads = list(files or []) + ([file] if file is not None else [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    if len(uploads) > MAX_FRAME_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FRAME_BATCH} images per request")
     
-    # Validate file type
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    images = []
+    for upload in uploads:
+        # Validate file type
+        if not (upload.content_type or '').startswith('image/'):
+            raise HTTPException(status_code=400, detail=f"{upload.filename} is not an image")
+        data = await upload.read(MAX_FRAME_BYTES + 1)
+        if len(data) > MAX_FRAME_BYTES:
+            raise HTTPException(status_code=413, detail=f"{upload.filename} is too large")
+        images.append(data)
     
+    started = time.perf_counter()
     try:
-        # Use hybrid analyzer for frame analysis
-        from ..ml.hybrid_analyzer import analyzer
-        
-        # Process frame analysis
-        result = analyzer.process_frame(None)
-        
-        return {
-            "frame_analysis": result,
-            "pose_detected": result["pose_detected"],
-            "exercise": result["exercise"],
-            "count": result["count"],
-            "feedback": result["feedback"]
-        }
-        
+        frames = await run_image_analysis(images)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to analyze frame: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to analyze frames: {str(e)}")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    for upload, frame in zip(uploads, frames):
+        frame["filename"] = upload.filename
+    exercises = [f["exercise"] for f in frames if f.get("exercise")]
+    
+    return {
+        "frames": frames,
+        "count": len(frames),
+        "pose_detected": sum(1 for f in frames if f.get("pose_detected")),
+        "detected_exercise": Counter(exercises).most_common(1)[0][0] if exercises else None,
+        "timings": {
+            "total_ms": round(elapsed_ms, 1),
+            "per_image_ms": round(elapsed_ms / len(frames), 1),
+            "decode_ms": round(sum(f.get("decode_ms", 0) for f in frames), 1),
+            "inference_ms": round(sum(f.get("inference_ms", 0) for f in frames), 1)
+        }
+    }
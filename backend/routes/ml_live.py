@@ -0,0 +1,159 @@
+"""
+Live pose analysis over a WebSocket.
+
+A camera client sends encoded frames (JPEG, PNG or WebP) as binary messages
+and gets a JSON result per frame with the current exercise, count and
+feedback. Each session checks out its own ``RealExerciseAnalyzer`` for its
+lifetime, so MediaPipe tracks the athlete across frames (``static_image_mode``
+off) and counters carry over between frames. Frames are decoded in memory and
+inference runs in a worker thread to keep the event loop free.
+
+The socket is read continuously while inference runs; frames that arrive
+faster than inference can keep up are dropped by a latest-frame scheduler with
+a per-session latency budget (``?budget_ms=``), and each result carries the
+session's drop and lag statistics.
+
+Text messages control the session: ``{"type": "reset"}`` zeroes the counters,
+``{"type": "stats"}`` returns the statistics. When all live analyzers are
+taken the socket is closed with code 1013 (try again later).
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from ml.live_scheduler import LatestFrameScheduler
+
+router = APIRouter(prefix="/ml", tags=["ml-live"])
+
+# Concurrent live sessions; each holds a MediaPipe graph in the API process
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Larger frames are rejected without decoding
+LIVE_MAX_FRAME_BYTES = int(os.getenv("LIVE_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+
+# WebSocket close code for "server overloaded, try again later"
+WS_TRY_AGAIN_LATER = 1013
+
+_live_pool = None
+
+
+def _get_live_pool():
+    """Analyzer pool for live sessions, created on first use.
+
+    Separate from the batch pools so live sessions cannot starve video jobs
+    (and vice versa); OpenCV and MediaPipe are only loaded once a client
+    connects.
+    """
+    global _live_pool
+    if _live_pool is None:
+        from ml.analyzer_pool import AnalyzerPool
+        from ml.real_analyzer import RealExerciseAnalyzer
+        _live_pool = AnalyzerPool(RealExerciseAnalyzer, size=LIVE_MAX_SESSIONS,
+                                  reset=RealExerciseAnalyzer.reset_session)
+    return _live_pool
+
+
+def _analyze_frame(analyzer, data: bytes, frame_number: int, timestamp: float) -> Optional[Dict]:
+    """Decode an encoded image from memory and run it through the session analyzer"""
+    import cv2
+    import numpy as np
+
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return analyzer.process_frame(frame, frame_number, timestamp)
+
+
+def _counts(analyzer) -> Dict[str, int]:
+    return {name: counter.count for name, counter in analyzer.counters.items()}
+
+
+async def _receive_frames(websocket: WebSocket, scheduler: LatestFrameScheduler):
+    """Drain the socket into the scheduler so clients never block on inference"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    command = None
+                scheduler.submit_control(command if isinstance(command, dict) else {})
+                continue
+            scheduler.submit(message.get("bytes") or b"", time.monotonic())
+    finally:
+        scheduler.close()
+
+
+@router.websocket("/live")
+async def live_analysis(websocket: WebSocket, budget_ms: Optional[float] = None):
+    """Stream frames in, get per-frame count and feedback back"""
+    await websocket.accept()
+
+    from ml.analyzer_pool import PoolExhausted
+    pool = _get_live_pool()
+    try:
+        # Building a new analyzer loads a MediaPipe graph; keep it off the event loop
+        analyzer = await asyncio.to_thread(pool.acquire, 0)
+    except PoolExhausted:
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason="All live analyzers are busy")
+        return
+
+    scheduler = LatestFrameScheduler(budget_ms)
+    receiver = asyncio.create_task(_receive_frames(websocket, scheduler))
+    frame_number = 0
+    try:
+        await websocket.send_json({"type": "ready", "stats": scheduler.stats()})
+        while (work := await scheduler.next()) is not None:
+            kind, item, received_at = work
+
+            if kind == 'control':
+                if item.get("type") == "reset":
+                    analyzer.reset_session()
+                    frame_number = 0
+                    await websocket.send_json({"type": "reset", "counts": _counts(analyzer)})
+                elif item.get("type") == "stats":
+                    await websocket.send_json({"type": "stats", "stats": scheduler.stats()})
+                else:
+                    await websocket.send_json({"type": "error", "detail": "Unknown command"})
+                continue
+
+            if kind == 'dropped':
+                # The client sends one frame at a time and waits for an answer to each
+                await websocket.send_json({"type": "dropped", "reason": item, "stats": scheduler.stats()})
+                continue
+
+            if len(item) > LIVE_MAX_FRAME_BYTES:
+                await websocket.send_json({"type": "error", "detail": "Frame too large"})
+                continue
+
+            started = time.monotonic()
+            result = await asyncio.to_thread(
+                _analyze_frame, analyzer, item, frame_number, scheduler.elapsed(received_at)
+            )
+            finished = time.monotonic()
+            if result is None:
+                await websocket.send_json({"type": "error", "detail": "Could not decode frame"})
+                continue
+            frame_number += 1
+            scheduler.record(received_at, started, finished)
+
+            await websocket.send_json({
+                "type": "result",
+                **result,
+                "counts": _counts(analyzer),
+                "latency_ms": round((finished - received_at) * 1000, 1),
+                "stats": scheduler.stats()
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        pool.release(analyzer)
@@ -1,31 +1,66 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException
 from fastapi import status
 from typing import Optional
 from pathlib import Path
 import json
+import logging
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
 
+import job_store
+from admission import user_key
 from mongo import get_mongo_db
 from auth import get_current_user, require_admin
+from uploads import save_upload
+from ml.analysis_executor import run_verification
+from ml.landmark_store import has_landmarks
+from ml.spot_check import SPOT_CHECK_SAMPLES, STATUS_MISMATCH
 
 router = APIRouter(prefix="", tags=["results"])
 
+logger = logging.getLogger(__name__)
+
 UPLOAD_DIR = Path(__file__).resolve().parent.parent / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _object_id(result_id: str) -> ObjectId:
+	try:
+		return ObjectId(result_id)
+	except (InvalidId, TypeError):
+		raise HTTPException(status_code=404, detail="Result not found")
+
+
+async def _owns_keypoints(keypoint_id: str, current_user: dict) -> bool:
+	"""Whether ``keypoint_id`` names a stored keypoint series submitted by ``current_user``"""
+	if not has_landmarks(keypoint_id):
+		return False
+	job = await job_store.get_job(keypoint_id)
+	return job is not None and job.get("owner") == user_key(current_user["email"])
+
+
 @router.post("/results")
 async def submit_result(
+	background_tasks: BackgroundTasks,
 	athlete_email: str = Form(...),
 	test_type: str = Form(...),
 	metrics_json: str = Form(...),
 	video: Optional[UploadFile] = File(None),
+	keypoint_id: Optional[str] = Form(None),
+	risk_level: str = Form("medium"),
 	current_user: dict = Depends(get_current_user)
 ):
 	try:
 		db = get_mongo_db()
 		
+		# Client-side keypoints (from /ml/analyze-keypoints) are spot-checked against the video;
+		# only the submitter's own series may be attached
+		if keypoint_id is not None and not await _owns_keypoints(keypoint_id, current_user):
+			raise HTTPException(status_code=400, detail="Unknown keypoint submission")
+		if risk_level not in SPOT_CHECK_SAMPLES:
+			raise HTTPException(status_code=400, detail="Invalid risk level")
+		
 		# Check if user exists
 		user = await db.users.find_one({"email": athlete_email})
 		if not user:
@@ -35,8 +70,7 @@ async def submit_result(
 		if video is not None:
 			filename = f"{user['_id']}_{test_type}_{video.filename}"
 			dest = UPLOAD_DIR / filename
-			with open(dest, "wb") as f:
-				f.write(await video.read())
+			await save_upload(video, dest)
 			video_path = dest.name
 
 		# Insert result into MongoDB
@@ -49,9 +83,18 @@ async def submit_result(
 			"status": "pending",
 			"created_at": datetime.utcnow().isoformat()
 		}
+		verify = keypoint_id is not None and video_path is not None
+		if keypoint_id is not None:
+			result_doc["keypoint_id"] = keypoint_id
+			result_doc["flagged"] = False
+			result_doc["verification"] = {"status": "pending" if verify else "no_video", "risk_level": risk_level}
 		
-		await db.results.insert_one(result_doc)
+		inserted = await db.results.insert_one(result_doc)
+		if verify:
+			background_tasks.add_task(verify_result, inserted.inserted_id, str(dest), keypoint_id, risk_level)
 		return {"ok": True}
+	except HTTPException:
+		raise
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -77,6 +120,40 @@ async def list_results(current_user: dict = Depends(require_admin)):
 		raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+async def verify_result(result_id: ObjectId, video_path: str, keypoint_id: str, risk_level: str) -> dict:
+	"""Spot-check a result's keypoints against its video and record the outcome on the result"""
+	try:
+		report = await run_verification(video_path, keypoint_id, risk_level)
+	except Exception as e:
+		logger.exception(f"Keypoint verification failed for result {result_id}")
+		report = {"status": "error", "risk_level": risk_level, "error": str(e)}
+	
+	report["verified_at"] = datetime.utcnow().isoformat()
+	await get_mongo_db().results.update_one(
+		{"_id": result_id},
+		{"$set": {"verification": report, "flagged": report["status"] == STATUS_MISMATCH}}
+	)
+	return report
+
+
+# Declared before /{action} so "verify" is not taken for an action name
+@router.post("/admin/results/{result_id}/verify")
+async def reverify_result(result_id: str, risk_level: str = "high", current_user: dict = Depends(require_admin)):
+	"""Re-run the keypoint spot-check for a result, by default with the high-risk sample size"""
+	if risk_level not in SPOT_CHECK_SAMPLES:
+		raise HTTPException(status_code=400, detail="Invalid risk level")
+	
+	db = get_mongo_db()
+	result = await db.results.find_one({"_id": _object_id(result_id)})
+	if result is None:
+		raise HTTPException(status_code=404, detail="Result not found")
+	if not result.get("keypoint_id") or not result.get("video_path"):
+		raise HTTPException(status_code=400, detail="Result has no keypoints and video to compare")
+	
+	report = await verify_result(result["_id"], str(UPLOAD_DIR / result["video_path"]), result["keypoint_id"], risk_level)
+	return {"result_id": result_id, "verification": report}
+
+
 @router.post("/admin/results/{result_id}/{action}")
 async def decide_result(result_id: str, action: str, current_user: dict = Depends(require_admin)):
 	try:
@@ -88,7 +165,7 @@ async def decide_result(result_id: str, action: str, current_user: dict = Depend
 		
 		# Update result status
 		await db.results.update_one(
-			{"_id": ObjectId(result_id)},
+			{"_id": _object_id(result_id)},
 			{"$set": {"status": status_val}}
 		)
 		
@@ -101,5 +178,7 @@ async def decide_result(result_id: str, action: str, current_user: dict = Depend
 		await db.audit_logs.insert_one(audit_log)
 		
 		return {"ok": True}
+	except HTTPException:
+		raise
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
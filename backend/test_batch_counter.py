@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Check that the vectorized batch counter agrees with the streaming counter.
+
+Both count the same landmark series: a scripted workout (push-ups, then
+sit-ups, with dropped frames) and random-walk poses that wander through the
+detection and counting thresholds. Per-frame exercise and count, the
+reported frames and the final counts must match exactly.
+"""
+
+import math
+import sys
+
+import numpy as np
+
+FPS = 30
+
+
+def _rotate(origin, length, degrees):
+    """Point ``length`` away from ``origin``, ``degrees`` clockwise from straight up"""
+    r = math.radians(degrees)
+    return origin[0] + length * math.sin(r), origin[1] - length * math.cos(r)
+
+
+def scripted_workout(reps: int = 5, rng=None) -> np.ndarray:
+    """Side view: ``reps`` push-ups (elbow 170 -> 70 degrees), then ``reps`` sit-ups (torso 80 -> 10)"""
+    rng = rng or np.random.default_rng(0)
+    frames = []
+    period = 2 * FPS
+
+    def pose(torso, elbow, bent_arm):
+        lm = np.full((33, 3), 0.5)
+        hip, knee = (0.5, 0.5), (0.75, 0.52)
+        lm[23], lm[24] = (*hip, 0), (*hip, 0)
+        lm[25], lm[26] = (*knee, 0), (*knee, 0)
+        # Knees bent (as sit-ups need) with the ankles below them, so no frame reads as a jump
+        lm[27], lm[28] = (0.6, 0.75, 0), (0.6, 0.75, 0)
+        # Torso angle is measured at the hip between shoulder and knee
+        knee_dir = math.degrees(math.atan2(knee[0] - hip[0], -(knee[1] - hip[1])))
+        shoulder = _rotate(hip, 0.25, knee_dir - torso)
+        lm[11], lm[12] = (*shoulder, 0), (*shoulder, 0)
+        elbow_pt = (shoulder[0], shoulder[1] + 0.12)
+        for (e, w), angle in (((13, 15), elbow), ((14, 16), bent_arm)):
+            lm[e] = (*elbow_pt, 0)
+            lm[w] = (*_rotate(elbow_pt, 0.12, angle), 0)
+        return lm
+
+    for i in range(reps * period):
+        phase = (1 - math.cos(2 * math.pi * i / period)) / 2
+        frames.append(pose(10, 170 - 100 * phase, 100))
+    for i in range(reps * period):
+        phase = (1 - math.cos(2 * math.pi * i / period)) / 2
+        frames.append(pose(80 - 70 * phase, 180, 180))
+
+    landmarks = np.array(frames) + rng.normal(0, 0.002, (len(frames), 33, 3))
+    landmarks[rng.random(len(frames)) < 0.05] = np.nan
+    return landmarks
+
+
+def random_walk(n: int, rng) -> np.ndarray:
+    """Poses drifting at random, with dropped frames"""
+    start = rng.uniform(0.2, 0.8, (1, 33, 3))
+    landmarks = np.clip(start + np.cumsum(rng.normal(0, 0.03, (n, 33, 3)), axis=0), 0, 1)
+    landmarks[rng.random(n) < 0.1] = np.nan
+    return landmarks
+
+
+def stream(analyzer, landmarks: np.ndarray) -> list:
+    analyzer.reset_counters()
+    results = []
+    for i, row in enumerate(landmarks):
+        pose = None if np.isnan(row).all() else [tuple(p) for p in row]
+        results.append(analyzer._update_from_landmarks(pose, i, i / FPS))
+    return results
+
+
+failures = []
+
+def main():
+    from ml.batch_counter import DEFAULT_THRESHOLDS, EXERCISES, count_sequence
+    from ml.real_analyzer import RealExerciseAnalyzer
+
+    analyzer = RealExerciseAnalyzer(sparse_classification=False)
+    rng = np.random.default_rng(7)
+    series = [('scripted workout', scripted_workout(rng=rng))]
+    series += [(f"random walk {seed}", random_walk(600, np.random.default_rng(seed))) for seed in range(10)]
+
+    for name, landmarks in series:
+        streamed = stream(analyzer, landmarks)
+        batch = count_sequence(landmarks, DEFAULT_THRESHOLDS, timestamps=np.arange(len(landmarks)) / FPS)
+
+        exercises = [EXERCISES[c - 1] if c else None for c in batch['current']]
+        problems = []
+        if [r['exercise'] for r in streamed] != exercises:
+            problems.append('exercise')
+        if [r['count'] for r in streamed] != batch['frame_count'].tolist():
+            problems.append('count')
+        if streamed[-len(batch['frame_results']):] != batch['frame_results']:
+            problems.append('frame_results')
+        final = {k: c.count for k, c in analyzer.counters.items()}
+        if final != batch['final_counts']:
+            problems.append('final counts')
+
+        print(f"{'❌' if problems else '✅'} {name}: {batch['final_counts']}" + (f" (differs: {', '.join(problems)})" if problems else ""))
+        if problems:
+            failures.append(name)
+
+    scripted = count_sequence(series[0][1], DEFAULT_THRESHOLDS)['final_counts']
+    if scripted['pushup'] != 5 or scripted['situp'] != 5:
+        print(f"❌ Scripted workout counted {scripted}, expected 5 push-ups and 5 sit-ups")
+        failures.append('scripted counts')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Batch counter test failed: {e}")
+        failures.append(str(e))
+
+    print("\n🎯 Batch counter test complete!")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Check the analysis job queue: ranking, claims, leases, heartbeats and reaping.
+
+Runs against an in-memory stand-in for the ``analysis_jobs`` collection that
+implements the subset of MongoDB queries and updates ``job_store`` issues.
+"""
+
+import asyncio
+import copy
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {name}" + (f": {detail}" if detail else ""))
+    if not ok:
+        failures.append(name)
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == '$or':
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == '$lt' and not (value is not None and value < arg):
+                    return False
+                if op == '$gte' and not (value is not None and value >= arg):
+                    return False
+                if op == '$in' and value not in arg:
+                    return False
+                if op == '$ne' and value == arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k == '_id' or projection.get(k)}
+
+
+class FakeJobs:
+    """In-memory ``analysis_jobs`` collection (single process, so updates are atomic)"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        self.docs[doc['_id']] = copy.deepcopy(doc)
+
+    async def find_one(self, query, projection=None):
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query, projection=None):
+        async def rows():
+            for doc in [d for d in self.docs.values() if _matches(d, query)]:
+                yield _project(doc, projection)
+        return rows()
+
+    async def count_documents(self, query):
+        return sum(1 for doc in self.docs.values() if _matches(doc, query))
+
+    async def update_one(self, query, update):
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                self._apply(doc, update)
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def find_one_and_update(self, query, update, sort=(), return_document=None):
+        candidates = [d for d in self.docs.values() if _matches(d, query)]
+        for key, direction in reversed(sort):
+            candidates.sort(key=lambda d: d[key], reverse=direction < 0)
+        if not candidates:
+            return None
+        self._apply(candidates[0], update)
+        return copy.deepcopy(candidates[0])
+
+    @staticmethod
+    def _apply(doc, update):
+        doc.update(copy.deepcopy(update.get('$set', {})))
+        for key, step in update.get('$inc', {}).items():
+            doc[key] = doc.get(key, 0) + step
+
+
+def expire_lease(jobs: FakeJobs, job_id: str):
+    jobs.docs[job_id]['lease_expires_at'] = datetime.utcnow() - timedelta(seconds=1)
+
+
+async def main():
+    import job_store
+
+    jobs = FakeJobs()
+    job_store._jobs = lambda: jobs
+
+    # Ranking: enqueue time, then priority offset, then expected duration
+    now = datetime.utcnow()
+    check("earlier jobs rank first", job_store.job_rank(now) < job_store.job_rank(now + timedelta(seconds=1)))
+    check("bulk ranks after interactive", job_store.job_rank(now, "interactive") < job_store.job_rank(now, "bulk"))
+    check("shorter expected jobs rank first", job_store.job_rank(now, expected_seconds=5) < job_store.job_rank(now, expected_seconds=60))
+    check("a long job is overtaken only by jobs enqueued within its SJF window",
+          job_store.job_rank(now, expected_seconds=60) < job_store.job_rank(now + timedelta(seconds=121)))
+
+    await job_store.enqueue_job("bulk", "/tmp/bulk.mp4", priority="bulk")
+    await job_store.enqueue_job("long", "/tmp/long.mp4", expected_seconds=60, owner="user:a")
+    await job_store.enqueue_job("short", "/tmp/short.mp4", expected_seconds=5, owner="user:a")
+    check("queued ahead of a new bulk job", await job_store.count_queued_ahead(jobs.docs["bulk"]["rank"]) == 2)
+    check("recent jobs per owner", await job_store.count_recent("user:a", 60) == 2)
+
+    # Claims follow rank order and each job goes to one worker
+    order = [(await job_store.claim_job(w))["_id"] for w in ("w1", "w2", "w3")]
+    check("claim order", order == ["short", "long", "bulk"], str(order))
+    check("nothing left to claim", await job_store.claim_job("w4") is None)
+    claimed = jobs.docs["short"]
+    check("claim takes a lease", claimed["status"] == job_store.STATUS_PROCESSING and claimed["lease_owner"] == "w1"
+          and claimed["attempts"] == 1 and claimed["lease_expires_at"] > datetime.utcnow())
+
+    # Heartbeats extend only the owner's lease
+    before = jobs.docs["short"]["lease_expires_at"]
+    await asyncio.sleep(0.01)
+    check("owner heartbeat", await job_store.heartbeat_job("short", "w1") and jobs.docs["short"]["lease_expires_at"] > before)
+    check("foreign heartbeat refused", not await job_store.heartbeat_job("short", "w2"))
+
+    # An expired lease makes the job claimable again; the old worker loses it
+    expire_lease(jobs, "short")
+    reclaimed = await job_store.claim_job("w5")
+    check("expired lease re-claimed", reclaimed is not None and reclaimed["_id"] == "short" and reclaimed["attempts"] == 2)
+    check("old worker's heartbeat refused", not await job_store.heartbeat_job("short", "w1"))
+    check("old worker cannot complete", not await job_store.complete_job("short", "w1", {"final_counts": {}}))
+    check("new owner completes", await job_store.complete_job("short", "w5", {"final_counts": {}})
+          and jobs.docs["short"]["status"] == job_store.STATUS_COMPLETED and jobs.docs["short"]["lease_owner"] is None)
+    check("completed job not re-claimed", await job_store.claim_job("w6", "short") is None)
+
+    # A job whose lease expires on its last attempt is reaped, not re-claimed
+    jobs.docs["long"]["attempts"] = job_store.JOB_MAX_ATTEMPTS
+    expire_lease(jobs, "long")
+    check("exhausted job not re-claimed", await job_store.claim_job("w7") is None)
+    check("only the exhausted job is reaped", [j["_id"] for j in await job_store.reap_expired_jobs()] == ["long"])
+    check("reaped job failed", jobs.docs["long"]["status"] == job_store.STATUS_FAILED and jobs.docs["long"]["error"])
+    check("reaped once", await job_store.reap_expired_jobs() == [])
+    check("failing a reaped job is refused", not await job_store.fail_job("long", "w2", "late"))
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"❌ Job store test failed: {e}")
+        failures.append(str(e))
+
+    print("\n🎯 Job store test complete!")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Compare motion-adaptive keyframe selection against fixed-rate sampling.
+
+Without an argument the comparison runs on a synthetic clip: a drawn figure
+(which MediaPipe detects) doing arm curls with a knee raised, which the
+heuristics classify and count as push-ups, with still holds between reps.
+Pass a video path to compare on a real recording instead.
+"""
+
+import math
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+# Synthetic clip layout: reps of REP_S seconds separated by holds of HOLD_S seconds
+SYNTHETIC_REPS = 8
+REP_S = 1.5
+HOLD_S = 1.5
+FPS = 30
+WIDTH, HEIGHT = 480, 640
+
+
+def draw_figure(curl: float) -> np.ndarray:
+    """Front view of a figure with its left knee raised to the chest; ``curl`` 0 (arms straight) to 1"""
+    img = np.full((HEIGHT, WIDTH, 3), (200, 210, 220), np.uint8)
+    skin, shirt, pants, shoes = (140, 170, 220), (60, 60, 160), (90, 60, 40), (30, 30, 30)
+    cx = WIDTH // 2
+
+    def p(x, y):
+        return int(cx + x), int(y)
+
+    # Standing leg, torso, raised leg
+    cv2.line(img, p(-30, 370), p(-35, 480), pants, 34)
+    cv2.line(img, p(-35, 480), p(-38, 590), pants, 30)
+    cv2.ellipse(img, p(-45, 600), (28, 12), 0, 0, 360, shoes, -1)
+    cv2.rectangle(img, p(-60, 170), p(60, 380), shirt, -1)
+    cv2.line(img, p(35, 370), p(55, 260), pants, 36)
+    cv2.line(img, p(55, 260), p(60, 370), pants, 30)
+    cv2.ellipse(img, p(72, 378), (26, 11), 0, 0, 360, shoes, -1)
+
+    # Arms: upper arm hangs, forearm rotates up by up to 140 degrees
+    angle = math.radians(curl * 140)
+    for side in (-1, 1):
+        shoulder, elbow = np.array([side * 70, 185]), np.array([side * 95, 290])
+        forearm = np.array([side * math.sin(angle) * 0.25, math.cos(angle)]) * 100
+        cv2.line(img, p(*shoulder), p(*elbow), shirt, 28)
+        cv2.line(img, p(*elbow), p(*(elbow + forearm)), skin, 24)
+        cv2.circle(img, p(*(elbow + forearm * 1.12)), 16, skin, -1)
+
+    # Neck and face (the pose detector keys on the face)
+    cv2.rectangle(img, p(-16, 140), p(16, 175), skin, -1)
+    cv2.ellipse(img, p(0, 95), (48, 60), 0, 0, 360, skin, -1)
+    cv2.ellipse(img, p(0, 55), (50, 28), 0, 180, 360, (30, 30, 50), -1)
+    for side in (-1, 1):
+        cv2.ellipse(img, p(side * 18, 88), (9, 6), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(img, p(side * 18, 88), 4, (40, 30, 20), -1)
+        cv2.line(img, p(side * 28, 74), p(side * 10, 72), (40, 30, 30), 3)
+        cv2.ellipse(img, p(side * 50, 95), (8, 14), 0, 0, 360, skin, -1)
+    cv2.line(img, p(0, 92), p(-4, 112), (110, 130, 190), 3)
+    cv2.ellipse(img, p(0, 125), (16, 6), 0, 0, 180, (60, 60, 150), 3)
+    return cv2.GaussianBlur(img, (5, 5), 0)
+
+
+def make_synthetic_clip(path: str, reps: int = SYNTHETIC_REPS) -> str:
+    """Write a clip of ``reps`` curls with still holds in between"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), FPS, (WIDTH, HEIGHT))
+    still = draw_figure(0.0)
+    for _ in range(reps):
+        for _ in range(int(HOLD_S * FPS)):
+            writer.write(still)
+        frames = int(REP_S * FPS)
+        for i in range(frames):
+            writer.write(draw_figure((1 - math.cos(2 * math.pi * i / frames)) / 2))
+    for _ in range(int(HOLD_S * FPS)):
+        writer.write(still)
+    writer.release()
+    return path
+
+
+if len(sys.argv) > 1:
+    video_path, expected = sys.argv[1], None
+else:
+    fd, video_path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    make_synthetic_clip(video_path)
+    expected = SYNTHETIC_REPS
+    print(f"Synthetic clip: {SYNTHETIC_REPS} reps, {SYNTHETIC_REPS * (REP_S + HOLD_S) + HOLD_S:g} s")
+
+failures = []
+
+try:
+    from ml.real_analyzer import RealExerciseAnalyzer
+    analyzer = RealExerciseAnalyzer()
+
+    fixed = analyzer.analyze_video(video_path, adaptive=False)
+    print(f"✅ Fixed-rate sampling: {fixed['frames_analyzed']} pose calls @ {fixed['sample_hz']} Hz")
+    runs = [('fixed', fixed)]
+
+    # The gate is steered by the counters, so check both execution paths
+    for pipelined in (False, True):
+        mode = 'pipelined' if pipelined else 'sequential'
+        analyzer.reset_session()
+        adaptive = analyzer.analyze_video(video_path, adaptive=True, pipelined=pipelined)
+        runs.append((f"adaptive ({mode})", adaptive))
+
+        stats = adaptive['keyframe_stats']
+        print(f"✅ Adaptive keyframes ({mode}): {stats['pose_calls']} pose calls of {stats['frames_decoded']} decoded @ {adaptive['sample_hz']} Hz")
+        print(f"   Pose-call reduction vs fixed: {1 - stats['pose_calls'] / max(fixed['frames_analyzed'], 1):.1%}")
+
+        agree = fixed['final_counts'] == adaptive['final_counts']
+        print(f"{'✅' if agree else '❌'} Count agreement ({mode}): fixed={fixed['final_counts']} adaptive={adaptive['final_counts']}")
+        if not agree:
+            failures.append(f"count agreement ({mode})")
+
+    if expected is not None:
+        for name, result in runs:
+            counted = result['final_counts'][result['detected_exercise']] if result['detected_exercise'] else 0
+            print(f"{'✅' if counted == expected else '❌'} {name}: {counted} of {expected} reps ({result['detected_exercise']})")
+            if counted != expected:
+                failures.append(f"{name} reps")
+
+except Exception as e:
+    print(f"❌ Keyframe comparison failed: {e}")
+    failures.append(str(e))
+finally:
+    if expected is not None:
+        os.unlink(video_path)
+
+print("\n🎯 Keyframe test complete!")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Check parsing of client keypoint submissions (NDJSON and binary)"""
+
+import json
+import struct
+import sys
+
+import numpy as np
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {name}" + (f": {detail}" if detail else ""))
+    if not ok:
+        failures.append(name)
+
+
+def ndjson(header: dict, *frames) -> bytes:
+    return "\n".join(json.dumps(line) for line in (header, *frames)).encode()
+
+
+def rejects(name: str, parse, body: bytes):
+    try:
+        parse(body)
+    except (ValueError, KeyError, TypeError) as e:
+        check(name, True, f"{type(e).__name__}: {e}")
+    else:
+        check(name, False, "accepted")
+
+
+def main():
+    from ml.keypoints import analyze_keypoints, parse_binary, parse_ndjson, to_landmarks
+
+    movenet = {'format': 'movenet17', 'width': 640, 'height': 480}
+    points = [[320.0, 240.0, 0.9]] * 17
+
+    # Timestamps: explicit, derived from the header fps, or missing
+    _, t, kp = parse_ndjson(ndjson(movenet, {'t': 0.0, 'keypoints': points}, {'t': 0.5, 'keypoints': None}))
+    check("explicit timestamps", t.tolist() == [0.0, 0.5], str(t.tolist()))
+    check("frame without a pose is NaN", np.isnan(kp[1]).all() and not np.isnan(kp[0]).any())
+
+    _, t, _ = parse_ndjson(ndjson({**movenet, 'fps': 30}, {'keypoints': points}, {'keypoints': points}, {'keypoints': points}))
+    check("timestamps from header fps", np.allclose(t, [0, 1 / 30, 2 / 30]), str(t.tolist()))
+    rejects("no timestamp and no fps", parse_ndjson, ndjson(movenet, {'keypoints': points}))
+
+    objects = [{'x': 320, 'y': 240, 'score': 0.9}] * 17
+    _, _, kp = parse_ndjson(ndjson(movenet, {'t': 0, 'keypoints': objects}))
+    check("TF.js keypoint objects", np.allclose(kp[0], points))
+
+    # Malformed submissions are rejected with errors the route turns into 400s
+    rejects("empty body", parse_ndjson, b"")
+    rejects("unknown format", parse_ndjson, ndjson({'format': 'openpose25'}))
+    rejects("wrong keypoint count", parse_ndjson, ndjson(movenet, {'t': 0, 'keypoints': points[:5]}))
+    rejects("frame not an object", parse_ndjson, ndjson(movenet, [1, 2, 3]))
+    rejects("keypoints not a list", parse_ndjson, ndjson(movenet, {'t': 0, 'keypoints': "abc"}))
+    rejects("keypoint not a point", parse_ndjson, ndjson(movenet, {'t': 0, 'keypoints': [[1]] * 17}))
+    rejects("keypoint object without x", parse_ndjson, ndjson(movenet, {'t': 0, 'keypoints': [{'y': 1}] * 17}))
+    rejects("non-numeric timestamp", parse_ndjson, ndjson(movenet, {'t': "soon", 'keypoints': points}))
+    rejects("invalid JSON", parse_ndjson, ndjson(movenet) + b"\n{not json")
+
+    # Binary layout
+    frames = np.zeros(3, dtype=[('t', '<f4'), ('points', '<f4', (17, 3))])
+    frames['t'] = [0.0, 0.1, 0.2]
+    frames['points'] = points
+    body = struct.pack("<4sBBHffI", b"KPTS", 1, 17, 0, 640, 480, 3) + frames.tobytes()
+    header, t, kp = parse_binary(body)
+    check("binary header", header == {**movenet, 'normalized': False}, str(header))
+    check("binary frames", np.allclose(t, [0.0, 0.1, 0.2]) and np.allclose(kp, points))
+    rejects("truncated binary body", parse_binary, body[:-4])
+    rejects("wrong magic", parse_binary, b"XXXX" + body[4:])
+    rejects("unsupported keypoint count", parse_binary, struct.pack("<4sBBHffI", b"KPTS", 1, 20, 0, 1, 1, 0))
+
+    # MoveNet pixels map onto normalized MediaPipe landmarks
+    landmarks = to_landmarks(movenet, kp)
+    check("MoveNet to MediaPipe", landmarks.shape == (3, 33, 3) and np.allclose(landmarks[:, 11, :2], [0.5, 0.5]))
+    rejects("pixel keypoints without frame size", lambda kp: to_landmarks({'format': 'movenet17'}, kp), kp)
+
+    results = analyze_keypoints(body, 'application/octet-stream')
+    check("binary submission analyzed", results['frames_analyzed'] == 3 and results['pose_detection_rate'] == 100.0,
+          f"{results['frames_analyzed']} frames, {results['pose_detection_rate']}% with a pose")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Keypoint test failed: {e}")
+        failures.append(str(e))
+
+    print("\n🎯 Keypoint test complete!")
+    sys.exit(1 if failures else 0)
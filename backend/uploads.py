@@ -0,0 +1,77 @@
+"""Streaming upload handling.
+
+Uploaded videos are copied to disk in fixed-size chunks instead of being read
+into memory in one piece, so peak memory per upload stays at one chunk
+regardless of file size. File writes run in the thread pool to keep the event
+loop free. The content is hashed while it streams so duplicate uploads can be
+recognised without reading the file again.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Tuple
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+# Endpoints that accept video uploads and are subject to MAX_UPLOAD_BYTES
+UPLOAD_PATHS = {"/ml/analyze-video", "/results"}
+
+# Allowance for multipart boundaries and the other form fields
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _too_large() -> HTTPException:
+	return HTTPException(
+		status_code=413,
+		detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"
+	)
+
+
+async def reject_oversized_uploads(request: Request, call_next):
+	"""HTTP middleware: refuse uploads by Content-Length before the body is read"""
+	if request.method == "POST" and request.url.path in UPLOAD_PATHS:
+		length = request.headers.get("content-length")
+		if length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD:
+			error = _too_large()
+			return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+	return await call_next(request)
+
+
+def _write_chunk(out, hasher, chunk: bytes):
+	hasher.update(chunk)
+	out.write(chunk)
+
+
+async def save_upload(upload: UploadFile, dest: Path, max_bytes: int = MAX_UPLOAD_BYTES,
+					  chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+	"""Stream ``upload`` into ``dest`` chunk by chunk.
+
+	Returns ``(bytes_written, sha256_hex)``. Raises 413 as soon as the file
+	exceeds ``max_bytes``; the partial file is removed.
+	"""
+	if upload.size is not None and upload.size > max_bytes:
+		raise _too_large()
+
+	written = 0
+	hasher = hashlib.sha256()
+	out = await run_in_threadpool(open, dest, "wb")
+	try:
+		while True:
+			chunk = await upload.read(chunk_size)
+			if not chunk:
+				break
+			written += len(chunk)
+			if written > max_bytes:
+				raise _too_large()
+			await run_in_threadpool(_write_chunk, out, hasher, chunk)
+	except BaseException:
+		await run_in_threadpool(out.close)
+		dest.unlink(missing_ok=True)
+		raise
+	await run_in_threadpool(out.close)
+	return written, hasher.hexdigest()
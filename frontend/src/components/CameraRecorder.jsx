@@ -1,4 +1,5 @@
 import { useEffect, useRef, useState } from 'react'
+import { API } from '../utils/api'
 
 const CANDIDATE_MIMES = [
 	'video/webm;codecs=vp9',
@@ -13,12 +14,56 @@ function getSupportedMime() {
 	return ''
 }
 
-export default function CameraRecorder({ onStop }) {
+// Live coaching: frames sent per second and their width (height keeps the aspect ratio)
+const LIVE_FPS = 8
+const LIVE_WIDTH = 320
+// Send the next frame anyway if a frame got no answer within this time
+const LIVE_FRAME_TIMEOUT_MS = 2000
+
+function openLiveSession(video, onResult) {
+	const ws = new WebSocket(API.replace(/^http/, 'ws') + '/ml/live')
+	const canvas = document.createElement('canvas')
+	let inFlight = false
+	let sentAt = 0
+	let timer = null
+
+	const sendFrame = () => {
+		// One frame in flight at a time so a slow server never builds a backlog
+		if (inFlight && Date.now() - sentAt > LIVE_FRAME_TIMEOUT_MS) inFlight = false
+		if (inFlight || ws.readyState !== WebSocket.OPEN || !video.videoWidth) return
+		canvas.width = LIVE_WIDTH
+		canvas.height = Math.round(video.videoHeight * LIVE_WIDTH / video.videoWidth)
+		canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height)
+		inFlight = true
+		sentAt = Date.now()
+		canvas.toBlob(b => {
+			if (b && ws.readyState === WebSocket.OPEN) ws.send(b)
+			else inFlight = false
+		}, 'image/jpeg', 0.7)
+	}
+
+	ws.onopen = () => { timer = setInterval(sendFrame, 1000 / LIVE_FPS) }
+	ws.onmessage = (e) => {
+		const data = JSON.parse(e.data)
+		// Every frame gets exactly one answer: a result, an error or a drop notice
+		if (data.type === 'result' || data.type === 'error' || data.type === 'dropped') inFlight = false
+		if (data.type === 'result') onResult(data)
+	}
+	ws.onclose = () => { clearInterval(timer) }
+
+	return () => {
+		clearInterval(timer)
+		try { ws.close() } catch {}
+	}
+}
+
+export default function CameraRecorder({ onStop, onLiveResult }) {
 	const videoRef = useRef(null)
 	const mediaRecorderRef = useRef(null)
 	const [recording, setRecording] = useState(false)
 	const [error, setError] = useState('')
 	const chunksRef = useRef([])
+	const liveRef = useRef(null)
 	const [hasMediaRecorder, setHasMediaRecorder] = useState(!!window.MediaRecorder)
 
 	useEffect(() => {
@@ -39,6 +84,7 @@ export default function CameraRecorder({ onStop }) {
 			}
 		})()
 		return () => {
+			liveRef.current && liveRef.current()
 			try {
 				const s = videoRef.current?.srcObject
 				s && s.getTracks().forEach(t => t.stop())
@@ -59,6 +105,7 @@ export default function CameraRecorder({ onStop }) {
 				onStop && onStop(blob, URL.createObjectURL(blob))
 			}
 			mediaRecorderRef.current.start(250)
+			if (onLiveResult) liveRef.current = openLiveSession(videoRef.current, onLiveResult)
 			setRecording(true)
 		} catch (e) {
 			setError('Recording not supported in this browser. Use the upload fallback below.')
@@ -68,6 +115,8 @@ export default function CameraRecorder({ onStop }) {
 
 	const stop = () => {
 		try { mediaRecorderRef.current?.stop() } catch {}
+		liveRef.current && liveRef.current()
+		liveRef.current = null
 		setRecording(false)
 	}
 
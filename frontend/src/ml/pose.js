@@ -68,3 +68,17 @@ export function detectCheat(poses) {
 	}
 	return { duplicateFrames: duplicates > 10 }
 }
+
+// Encode MoveNet poses for POST /ml/analyze-keypoints (Content-Type: application/x-ndjson).
+// Needs per-frame timestamps in seconds, or the frame rate of evenly spaced poses.
+export function toKeypointNdjson(poses, width, height, timestamps, fps) {
+	if (!timestamps && !fps) throw new Error('toKeypointNdjson needs timestamps or fps')
+	const header = { format: 'movenet17', width, height }
+	if (fps) header.fps = fps
+	const lines = [JSON.stringify(header)]
+	poses.forEach((p, i) => {
+		const keypoints = p && p.keypoints ? p.keypoints.map(k => [k.x, k.y, k.score ?? 1]) : null
+		lines.push(JSON.stringify(timestamps ? { t: timestamps[i], keypoints } : { keypoints }))
+	})
+	return lines.join('\n')
+}
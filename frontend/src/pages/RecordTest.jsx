@@ -12,6 +12,7 @@ export default function RecordTest() {
 	const [msg, setMsg] = useState('')
 	const [videoId, setVideoId] = useState(null)
 	const [supportedExercises, setSupportedExercises] = useState([])
+	const [live, setLive] = useState(null)
 
 	useEffect(() => {
 		// Load supported exercises
@@ -39,15 +40,24 @@ export default function RecordTest() {
 				body: formData
 			})
 			
+			if (response.status === 429) {
+				// The body carries the same hint in case the header is not exposed
+				const body = await response.json().catch(() => ({}))
+				const retryAfter = response.headers.get('Retry-After') || body.retry_after
+				setMsg(`Analysis is busy, please try again in ${retryAfter || 'a few'} seconds`)
+				return
+			}
 			if (!response.ok) {
 				throw new Error('Failed to upload video')
 			}
 			
 			const result = await response.json()
 			setVideoId(result.video_id)
-			setMsg('Video uploaded, analyzing...')
+			setMsg(result.queue
+				? `Video uploaded, position ${result.queue.position} in queue (about ${Math.round(result.queue.estimated_completion_s)} s)...`
+				: 'Video uploaded, analyzing...')
 			
-			// Poll for results
+			// Follow the job until it finishes; stay busy so it is not uploaded twice
 			await pollAnalysisResults(result.video_id)
 			
 		} catch (e) {
@@ -58,40 +68,66 @@ export default function RecordTest() {
 		}
 	}
 
-	const pollAnalysisResults = async (videoId) => {
-		const maxAttempts = 30 // 30 seconds timeout
-		let attempts = 0
-		
-		const poll = async () => {
-			try {
-				console.log(`Polling for results, attempt ${attempts + 1}`)
-				const response = await fetch(API + `/ml/analysis/${videoId}`)
+	const showProgress = (status) => {
+		const progress = status.progress
+		if (status.status === 'queued') setMsg('Waiting in queue...')
+		else if (progress && progress.fraction != null) setMsg(`Analyzing... ${Math.round(progress.fraction * 100)}%`)
+		else setMsg('Analyzing...')
+	}
+
+	const finishAnalysis = (result) => {
+		if (result.status === 'completed') {
+			setAnalysisResult(result.results)
+			setMsg('Analysis complete! Check the results below.')
+		} else {
+			setMsg('Analysis failed: ' + result.error)
+		}
+	}
+
+	// Follow the job over Server-Sent Events, falling back to long-polling;
+	// resolves once the job has finished (or following it failed)
+	const pollAnalysisResults = (videoId) => {
+		if (!window.EventSource) return longPollAnalysisResults(videoId)
+		return new Promise((resolve) => {
+			const events = new EventSource(API + `/ml/analysis/${videoId}/events`)
+			let done = false
+			events.addEventListener('status', (e) => showProgress(JSON.parse(e.data)))
+			events.addEventListener('result', (e) => {
+				done = true
+				events.close()
+				finishAnalysis(JSON.parse(e.data))
+				resolve()
+			})
+			events.onerror = () => {
+				if (done) return
+				done = true
+				events.close()
+				resolve(longPollAnalysisResults(videoId))
+			}
+		})
+	}
+
+	const longPollAnalysisResults = async (videoId) => {
+		const deadline = Date.now() + 5 * 60 * 1000
+		let since = null
+		try {
+			while (Date.now() < deadline) {
+				const query = `?wait=25` + (since == null ? '' : `&since=${since}`)
+				const response = await fetch(API + `/ml/analysis/${videoId}` + query)
+				if (!response.ok) throw new Error(`HTTP ${response.status}`)
 				const result = await response.json()
-				
-				console.log('Poll result:', result)
-				
-				if (result.status === 'completed') {
-					console.log('Analysis completed:', result.results)
-					setAnalysisResult(result.results)
-					setMsg('Analysis complete! Check the results below.')
+				if (result.status === 'completed' || result.status === 'failed') {
+					finishAnalysis(result)
 					return
-				} else if (result.status === 'failed') {
-					setMsg('Analysis failed: ' + result.error)
-					return
-				} else if (attempts < maxAttempts) {
-					attempts++
-					setMsg(`Analyzing... (${attempts}/${maxAttempts})`)
-					setTimeout(poll, 1000)
-				} else {
-					setMsg('Analysis timeout - please try again')
 				}
-			} catch (e) {
-				console.error('Polling error:', e)
-				setMsg('Failed to get analysis results: ' + e.message)
+				showProgress(result)
+				since = result.revision
 			}
+			setMsg('Analysis timeout - please try again')
+		} catch (e) {
+			console.error('Polling error:', e)
+			setMsg('Failed to get analysis results: ' + e.message)
 		}
-		
-		poll()
 	}
 
 	const submit = async () => {
@@ -132,7 +168,12 @@ export default function RecordTest() {
 					</select>
 				</div>
 				<div className="bg-white border rounded p-3">
-					<CameraRecorder onStop={onStop} />
+					<CameraRecorder onStop={onStop} onLiveResult={setLive} />
+					{live && (
+						<div className="mt-2 text-sm text-gray-700">
+							Live: {live.exercise ? `${live.exercise} ${live.count}` : 'waiting for exercise'} - {live.feedback}
+						</div>
+					)}
 				</div>
 				<div className="flex gap-2">
 					<button onClick={analyze} disabled={!url || busy} className="px-3 py-2 bg-indigo-600 text-white rounded disabled:opacity-50">